@@ -117,6 +117,10 @@ class InputSource:
         """Returns the last modification time of this source, if that's known."""
         return None
 
+    def localPath(self) -> str | None:
+        """Returns the path of the local file this source is read from, if there is one."""
+        return None
+
     def cheaplyExists(self, _: t.Any) -> bool | None:
         """If it's cheap to determine, returns whether relativePath exists.
 
@@ -229,6 +233,9 @@ class FileInputSource(InputSource):
         except FileNotFoundError:
             return None
 
+    def localPath(self) -> str:
+        return self.sourceName
+
 
 class TarInputSource(InputSource):
     def __init__(self, sourceName: str, *, tarMemberName: str = "index.bs", **_: t.Any) -> None:
@@ -288,6 +295,9 @@ class TarInputSource(InputSource):
         except FileNotFoundError:
             return None
 
+    def localPath(self) -> str:
+        return self.sourceName
+
     def _openTarFile(self) -> tarfile.TarFile:
         """Open the tar file so archive members can be read."""
         # The same file gets opened numerous times in a single build, but it doesn't seem to be very
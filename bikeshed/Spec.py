@@ -1,12 +1,13 @@
 # pylint: disable=attribute-defined-outside-init
 from __future__ import annotations
 
+import dataclasses
 import glob
+import io
 import json
 import os
 import re
 import sys
-import time
 from collections import OrderedDict, defaultdict
 from datetime import datetime
 
@@ -34,11 +35,16 @@ from . import (
     markdown,
     mdn,
     metadata,
+    outputfile,
+    phasecache,
+    phases,
     refs,
     retrieve,
     shorthands,
     stylescript,
     t,
+    timings,
+    watcher,
     wpt,
 )
 from . import line as l
@@ -48,6 +54,8 @@ from . import unsortedJunk as u
 if t.TYPE_CHECKING:
     import widlparser
 
+    PhaseT = t.TypeVar("PhaseT")
+
 
 class Spec:
     def __init__(
@@ -86,6 +94,10 @@ class Spec:
             self.dataFile = fileRequester
 
         self.lines: list[l.Line] = []
+        # Set by watch mode, to skip re-running phases whose inputs didn't change.
+        self.phaseCache: phasecache.PhaseCache | None = None
+        # Parsed includes; kept across watch-mode rebuilds.
+        self.includeCache: includes.IncludeCache = includes.IncludeCache()
         self.valid = self.initializeState()
 
     def initializeState(self) -> bool:
@@ -192,13 +204,29 @@ class Spec:
         lines = inputContent.rawLines
         if not self.md.markupShorthands.explicitFalse("markdown-blockquotes"):
             lines = replaceMarkdownBlockquotes(inputContent.rawLines)
-        nodes = h.initialDocumentParse("".join(lines), h.ParseConfig.fromSpec(self))
-        if self.debugPrint == "early-parse":
-            h.debugNodes(nodes)
-        text = h.strFromNodes(nodes, withIlcc=True)
+        sourceText = "".join(lines)
+        config = h.ParseConfig.fromSpec(self)
+
+        def parse() -> str:
+            nodes = h.initialDocumentParse(sourceText, config)
+            if self.debugPrint == "early-parse":
+                h.debugNodes(nodes)
+            return h.strFromNodes(nodes, withIlcc=True)
+
+        # (The macros are a defaultdict, whose repr includes its factory function's address.)
+        configKey = repr(dataclasses.replace(config, macros=dict(config.macros)))
+        text = self.runPhase("early-parse", f"{configKey}\n{sourceText}", parse)
         inputContent.rawLines = [x + "\n" for x in text.split("\n")]
         return inputContent.lines
 
+    def runPhase(self, name: str, inputs: str, fn: t.Callable[[], PhaseT]) -> PhaseT:
+        # Runs one of the build phases that's a pure function of its inputs,
+        # reusing the previous result if this is a watch-mode rebuild
+        # and inputs (a string capturing everything the phase depends on) hasn't changed.
+        if self.phaseCache is None or self.debugPrint:
+            return fn()
+        return self.phaseCache.run(name, inputs, fn)
+
     def checkValidity(self) -> bool:
         return True
 
@@ -212,124 +240,162 @@ class Spec:
         return self
 
     def assembleDocument(self) -> Spec:
-        self.initMetadata(self.inputContent)
+        def step(name: str) -> t.ContextManager[t.Any]:
+            return timings.step("assembleDocument", name, self)
+
+        with step("initMetadata"):
+            self.initMetadata(self.inputContent)
         self.recordDependencies(self.inputSource)
 
-        self.lines = self.earlyParse(self.inputContent)
+        with step("earlyParse"):
+            self.lines = self.earlyParse(self.inputContent)
 
         if "mixed-indents" in self.md.complainAbout:
             if self.md.indentInfo and self.md.indentInfo.char:
-                checkForMixedIndents(self.lines, self.md.indentInfo)
+                with step("checkForMixedIndents"):
+                    checkForMixedIndents(self.lines, self.md.indentInfo)
 
-        extensions.load(self)
+        with step("extensions"):
+            extensions.load(self)
 
         # Initialize things
-        self.refs.initializeRefs(doc=self, datablocks=datablocks)
-        self.refs.initializeBiblio(doc=self)
+        with step("initializeRefs"):
+            self.refs.initializeRefs(doc=self, datablocks=datablocks)
+        with step("initializeBiblio"):
+            self.refs.initializeBiblio(doc=self)
 
         # Deal with markdown
         if self.debugPrint == "pre-md":
             print("".join(x.text for x in self.lines))  # noqa: T201
         if "markdown-block" in self.md.markupShorthands:
-            self.lines = markdown.parse(self.lines, markdown.MarkdownConfig.fromSpec(self))
+            mdLines = self.lines
+            mdConfig = markdown.MarkdownConfig.fromSpec(self)
+
+            def parseMarkdown() -> tuple[tuple[int, str], ...]:
+                return tuple((line.i, line.text) for line in markdown.parse(mdLines, mdConfig))
+
+            with step("markdown"):
+                self.lines = [
+                    l.Line(i, text)
+                    for i, text in self.runPhase(
+                        "markdown",
+                        f"{mdConfig!r}\n" + "".join(f"{line.i}:{line.text}" for line in mdLines),
+                        parseMarkdown,
+                    )
+                ]
         if self.debugPrint == "post-md":
             print("".join(x.text for x in self.lines))  # noqa: T201
 
         # Convert to a single string of html now, for convenience.
         self.html = "".join(x.text for x in self.lines)
-        boilerplate.addHeaderFooter(self)
+        with step("addHeaderFooter"):
+            boilerplate.addHeaderFooter(self)
 
         # Build the document
-        self.document, self.head, self.body = h.parseDocument(self.html)
+        with step("parseDocument"):
+            self.document, self.head, self.body = h.parseDocument(self.html)
         if self.debugPrint == "boilerplate":
             print(h.printNodeTree(self.document))  # noqa: T201
-        datablocks.transformDataBlocks(self, self.document)
+        with step("transformDataBlocks"):
+            datablocks.transformDataBlocks(self, self.document)
         if self.debugPrint == "datablocks":
             print(h.printNodeTree(self.document))  # noqa: T201
-        self.refs.setSpecData(self)
-        u.correctFrontMatter(self)
-        includes.processInclusions(self)
-        metadata.parseDoc(self)
+        with step("setSpecData"):
+            self.refs.setSpecData(self)
+        with step("correctFrontMatter"):
+            u.correctFrontMatter(self)
+        with step("processInclusions"):
+            includes.processInclusions(self)
+        with step("parseDoc"):
+            metadata.parseDoc(self)
         return self
 
     def processDocument(self) -> Spec:
         # Fill in and clean up a bunch of data
-        conditional.processConditionals(self)
-        self.fillContainers: t.FillContainersT = u.locateFillContainers(self)
-        lint.exampleIDs(self)
-        wpt.processWptElements(self)
-
-        boilerplate.addBikeshedVersion(self)
-        boilerplate.addCanonicalURL(self)
-        boilerplate.addFavicon(self)
-        boilerplate.addSpecVersion(self)
-        boilerplate.addStatusSection(self)
-        boilerplate.addLogo(self)
-        boilerplate.addCopyright(self)
-        boilerplate.addSpecMetadataSection(self)
-        boilerplate.addAbstract(self)
-        boilerplate.addExpiryNotice(self)
-        boilerplate.addObsoletionNotice(self)
-        boilerplate.addAtRisk(self)
-        u.addNoteHeaders(self)
-        boilerplate.removeUnwantedBoilerplate(self)
-        shorthands.run(self)
-        inlineTags.processTags(self)
-        u.canonicalizeShortcuts(self.body)
-        u.addImplicitAlgorithms(self)
-        u.fixManualDefTables(self)
-        headings.processHeadings(self)
-        u.checkVarHygiene(self)
-        u.processIssuesAndExamples(self)
-        idl.markupIDL(self)
-        cddl.markupCDDL(self)
-        u.inlineRemoteIssues(self)
-        u.addImageSize(self)
-
-        # Handle all the links
-        u.processBiblioLinks(self)
-        u.processDfns(self)
-        u.processIDL(self)
-        u.processCDDL(self)
-        dfns.annotateDfns(self)
-        u.formatArgumentdefTables(self)
-        u.formatElementdefTables(self)
-        u.processAutolinks(self)
-        u.fixInterDocumentReferences(self)
-        biblio.dedupBiblioReferences(self)
-        boilerplate.addIndexSection(self)
-        boilerplate.addExplicitIndexes(self)
-        boilerplate.addStyles(self)
-        boilerplate.addReferencesSection(self)
-        boilerplate.addPropertyIndex(self)
-        boilerplate.addIDLSection(self)
-        boilerplate.addCDDLSection(self)
-        boilerplate.addIssuesSection(self)
-        boilerplate.addCustomBoilerplate(self)
-        headings.processHeadings(self, "all")  # again
-        boilerplate.removeUnwantedBoilerplate(self)
-        boilerplate.addTOCSection(self)
-        u.addSelfLinks(self)
-        u.processAutolinks(self)
-        boilerplate.removeUnwantedBoilerplate(self)
-        # Add MDN panels after all IDs/anchors have been added
-        mdn.addMdnPanels(self)
-        caniuse.addCanIUsePanels(self)
-        highlight.addSyntaxHighlighting(self)
-        boilerplate.addBikeshedBoilerplate(self)
-        boilerplate.addDarkmodeIndicators(self)
-        fingerprinting.addTrackingVector(self)
-        u.fixIntraDocumentReferences(self)
-        u.fixInterDocumentReferences(self)
-        u.verifyUsageOfAllLocalBiblios(self)
-        u.removeMultipleLinks(self)
-        u.forceCrossorigin(self)
-        addDomintroStyles(self)
-        lint.brokenLinks(self)
-        lint.accidental2119(self)
-        lint.missingExposed(self)
-        lint.requiredIDs(self)
-        lint.unusedInternalDfns(self)
+        with timings.step("processDocument", "conditional.processConditionals", self):
+            conditional.processConditionals(self)
+        with timings.step("processDocument", "unsortedJunk.locateFillContainers", self):
+            self.fillContainers: t.FillContainersT = u.locateFillContainers(self)
+        # The rest of the processing is a series of phases.
+        # The ones that declare what they read and write
+        # can be run concurrently with their neighbors; see phases.py.
+        phases.run(
+            self,
+            [
+                lint.exampleIDs,
+                wpt.processWptElements,
+                boilerplate.addBikeshedVersion,
+                boilerplate.addCanonicalURL,
+                boilerplate.addFavicon,
+                boilerplate.addSpecVersion,
+                boilerplate.addStatusSection,
+                boilerplate.addLogo,
+                boilerplate.addCopyright,
+                boilerplate.addSpecMetadataSection,
+                boilerplate.addAbstract,
+                boilerplate.addExpiryNotice,
+                boilerplate.addObsoletionNotice,
+                boilerplate.addAtRisk,
+                u.addNoteHeaders,
+                boilerplate.removeUnwantedBoilerplate,
+                shorthands.run,
+                inlineTags.processTags,
+                phases.Phase(lambda doc: u.canonicalizeShortcuts(doc.body), name="unsortedJunk.canonicalizeShortcuts"),
+                u.addImplicitAlgorithms,
+                u.fixManualDefTables,
+                headings.processHeadings,
+                u.checkVarHygiene,
+                u.processIssuesAndExamples,
+                idl.markupIDL,
+                cddl.markupCDDL,
+                u.inlineRemoteIssues,
+                u.addImageSize,
+                # Handle all the links
+                u.processBiblioLinks,
+                u.processDfns,
+                u.processIDL,
+                u.processCDDL,
+                dfns.annotateDfns,
+                u.formatArgumentdefTables,
+                u.formatElementdefTables,
+                u.processAutolinks,
+                u.fixInterDocumentReferences,
+                biblio.dedupBiblioReferences,
+                boilerplate.addIndexSection,
+                boilerplate.addExplicitIndexes,
+                boilerplate.addStyles,
+                boilerplate.addReferencesSection,
+                boilerplate.addPropertyIndex,
+                boilerplate.addIDLSection,
+                boilerplate.addCDDLSection,
+                boilerplate.addIssuesSection,
+                boilerplate.addCustomBoilerplate,
+                phases.Phase(lambda doc: headings.processHeadings(doc, "all"), name="headings.processHeadings"),
+                boilerplate.removeUnwantedBoilerplate,
+                boilerplate.addTOCSection,
+                u.addSelfLinks,
+                u.processAutolinks,
+                boilerplate.removeUnwantedBoilerplate,
+                # Add MDN panels after all IDs/anchors have been added
+                mdn.addMdnPanels,
+                caniuse.addCanIUsePanels,
+                highlight.addSyntaxHighlighting,
+                boilerplate.addBikeshedBoilerplate,
+                boilerplate.addDarkmodeIndicators,
+                fingerprinting.addTrackingVector,
+                u.fixIntraDocumentReferences,
+                u.fixInterDocumentReferences,
+                u.verifyUsageOfAllLocalBiblios,
+                u.removeMultipleLinks,
+                u.forceCrossorigin,
+                addDomintroStyles,
+                phases.Phase(lint.brokenLinks, reads=["tree"], writes=[]),
+                phases.Phase(lint.accidental2119, reads=["tree"], writes=[]),
+                phases.Phase(lint.missingExposed, reads=["idl"], writes=[]),
+                phases.Phase(lint.requiredIDs, reads=["tree"], writes=[]),
+                phases.Phase(lint.unusedInternalDfns, reads=["tree"], writes=[]),
+            ],
+        )
 
         if self.debugPrint == "final":
             print(h.printNodeTree(self.document))  # noqa: T201
@@ -358,13 +424,24 @@ class Spec:
         return self
 
     def serialize(self) -> str | None:
+        output = io.StringIO()
+        if not self.serializeTo(output.write):
+            return None
+        return output.getvalue()
+
+    def serializeTo(self, write: t.Callable[[str], t.Any]) -> bool:
+        # Streams the rendered document to write(), chunk by chunk.
+        # Returns whether serialization succeeded;
+        # if it didn't, some of the document might have been written already.
+        def cleanWrite(chunk: str) -> None:
+            write(u.finalHackyCleanup(chunk))
+
         try:
-            rendered = h.Serializer(self.md.opaqueElements, self.md.blockElements).serialize(self.document)
+            h.Serializer(self.md.opaqueElements, self.md.blockElements).serializeTo(self.document, cleanWrite)
         except Exception as e:
             m.die(str(e))
-            return None
-        rendered = u.finalHackyCleanup(rendered)
-        return rendered
+            return False
+        return True
 
     def fixMissingOutputFilename(self, outputFilename: str | None) -> str:
         if outputFilename is None:
@@ -387,16 +464,22 @@ class Spec:
         catchArgparseBug(outputFilename)
         self.printResultMessage()
         outputFilename = self.fixMissingOutputFilename(outputFilename)
-        rendered = self.serialize()
-        if rendered and not constants.dryRun:
-            try:
-                if outputFilename == "-":
-                    sys.stdout.write(rendered)
-                else:
-                    with open(outputFilename, "w", encoding="utf-8", newline=newline) as f:
-                        f.write(rendered)
-            except Exception as e:
-                m.die(f"Something prevented me from saving the output document to {outputFilename}:\n{e}")
+        if constants.dryRun:
+            # Still serialize, for any errors it might report.
+            self.serializeTo(lambda _: None)
+            return
+        if outputFilename == "-":
+            # Buffered, so a failed serialization doesn't leave a partial document on stdout.
+            rendered = self.serialize()
+            if rendered is not None:
+                sys.stdout.write(rendered)
+            return
+        try:
+            with outputfile.OutputFile(outputFilename, newline=newline) as output:
+                if self.serializeTo(output.write):
+                    output.commit()
+        except Exception as e:
+            m.die(f"Something prevented me from saving the output document to {outputFilename}:\n{e}")
 
     def printResultMessage(self) -> None:
         # If I reach this point, I've succeeded, but maybe with reservations.
@@ -450,27 +533,39 @@ class Spec:
 
         mdCommandLine = self.mdCommandLine
 
+        # Rebuilds reuse the parsed data files (until they're updated),
+        # and skip any phases whose inputs didn't change.
+        if self.dataFile.cache is None:
+            self.dataFile.cache = retrieve.DataCache()
+        dataCache = self.dataFile.cache
+        dataCache.refresh(self.dataFile)
+        self.phaseCache = phasecache.PhaseCache()
+
         try:
             self.preprocess()
             self.finish(outputFilename)
             lastInputModified = {dep: dep.mtime() for dep in self.transitiveDependencies}
             printDone()
+            fileWatcher = watchDependencies(watcher.makeWatcher(), self.transitiveDependencies)
             try:
                 while True:
+                    fileWatcher.wait()
                     # Comparing mtimes with "!=" handles when a file starts or
                     # stops existing, and it's fine to rebuild if an mtime
                     # somehow gets older.
                     if any(input.mtime() != lastModified for input, lastModified in lastInputModified.items()):
                         m.state = m.state.replace()
                         m.say("Source file modified. Rebuilding...")
+                        dataCache.refresh(self.dataFile)
                         self.initializeState()
                         self.mdCommandLine = mdCommandLine
                         self.preprocess()
                         self.finish(outputFilename)
                         lastInputModified = {dep: dep.mtime() for dep in self.transitiveDependencies}
+                        fileWatcher = watchDependencies(fileWatcher, self.transitiveDependencies)
                         printDone()
-                    time.sleep(1)
             except KeyboardInterrupt:
+                fileWatcher.close()
                 m.say("Exiting~")
                 if server:
                     server.shutdown()
@@ -502,6 +597,20 @@ class Spec:
         return False
 
 
+def watchDependencies(
+    fileWatcher: watcher.Watcher,
+    dependencies: t.Iterable[InputSource.InputSource],
+) -> watcher.Watcher:
+    paths = [path for dep in dependencies if (path := dep.localPath()) is not None]
+    try:
+        fileWatcher.watch(paths)
+    except OSError as e:
+        m.warn(f"Couldn't watch all the input files for changes ({e}), so checking every second instead.")
+        fileWatcher.close()
+        fileWatcher = watcher.PollingWatcher()
+    return fileWatcher
+
+
 def printDone() -> None:
     contents = f"Finished at {datetime.now().strftime('%H:%M:%S %b-%d-%Y')}"
     contentLen = len(contents) + 2
@@ -563,14 +672,15 @@ def catchArgparseBug(string: str | None) -> bool:
 
 
 def fetchLanguages(dataFile: retrieve.DataFileRequester) -> dict[str, language.Language]:
-    return {
-        k: language.Language(v["name"], v["native-name"])
-        for k, v in json.loads(dataFile.fetch("languages.json", str=True)).items()
-    }
+    return dataFile.fetchParsed("languages.json", parse=parseLanguages)
+
+
+def parseLanguages(text: str) -> dict[str, language.Language]:
+    return {k: language.Language(v["name"], v["native-name"]) for k, v in json.loads(text).items()}
 
 
 def fetchDoctypes(dataFile: retrieve.DataFileRequester) -> doctypes.DoctypeManager:
-    return doctypes.DoctypeManager.fromKdlStr(dataFile.fetch("boilerplate", "doctypes.kdl", str=True))
+    return dataFile.fetchParsed("boilerplate", "doctypes.kdl", parse=doctypes.DoctypeManager.fromKdlStr)
 
 
 def addDomintroStyles(doc: Spec) -> None:
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import argparse
+import concurrent.futures
+import dataclasses
+import io
+import json
+import multiprocessing
+import os
+import traceback
+
+from . import build, constants, retrieve, t
+from . import messages as m
+
+# Builds many specs in one invocation, spread over a pool of worker processes.
+#
+# The parent process parses the shared data files once (see DataFileRequester.fetchParsed())
+# before starting the pool; where the platform supports forking,
+# the workers inherit those copy-on-write rather than each re-reading them.
+# Each spec's messages are captured separately and printed together when it finishes,
+# so the output of simultaneous builds doesn't interleave.
+
+
+@dataclasses.dataclass
+class BatchJob:
+    infile: str
+    outfile: str | None = None
+
+
+@dataclasses.dataclass
+class BatchResult:
+    job: BatchJob
+    exitCode: int
+    messages: str
+
+
+def jobsFromArgs(infiles: list[str], manifest: str | None) -> list[BatchJob]:
+    jobs = [BatchJob(infile) for infile in infiles]
+    if manifest:
+        jobs.extend(jobsFromManifest(manifest))
+    return jobs
+
+
+def jobsFromManifest(manifest: str) -> list[BatchJob]:
+    # A manifest lists one spec per line, as "INFILE" or "INFILE OUTFILE".
+    # Paths are relative to the manifest's folder.
+    # Blank lines and lines starting with # are ignored.
+    try:
+        with open(manifest, encoding="utf-8") as fh:
+            lines = fh.readlines()
+    except OSError:
+        m.die(f"Couldn't open the batch manifest '{manifest}'.")
+        return []
+    base = os.path.dirname(manifest)
+    jobs = []
+    for i, line in enumerate(lines, 1):
+        line = line.strip()
+        if line == "" or line.startswith("#"):
+            continue
+        pieces = line.split()
+        if len(pieces) > 2:
+            m.die(f"Line {i} of the batch manifest should be 'INFILE' or 'INFILE OUTFILE', got:\n{line}")
+            continue
+        infile = os.path.join(base, pieces[0])
+        outfile = os.path.join(base, pieces[1]) if len(pieces) == 2 else None
+        jobs.append(BatchJob(infile, outfile))
+    return jobs
+
+
+def batch(
+    jobs: list[BatchJob],
+    extras: list[str],
+    numWorkers: int | None = None,
+    options: dict[str, t.Any] | None = None,
+) -> bool:
+    """
+    Builds every job, using up to numWorkers processes (defaulting to the number of CPUs).
+    Returns whether every spec built successfully.
+    """
+    if m.wrappedOutput():
+        m.die(f"Batch mode only supports console output; you've set --print={m.state.printMode}")
+        return False
+    for job in jobs:
+        if job.infile == "-" or job.outfile == "-":
+            m.die("Batch mode doesn't support reading from STDIN or writing to STDOUT.")
+            return False
+    if not jobs:
+        m.die("No specs were given to build.")
+        return False
+
+    preloadDataFiles(retrieve.defaultRequester)
+
+    if numWorkers is None:
+        numWorkers = os.cpu_count() or 1
+    numWorkers = max(1, min(numWorkers, len(jobs)))
+
+    failures = 0
+    with processPool(numWorkers) as executor:
+        futures = [executor.submit(buildSpec, job, extras, options or {}) for job in jobs]
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            if result.messages:
+                m.p(m.printColor(f"{result.job.infile}:", "white", "bold"))
+                m.state.fh.write(result.messages)
+            if result.exitCode:
+                failures += 1
+
+    if failures:
+        m.failure(f"{failures} of {len(jobs)} specs failed to build.")
+        return False
+    m.success(f"Built {len(jobs)} specs.")
+    return True
+
+
+def preloadDataFiles(dataFile: retrieve.DataFileRequester) -> None:
+    # Parses the shared data files up front, so the workers don't each do it.
+    from . import doctypes  # noqa: PLC0415
+    from .datablocks import parseInfoTreeText  # noqa: PLC0415
+    from .refs import source  # noqa: PLC0415
+    from .Spec import parseLanguages  # noqa: PLC0415
+
+    if dataFile.cache is None:
+        dataFile.cache = retrieve.DataCache()
+        dataFile.cache.refresh(dataFile)
+    dataFile.fetchParsed("specs.json", parse=json.loads)
+    dataFile.fetchParsed("methods.json", parse=source.parseMethods)
+    dataFile.fetchParsed("fors.json", parse=json.loads)
+    dataFile.fetchParsed("biblio-keys.json", parse=json.loads)
+    dataFile.fetchParsed("biblio-numeric-suffixes.json", parse=json.loads)
+    # The default indent; docs with a different Indent will parse their own copy.
+    dataFile.fetchParsed("link-defaults.infotree", parse=parseInfoTreeText, args=(4, 1))
+    dataFile.fetchParsed("languages.json", parse=parseLanguages)
+    dataFile.fetchParsed("boilerplate", "doctypes.kdl", parse=doctypes.DoctypeManager.fromKdlStr)
+
+
+def processPool(numWorkers: int) -> concurrent.futures.ProcessPoolExecutor:
+    # Worker processes that start out with this process's message settings, constants, and data cache.
+    # Forking is preferred where it's available, so the cache is shared copy-on-write.
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+    else:
+        context = multiprocessing.get_context()
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=numWorkers,
+        mp_context=context,
+        initializer=initWorker,
+        initargs=(
+            m.state.settings(),
+            (constants.dryRun, constants.chroot, constants.executeCode, constants.serialPhases),
+            retrieve.defaultRequester.cache,
+        ),
+    )
+
+
+def initWorker(
+    settings: dict[str, t.Any],
+    constantValues: tuple[bool, bool, bool, bool],
+    cache: retrieve.DataCache | None,
+) -> None:
+    # With forking these are already inherited,
+    # but spawned workers need them passed over explicitly.
+    m.state = m.state.replace(**settings)
+    constants.dryRun, constants.chroot, constants.executeCode, constants.serialPhases = constantValues
+    # The pool already keeps every CPU busy,
+    # so each worker starting its own pool of highlighting processes would just oversubscribe them.
+    constants.highlightProcesses = 1
+    retrieve.defaultRequester.cache = cache
+
+
+def buildSpec(job: BatchJob, extras: list[str], options: dict[str, t.Any]) -> BatchResult:
+    messages = io.StringIO()
+    exitCode = 0
+    with m.withMessageState(messages, closed=False):
+        try:
+            build.buildSpec(
+                argparse.Namespace(
+                    infile=job.infile,
+                    outfile=job.outfile,
+                    debug=False,
+                    debugPrint=None,
+                    lineNumbers=False,
+                    # Per-step timings are only reported for single `bikeshed spec` builds.
+                    timings=False,
+                    timingsElements=False,
+                    timingsFormat="text",
+                    **options,
+                ),
+                extras,
+            )
+        except SystemExit as e:
+            exitCode = e.code if isinstance(e.code, int) else 1
+        except Exception:  # pylint: disable=broad-except
+            messages.write(traceback.format_exc())
+            exitCode = 1
+        # Some failures (like a missing input file) report an error without exiting.
+        if any(
+            count and (category == "failure" or m.state.shouldDie(category, "late"))
+            for category, count in m.state.categoryCounts.items()
+            if category != "success"
+        ):
+            exitCode = exitCode or 1
+    return BatchResult(job, exitCode, messages.getvalue())
@@ -0,0 +1,335 @@
+from __future__ import annotations
+
+import dataclasses
+import json
+import os
+import statistics
+import tempfile
+
+from . import messages as m
+from . import t, test, timings
+
+# `bikeshed bench`: measures how long Bikeshed takes to build a fixed corpus of specs,
+# so upgrades (or local changes) can be checked for slowdowns
+# before they reach anyone's build pipeline.
+#
+# The corpus is a handful of real specs from the testsuite,
+# plus synthetic specs generated to stress particular features
+# (lots of dfns, lots of autolinks, lots of IDL, lots of includes),
+# scaled up or down by --scale.
+# The synthetic specs are generated fresh (and identically) on every run,
+# so results are comparable across machines and versions.
+#
+# Every spec is built (and serialized) --runs times, after some warmup builds
+# (the first build of a process pays for loading the data files),
+# and the report gives the mean, standard deviation, and minimum of each,
+# both in total and for each step recorded by timings.py.
+# Results can be saved as JSON and used as the baseline for a later run;
+# a run compared against a baseline reports how much slower or faster each spec got,
+# and fails if any spec got slower by more than --threshold percent.
+
+# Real specs from the testsuite, chosen to cover a range of sizes and styles.
+DEFAULT_TESTS = [
+    "github/WICG/import-maps/spec.bs",
+    "github/whatwg/dom/dom.bs",
+    "github/w3c/csswg-drafts/css-fonts-4/Overview.bs",
+    "github/heycam/webidl/index.bs",
+]
+
+RESULTS_VERSION = 1
+
+
+@dataclasses.dataclass
+class Stats:
+    # All in seconds
+    mean: float
+    stdev: float
+    min: float
+
+    @staticmethod
+    def fromSamples(samples: list[float]) -> Stats:
+        return Stats(
+            mean=statistics.mean(samples),
+            stdev=statistics.stdev(samples) if len(samples) > 1 else 0,
+            min=min(samples),
+        )
+
+
+@dataclasses.dataclass
+class SpecResult:
+    total: Stats
+    steps: dict[str, Stats]
+
+
+def bench(
+    files: list[str] | None = None,
+    scale: int = 1,
+    runs: int = 5,
+    warmup: int = 1,
+) -> dict[str, SpecResult]:
+    results: dict[str, SpecResult] = {}
+    with tempfile.TemporaryDirectory(prefix="bikeshed-bench-") as syntheticDir:
+        for name, path in corpus(files, scale, syntheticDir):
+            m.say(f"Benchmarking {name}...")
+            for _ in range(warmup):
+                build(path)
+            results[name] = summarize([build(path) for _ in range(runs)])
+    return results
+
+
+def corpus(files: list[str] | None, scale: int, syntheticDir: str) -> list[tuple[str, str]]:
+    # Returns (name, path) for every spec to benchmark.
+    specs = []
+    if files:
+        paths = test.testPaths(test.TestFilter(files=files))
+    else:
+        paths = [os.path.join(test.TEST_DIR, name) for name in DEFAULT_TESTS]
+    for path in paths:
+        specs.append((test.testNameForPath(path), path))
+    if scale > 0:
+        for name, text in syntheticSpecs(scale).items():
+            path = os.path.join(syntheticDir, name)
+            with open(path, "w", encoding="utf-8") as fh:
+                fh.write(text)
+            if name.endswith(".bs"):
+                specs.append((f"synthetic/{name}", path))
+    return specs
+
+
+def build(path: str) -> timings.Timings:
+    # Builds the spec once, the same way the testsuite does,
+    # recording how long each step took.
+    # (Allocation tracking is left off, since it slows everything down.)
+    recorder = timings.Timings(trackMemory=False, trackElements=False)
+    with m.messagesSilent(), timings.recording(recorder):
+        doc = test.processTest(path)
+        with timings.step("finish", "serialize"):
+            doc.serialize()
+    return recorder
+
+
+def summarize(runs: list[timings.Timings]) -> SpecResult:
+    stepSamples: dict[str, list[float]] = {}
+    for run in runs:
+        for key, wall in stepWalls(run).items():
+            stepSamples.setdefault(key, []).append(wall)
+    return SpecResult(
+        total=Stats.fromSamples([run.wall for run in runs]),
+        steps={key: Stats.fromSamples(samples) for key, samples in stepSamples.items()},
+    )
+
+
+def stepWalls(run: timings.Timings) -> dict[str, float]:
+    # Some steps run more than once in a build (like processAutolinks),
+    # so repeats get numbered to keep them apart.
+    walls: dict[str, float] = {}
+    for step in run.steps:
+        key = f"{step.section}/{step.name}"
+        i = 2
+        while key in walls:
+            key = f"{step.section}/{step.name}#{i}"
+            i += 1
+        walls[key] = step.wall
+    return walls
+
+
+def resultsToJson(results: dict[str, SpecResult]) -> dict[str, t.Any]:
+    return {
+        "version": RESULTS_VERSION,
+        "specs": {name: dataclasses.asdict(result) for name, result in results.items()},
+    }
+
+
+def resultsFromJson(data: dict[str, t.Any]) -> dict[str, SpecResult]:
+    if data.get("version") != RESULTS_VERSION:
+        msg = f"Unsupported benchmark results version {data.get('version')!r}."
+        raise ValueError(msg)
+    return {
+        name: SpecResult(
+            total=Stats(**result["total"]),
+            steps={key: Stats(**stats) for key, stats in result["steps"].items()},
+        )
+        for name, result in data["specs"].items()
+    }
+
+
+def saveResults(results: dict[str, SpecResult], path: str) -> None:
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(resultsToJson(results), fh, indent=2)
+
+
+def loadResults(path: str) -> dict[str, SpecResult] | None:
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            return resultsFromJson(json.load(fh))
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        m.die(f"Couldn't load the benchmark baseline from '{path}':\n{e}")
+        return None
+
+
+def formatStats(stats: Stats) -> str:
+    return f"{stats.mean * 1000:10.1f} ±{stats.stdev * 1000:8.1f} {stats.min * 1000:10.1f}"
+
+
+def printResults(results: dict[str, SpecResult], topSteps: int = 10) -> None:
+    header = f"{'mean ms':>10} {'stdev ms':>9} {'min ms':>10}"
+    for name, result in results.items():
+        m.p(f"{name}")
+        m.p(f"  {header}")
+        m.p(f"  {formatStats(result.total)}  total")
+        # Only the slowest steps; the rest are in the saved JSON.
+        slowest = sorted(result.steps.items(), key=lambda x: x[1].mean, reverse=True)[:topSteps]
+        for key, stats in slowest:
+            m.p(f"  {formatStats(stats)}  {key}")
+        m.p("")
+
+
+def compare(results: dict[str, SpecResult], baseline: dict[str, SpecResult], threshold: float) -> bool:
+    """
+    Prints how each spec's total time changed relative to the baseline,
+    plus the steps that changed the most.
+    Returns False if any spec got more than threshold percent slower.
+    """
+    regressed = []
+    for name, result in results.items():
+        if name not in baseline:
+            m.p(f"{name}: not in the baseline")
+            continue
+        base = baseline[name]
+        change = percentChange(base.total.mean, result.total.mean)
+        # The minimum is the least noisy measure of how fast a build *can* go,
+        # so both it and the mean have to be past the threshold to count.
+        isRegression = change > threshold and percentChange(base.total.min, result.total.min) > threshold
+        if isRegression:
+            regressed.append(name)
+        line = f"{name}: {base.total.mean * 1000:.1f}ms -> {result.total.mean * 1000:.1f}ms ({change:+.1f}%)"
+        m.p(m.printColor(line, color="red") if isRegression else line)
+        deltas = []
+        for key, stats in result.steps.items():
+            baseStats = base.steps.get(key)
+            if baseStats is not None:
+                deltas.append((stats.mean - baseStats.mean, key, baseStats, stats))
+        for delta, key, baseStats, stats in sorted(deltas, key=lambda x: abs(x[0]), reverse=True)[:5]:
+            if abs(delta) < 0.001:
+                break
+            m.p(
+                f"    {key}: {baseStats.mean * 1000:.1f}ms -> {stats.mean * 1000:.1f}ms ({percentChange(baseStats.mean, stats.mean):+.1f}%)",
+            )
+    if regressed:
+        m.p(m.printColor(f"✘ {len(regressed)} spec(s) got more than {threshold}% slower.", color="red"))
+        return False
+    m.p(m.printColor(f"✔ No spec got more than {threshold}% slower.", color="green"))
+    return True
+
+
+def percentChange(old: float, new: float) -> float:
+    if old == 0:
+        return 0
+    return (new - old) / old * 100
+
+
+def syntheticSpecs(scale: int) -> dict[str, str]:
+    """
+    Generates the synthetic specs, as a dict of filename to contents.
+    Each one leans on a single feature, with its size proportional to scale.
+    """
+    files = {
+        "dfns.bs": syntheticSpec("Synthetic Dfns", syntheticDfns(200 * scale)),
+        "autolinks.bs": syntheticSpec("Synthetic Autolinks", syntheticAutolinks(1000 * scale)),
+        "idl.bs": syntheticSpec("Synthetic IDL", syntheticIDL(50 * scale)),
+    }
+    numIncludes = 20 * scale
+    for i in range(numIncludes):
+        files[f"include-{i}.include"] = syntheticSection(i)
+    files["includes.bs"] = syntheticSpec(
+        "Synthetic Includes",
+        "\n".join(f"<pre class=include>\npath: include-{i}.include\n</pre>\n" for i in range(numIncludes)),
+    )
+    return files
+
+
+def syntheticSpec(title: str, body: str) -> str:
+    shortname = title.lower().replace(" ", "-")
+    return f"""<pre class=metadata>
+Title: {title}
+Group: test
+Shortname: {shortname}
+Level: 1
+Status: LS
+ED: http://example.com/{shortname}
+Abstract: A generated spec, for benchmarking.
+Editor: Example Editor
+Date: 1970-01-01
+Markup Shorthands: markdown yes, css yes, idl yes, dfn yes
+Complain About: accidental-2119 yes
+</pre>
+
+{body}
+"""
+
+
+def syntheticDfns(count: int) -> str:
+    lines = []
+    for i in range(count):
+        if i % 20 == 0:
+            lines.append(f"\n## Section {i // 20} ## {{#section-{i // 20}}}\n")
+        lines.append(f"A <dfn export>bench term {i}</dfn> is related to [=bench term {max(i - 1, 0)}=].\n")
+    return "\n".join(lines)
+
+
+def syntheticAutolinks(count: int) -> str:
+    lines = ["Local terms: " + ", ".join(f"<dfn>local term {i}</dfn>" for i in range(50)) + ".\n"]
+    for i in range(count):
+        if i % 50 == 0:
+            lines.append(f"\n## Section {i // 50} ## {{#section-{i // 50}}}\n")
+        # A mix of local dfn links, external property and IDL links, and biblio links.
+        lines.append(
+            f"Paragraph {i} mentions [=local term {i % 50}=], 'display', {{{{Element}}}}, and [[DOM]].\n",
+        )
+    return "\n".join(lines)
+
+
+def syntheticIDL(count: int) -> str:
+    blocks = []
+    for i in range(count):
+        blocks.append(
+            f"""
+## The <code>Bench{i}</code> interface ## {{#bench-{i}}}
+
+<pre class=idl>
+[Exposed=Window]
+interface Bench{i} {{
+    constructor();
+    attribute DOMString name{i};
+    readonly attribute unsigned long count{i};
+    undefined doThing{i}(long x, optional DOMString y = "");
+    Promise&lt;Bench{i}> clone{i}();
+}};
+</pre>
+
+The <dfn interface>Bench{i}</dfn> interface has a
+<dfn attribute for=Bench{i}>name{i}</dfn> attribute,
+a <dfn attribute for=Bench{i}>count{i}</dfn> attribute,
+a <dfn constructor for=Bench{i}>constructor()</dfn>,
+a <dfn method for=Bench{i}>doThing{i}(x, y)</dfn> method,
+and a <dfn method for=Bench{i}>clone{i}()</dfn> method.
+Calling {{{{Bench{i}/doThing{i}(x, y)}}}} updates {{{{Bench{i}/count{i}}}}}.
+""",
+        )
+    return "\n".join(blocks)
+
+
+def syntheticSection(i: int) -> str:
+    previous = max(i - 1, 0)
+    return f"""
+## Included section {i} ## {{#included-{i}}}
+
+The <dfn>included term {i}</dfn> is defined in an include,
+and links to [=included term {previous}=].
+
+To <dfn>run included algorithm {i}</dfn> given |input|:
+
+1. Let |result| be |input|.
+2. [=Run included algorithm {previous}=] given |result|.
+3. Return |result|.
+"""
@@ -1,9 +1,10 @@
 from __future__ import annotations
 
 import abc
+import bisect
 import dataclasses
 import json
-from collections import defaultdict
+from collections import Counter, defaultdict
 
 from . import constants, h, t
 from . import messages as m
@@ -336,55 +337,112 @@ def loadBiblioDataFile(lines: t.Iterator[str], storage: t.BiblioStorageT) -> Non
         pass
 
 
-def levenshtein(a: str, b: str) -> int:
-    "Calculates the Levenshtein distance between a and b."
+def levenshtein(a: str, b: str, limit: int | None = None) -> int:
+    """
+    Calculates the Levenshtein distance between a and b.
+    If limit is given, gives up as soon as the distance is sure to be more than that,
+    returning some number larger than limit.
+    """
     n, m = len(a), len(b)  # pylint: disable=redefined-outer-name
     if n > m:
         # Make sure n <= m, to use O(min(n,m)) space
         a, b = b, a
         n, m = m, n
+    if limit is not None and m - n > limit:
+        return m - n
 
     current: list[int] = list(range(n + 1))
-    for i in range(1, m + 1):
-        previous, current = current, [i] + [0] * n
-        for j in range(1, n + 1):
-            add, delete = previous[j] + 1, current[j - 1] + 1
-            change = previous[j - 1]
-            if a[j - 1] != b[i - 1]:
-                change = change + 1
-            current[j] = min(add, delete, change)
+    for i, bChar in enumerate(b, 1):
+        previous, current = current, [i]
+        for j, aChar in enumerate(a):
+            # Cheapest of a change (or match), an add, or a delete.
+            change = previous[j] if aChar == bChar else previous[j] + 1
+            current.append(min(change, previous[j + 1] + 1, current[j] + 1))
+        if limit is not None and min(current) > limit:
+            # Every remaining path already costs too much.
+            return min(current)
 
     return current[n]
 
 
-def findCloseBiblios(biblioKeys: t.Sequence[str], target: str, n: int = 5) -> list[str]:
+class KeyIndex:
+    """
+    Bigram postings over the biblio keys,
+    for finding the keys closest to a typo without measuring the distance to every one of them.
+
+    Each edit changes at most two of a string's bigrams,
+    so strings k edits apart share at least max(len(a), len(b)) - 1 - 2k bigrams.
+    Counting shared bigrams (cheap, from the postings) thus gives a lower bound on each key's distance,
+    and keys are only measured, best bound first, until the bounds pass the nth-closest distance found.
+    """
+
+    def __init__(self, keys: t.Iterable[str]) -> None:
+        self.keys = sorted(set(keys))
+        # Dict of {bigram => [(key position, times the bigram appears in it)]}
+        self.postings: defaultdict[str, list[tuple[int, int]]] = defaultdict(list)
+        for i, key in enumerate(self.keys):
+            for gram, count in bigrams(key).items():
+                self.postings[gram].append((i, count))
+
+    def closest(self, target: str, n: int, exclude: t.Callable[[str], bool]) -> list[tuple[int, str]]:
+        """
+        Returns the n closest keys (that aren't excluded) as (distance, key) pairs,
+        closest first, with ties in alphabetical order.
+        """
+        shared = [0] * len(self.keys)
+        for gram, targetCount in bigrams(target).items():
+            for i, count in self.postings.get(gram, ()):
+                shared[i] += min(targetCount, count)
+        candidates = []
+        for i, key in enumerate(self.keys):
+            longest = max(len(key), len(target))
+            bound = max(abs(len(key) - len(target)), (longest - 1 - shared[i] + 1) // 2)
+            candidates.append((bound, key))
+        candidates.sort()
+
+        best: list[tuple[int, str]] = []
+        for bound, key in candidates:
+            if len(best) == n and bound > best[-1][0]:
+                # Everything left is further away than what's been found.
+                break
+            if exclude(key):
+                continue
+            # Ties go to the alphabetically-first key, so a key as far away as the current worst can still get in.
+            limit = best[-1][0] if len(best) == n else None
+            keepClosest(best, (levenshtein(key, target, limit), key), n)
+        return best
+
+
+def bigrams(s: str) -> Counter[str]:
+    return Counter(s[i : i + 2] for i in range(len(s) - 1))
+
+
+def keepClosest(best: list[tuple[int, str]], candidate: tuple[int, str], n: int) -> None:
+    # Keeps best as the n smallest (distance, key) pairs seen so far.
+    if len(best) < n or candidate < best[-1]:
+        bisect.insort(best, candidate)
+        if len(best) > n:
+            best.pop()
+
+
+def findCloseBiblios(
+    biblioKeys: t.Iterable[str],
+    target: str,
+    n: int = 5,
+    index: KeyIndex | None = None,
+) -> list[str]:
     """
     Finds biblio entries close to the target.
     Returns all biblios with target as the substring,
     plus the 5 closest ones per levenshtein distance.
+    Pass a KeyIndex of biblioKeys to reuse it across calls.
     """
     target = target.lower()
-    names: list[tuple[str, int]] = []
-    superStrings: list[str] = []
-
-    for name in sorted(biblioKeys):
-        if target in name:
-            superStrings.append(name)
-        else:
-            distance = levenshtein(name, target)
-            tup = (name, distance)
-            if len(names) < n:
-                names.append(tup)
-                names.sort(key=lambda x: x[1])
-            elif distance >= names[-1][1]:
-                pass
-            else:
-                for i, entry in enumerate(names):
-                    if distance < entry[1]:
-                        names.insert(i, tup)
-                        names.pop()
-                        break
-    return sorted(s.strip() for s in superStrings) + [name.strip() for name, d in names]
+    if index is None:
+        index = KeyIndex(biblioKeys)
+    superStrings = [name for name in index.keys if target in name]
+    closest = index.closest(target, n, exclude=lambda name: target in name)
+    return sorted(s.strip() for s in superStrings) + [name.strip() for _, name in closest]
 
 
 def dedupBiblioReferences(doc: t.SpecT) -> None:
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import sys
+
+from . import messages as m
+from . import t
+
+if t.TYPE_CHECKING:
+    import argparse
+
+# Builds a single spec in this process, from `bikeshed spec`-style options.
+#
+# This is the shared entry point for everything that builds specs:
+# `bikeshed spec` itself (see cli.handleSpec(), which first offers the job to a daemon),
+# the daemon's jobs, and `bikeshed batch`'s workers.
+# It lives outside cli.py so those can call it without importing the command line.
+
+
+def buildSpec(options: argparse.Namespace, extras: list[str]) -> None:
+    from . import metadata, timings  # noqa: PLC0415
+    from .Spec import Spec  # noqa: PLC0415
+
+    doc = Spec(
+        inputFilename=options.infile,
+        debug=options.debug,
+        debugPrint=options.debugPrint,
+        token=options.ghToken,
+        lineNumbers=options.lineNumbers,
+    )
+    if not doc.valid:
+        m.die("Spec is in an invalid state; exitting.")
+        return
+    doc.mdCommandLine = metadata.fromCommandLine(extras)
+    if options.errorLevel:
+        doc.mdCommandLine.addData("Die On", options.errorLevel)
+    if options.errorTiming:
+        doc.mdCommandLine.addData("Die When", options.errorTiming)
+    if options.byos:
+        doc.mdCommandLine.addData("Group", "byos")
+    if options.timings:
+        recorder = timings.Timings(trackElements=options.timingsElements)
+        try:
+            with timings.recording(recorder):
+                doc.preprocess()
+                doc.finish(outputFilename=options.outfile)
+        finally:
+            # Even a build that died partway thru gets its report.
+            report = recorder.formatJson() if options.timingsFormat == "json" else recorder.formatText()
+            sys.stderr.write(report + "\n")
+        return
+    doc.preprocess()
+    doc.finish(outputFilename=options.outfile)
@@ -106,6 +106,20 @@ def main() -> None:
         help="Allow some features to execute arbitrary code from outside the Bikeshed codebase.",
     )
 
+    argparser.add_argument(
+        "--serial",
+        dest="serial",
+        action="store_true",
+        help="Run every processing phase one at a time on a single thread, rather than running independent phases (like the lints) concurrently.",
+    )
+    argparser.add_argument(
+        "--highlight-processes",
+        dest="highlightProcesses",
+        type=nonNegativeInt,
+        default=None,
+        help="How many worker processes to syntax-highlight code blocks with. Defaults to one per CPU; 0 or 1 highlights everything on the main process.",
+    )
+
     subparsers = argparser.add_subparsers(title="Subcommands", dest="subparserName")
 
     specParser = subparsers.add_parser("spec", help="Process a spec source file into a valid output file.")
@@ -153,6 +167,37 @@ def main() -> None:
         action="store_true",
         help="Hacky support for outputting line numbers on all error messages. Disables output, as this is hacky and might mess up your source.",
     )
+    specParser.add_argument(
+        "--timings",
+        dest="timings",
+        action="store_true",
+        help="Record the time, CPU time, and memory allocations of each build step, and print a report to stderr when done. (Always builds locally, rather than with a daemon.)",
+    )
+    specParser.add_argument(
+        "--timings-format",
+        dest="timingsFormat",
+        choices=["text", "json"],
+        default="text",
+        help="With --timings, the format of the report. Defaults to a text table.",
+    )
+    specParser.add_argument(
+        "--timings-elements",
+        dest="timingsElements",
+        action="store_true",
+        help="With --timings, also count the document's elements after each step. (Walks the whole document after every step, so it slows the build down further.)",
+    )
+    specParser.add_argument(
+        "--daemon",
+        dest="daemon",
+        action="store_true",
+        help="Hand the build to a running 'bikeshed daemon', rather than processing it in this process. Falls back to building locally if no daemon is running.",
+    )
+    specParser.add_argument(
+        "--daemon-socket",
+        dest="daemonSocket",
+        default=None,
+        help="Socket the daemon is listening on. Defaults to a per-user bikeshed-daemon socket in $XDG_RUNTIME_DIR or the system temp folder.",
+    )
 
     echidnaParser = subparsers.add_parser(
         "echidna",
@@ -265,6 +310,49 @@ def main() -> None:
         help="Bring-Your-Own-Spec: turns off all the Bikeshed auto-niceties, so you can piecemeal its features into your existing doc instead. Experimental, let me know if things get crashy or weird.",
     )
 
+    batchParser = subparsers.add_parser(
+        "batch",
+        help="Process many spec source files at once, in parallel.",
+    )
+    batchParser.add_argument("infiles", nargs="*", default=[], help="Paths to the source files.")
+    batchParser.add_argument(
+        "--manifest",
+        dest="manifest",
+        default=None,
+        help="File listing the specs to build, one per line, as 'INFILE' or 'INFILE OUTFILE'. Paths are relative to the manifest.",
+    )
+    batchParser.add_argument(
+        "-j",
+        "--jobs",
+        dest="jobs",
+        type=int,
+        default=None,
+        help="How many specs to build at once. Defaults to the number of CPUs.",
+    )
+    batchParser.add_argument(
+        "--gh-token",
+        dest="ghToken",
+        nargs="?",
+        help="GitHub access token. Useful to avoid API rate limits. Generate tokens: https://github.com/settings/tokens.",
+    )
+    batchParser.add_argument(
+        "--byos",
+        dest="byos",
+        action="store_true",
+        help="Bring-Your-Own-Spec: turns off all the Bikeshed auto-niceties, so you can piecemeal its features into your existing doc instead. Experimental, let me know if things get crashy or weird.",
+    )
+
+    daemonParser = subparsers.add_parser(
+        "daemon",
+        help="Run a build server that keeps the data files loaded between builds. Submit builds to it with 'bikeshed spec --daemon'.",
+    )
+    daemonParser.add_argument(
+        "--socket",
+        dest="socket",
+        default=None,
+        help="Unix socket to listen on. Defaults to a per-user bikeshed-daemon socket in $XDG_RUNTIME_DIR or the system temp folder.",
+    )
+
     updateParser = subparsers.add_parser(
         "update",
         help="Update supporting files (those in /spec-data).",
@@ -420,6 +508,14 @@ def main() -> None:
         nargs="+",
         help="Only run tests whose filenames contain any of these strings as substrings.",
     )
+    testParser.add_argument(
+        "-j",
+        "--jobs",
+        dest="jobs",
+        type=int,
+        default=1,
+        help="How many tests to run at once, each in its own process. Defaults to 1.",
+    )
 
     profileParser = subparsers.add_parser(
         "profile",
@@ -446,6 +542,58 @@ def main() -> None:
         help="Save the graph to a specified SVG file, rather than outputting with xdot immediately.",
     )
 
+    benchParser = subparsers.add_parser(
+        "bench",
+        help="Benchmark how fast Bikeshed builds a fixed set of real and synthetic specs.",
+    )
+    benchParser.add_argument(
+        "--file",
+        dest="files",
+        default=None,
+        nargs="+",
+        help="Benchmark the tests whose filenames contain any of these strings, rather than the default selection.",
+    )
+    benchParser.add_argument(
+        "--scale",
+        dest="scale",
+        type=int,
+        default=1,
+        help="Size multiplier for the generated synthetic specs. 0 skips them. Defaults to 1.",
+    )
+    benchParser.add_argument(
+        "--runs",
+        dest="runs",
+        type=int,
+        default=5,
+        help="How many timed builds of each spec to do. Defaults to 5.",
+    )
+    benchParser.add_argument(
+        "--warmup",
+        dest="warmup",
+        type=int,
+        default=1,
+        help="How many untimed builds of each spec to do first. Defaults to 1.",
+    )
+    benchParser.add_argument(
+        "--save",
+        dest="saveFile",
+        default=None,
+        help="Save the results as JSON to this file, for use as a later --compare baseline.",
+    )
+    benchParser.add_argument(
+        "--compare",
+        dest="baselineFile",
+        default=None,
+        help="Compare the results against a baseline saved with --save.",
+    )
+    benchParser.add_argument(
+        "--threshold",
+        dest="threshold",
+        type=float,
+        default=10,
+        help="With --compare, how many percent slower a spec can get before it counts as a regression. Defaults to 10.",
+    )
+
     templateParser = subparsers.add_parser("template", help="Outputs a skeleton .bs file for you to start with.")
     templateParser.add_argument(
         "variant",
@@ -485,10 +633,12 @@ def main() -> None:
     constants.dryRun = options.dryRun
     constants.chroot = not options.allowNonlocalFiles
     constants.executeCode = options.allowExecute
+    constants.serialPhases = options.serial
+    constants.highlightProcesses = options.highlightProcesses
 
     m.printOpener()
 
-    if options.subparserName in ("spec", "echnida", "watch", "serve", "refs"):
+    if options.subparserName in ("spec", "echnida", "watch", "serve", "refs", "batch", "daemon"):
         updateMode = update.UpdateMode.NONE if options.skipUpdate else update.UpdateMode.BOTH
         update.fixupDataFiles(updateMode=updateMode)
     if options.subparserName == "update":
@@ -501,6 +651,10 @@ def main() -> None:
         handleWatch(options, extras)
     elif options.subparserName == "serve":
         handleServe(options, extras)
+    elif options.subparserName == "batch":
+        handleBatch(options, extras)
+    elif options.subparserName == "daemon":
+        handleDaemon(options)
     elif options.subparserName == "debug":
         handleDebug(options, extras)
     elif options.subparserName == "refs":
@@ -515,6 +669,8 @@ def main() -> None:
         handleTest(options, extras)
     elif options.subparserName == "profile":
         handleProfile(options)
+    elif options.subparserName == "bench":
+        handleBench(options)
     elif options.subparserName == "template":
         handleTemplate(options)
     elif options.subparserName == "wpt":
@@ -540,28 +696,55 @@ def handleUpdate(options: argparse.Namespace) -> None:
 
 
 def handleSpec(options: argparse.Namespace, extras: list[str]) -> None:
-    from . import metadata
-    from .Spec import Spec
+    from . import build
+
+    if getattr(options, "daemon", False) and not options.timings:
+        if submitToDaemon(options, extras):
+            return
+        m.warn("Couldn't reach a Bikeshed daemon, so building locally instead.")
+    build.buildSpec(options, extras)
+
+
+def submitToDaemon(options: argparse.Namespace, extras: list[str]) -> bool:
+    from . import daemon
 
-    doc = Spec(
-        inputFilename=options.infile,
-        debug=options.debug,
-        debugPrint=options.debugPrint,
-        token=options.ghToken,
-        lineNumbers=options.lineNumbers,
+    result = daemon.submit(daemon.jobFromOptions(options, extras), socketPath=options.daemonSocket)
+    if result is None:
+        return False
+    m.state.fh.write(result["messages"])
+    if result["closed"]:
+        # The daemon already closed out the message stream.
+        m.state.closed = True
+    if result["output"] is not None:
+        sys.stdout.write(result["output"])
+    if result["exitCode"]:
+        sys.exit(result["exitCode"])
+    return True
+
+
+def handleBatch(options: argparse.Namespace, extras: list[str]) -> None:
+    from . import batch
+
+    jobs = batch.jobsFromArgs(options.infiles, options.manifest)
+    succeeded = batch.batch(
+        jobs,
+        extras,
+        numWorkers=options.jobs,
+        options={
+            "ghToken": options.ghToken,
+            "errorLevel": options.errorLevel,
+            "errorTiming": options.errorTiming,
+            "byos": options.byos,
+        },
     )
-    if not doc.valid:
-        m.die("Spec is in an invalid state; exitting.")
-        return
-    doc.mdCommandLine = metadata.fromCommandLine(extras)
-    if options.errorLevel:
-        doc.mdCommandLine.addData("Die On", options.errorLevel)
-    if options.errorTiming:
-        doc.mdCommandLine.addData("Die When", options.errorTiming)
-    if options.byos:
-        doc.mdCommandLine.addData("Group", "byos")
-    doc.preprocess()
-    doc.finish(outputFilename=options.outfile)
+    if not succeeded:
+        sys.exit(2)
+
+
+def handleDaemon(options: argparse.Namespace) -> None:
+    from . import daemon
+
+    daemon.serve(socketPath=options.socket)
 
 
 def handleEchidna(options: argparse.Namespace, extras: list[str]) -> None:
@@ -738,9 +921,9 @@ def handleTest(options: argparse.Namespace, extras: list[str]) -> None:
     m.state.dieOn = "nothing"
     filters = test.TestFilter.fromOptions(options)
     if options.rebase:
-        test.rebase(filters, md=md)
+        test.rebase(filters, md=md, jobs=options.jobs)
     else:
-        result = test.run(filters, md=md)
+        result = test.run(filters, md=md, jobs=options.jobs)
         sys.exit(0 if result else 1)
 
 
@@ -757,6 +940,25 @@ def handleProfile(options: argparse.Namespace) -> None:
         )
 
 
+def handleBench(options: argparse.Namespace) -> None:
+    from . import bench
+
+    baseline = None
+    if options.baselineFile:
+        baseline = bench.loadResults(options.baselineFile)
+        if baseline is None:
+            # Don't spend ages benchmarking if there's nothing to compare it to.
+            sys.exit(2)
+    # Like the testsuite, errors in the specs shouldn't stop the builds.
+    m.state.dieOn = "nothing"
+    results = bench.bench(files=options.files, scale=options.scale, runs=options.runs, warmup=options.warmup)
+    bench.printResults(results)
+    if options.saveFile:
+        bench.saveResults(results, options.saveFile)
+    if baseline is not None and not bench.compare(results, baseline, options.threshold):
+        sys.exit(1)
+
+
 def handleTemplate(options: argparse.Namespace) -> None:
     if not options.outfile:
         ret = template.getTemplate(options.variant)
@@ -782,3 +984,11 @@ def handleWpt(options: argparse.Namespace) -> None:
                 fh.write(template.getTemplate("wpt") or "")
     else:
         m.failure("Unknown sub-option for `bikeshed wpt` (currently only --template is supported).")
+
+
+def nonNegativeInt(value: str) -> int:
+    num = int(value)
+    if num < 0:
+        msg = f"must be 0 or more, got {num}"
+        raise argparse.ArgumentTypeError(msg)
+    return num
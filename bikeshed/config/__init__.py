@@ -25,17 +25,22 @@ from .dfnTypes import (
     typesUsingFor,
 )
 from .main import (
+    cachePath,
     chrootPath,
+    docCachePath,
     docPath,
     doEvery,
     englishFromList,
     flatIntersperse,
     groupFromKey,
     intersperse,
+    loadJsonCache,
     processTextNodes,
     reSubObject,
     safeIndex,
+    saveJsonCache,
     scriptPath,
     simplifyText,
     splitForValues,
+    writeCacheFile,
 )
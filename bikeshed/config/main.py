@@ -1,7 +1,10 @@
 from __future__ import annotations
 
+import contextlib
+import json
 import os
 import re
+import tempfile
 import time
 
 from .. import messages, t
@@ -160,6 +163,74 @@ def scriptPath(*pathSegs: str) -> str:
     return path
 
 
+def cachePath(*pathSegs: str) -> str:
+    # Where Bikeshed keeps data that's only there to speed up later runs,
+    # and can be deleted at any time.
+    # Follows the platform's convention for per-user cache folders,
+    # and can be overridden with the BIKESHED_CACHE_DIR env var.
+    root = os.environ.get("BIKESHED_CACHE_DIR")
+    if not root:
+        if os.name == "nt":
+            base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+        else:
+            base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        root = os.path.join(base, "bikeshed")
+    return os.path.join(root, *pathSegs)
+
+
+def docCachePath(doc: t.SpecT, *pathSegs: str) -> str | None:
+    # The cachePath() a doc's build should use,
+    # or None if it shouldn't use one at all.
+    # Tests never do, so their results don't depend on what earlier runs cached.
+    if doc.testing:
+        return None
+    return cachePath(*pathSegs)
+
+
+def loadJsonCache[T](path: str, version: t.Any, parse: t.Callable[[t.Any], T]) -> T | None:
+    # Reads a cache file written by saveJsonCache(), and returns parse()'s result on its data.
+    # A missing, corrupted, or out-of-date cache returns None instead,
+    # which just means whatever it held gets recomputed.
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            data = json.load(fh)
+        if data.get("version") != version:
+            return None
+        return parse(data)
+    except Exception:
+        return None
+
+
+def saveJsonCache(path: str, version: t.Any, data: dict[str, t.Any], description: str) -> bool:
+    return writeCacheFile(
+        path,
+        lambda fh: json.dump({"version": version, **data}, fh, ensure_ascii=False, separators=(",", ":")),
+        description,
+    )
+
+
+def writeCacheFile(path: str, write: t.Callable[[t.TextIO], t.Any], description: str) -> bool:
+    # Writes a cache file to a temp file and moves it into place,
+    # so a concurrent build never sees a half-written cache.
+    # Failing to save a cache just makes the next build slower,
+    # so it only warns (and returns False).
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tempPath = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                write(fh)
+            os.replace(tempPath, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(tempPath)
+            raise
+    except OSError as e:
+        messages.warn(f"Couldn't save the {description} to '{path}':\n{e}")
+        return False
+    return True
+
+
 def docPath(doc: t.SpecT, *pathSegs: str) -> str | None:
     ret = doc.inputSource.relative(*pathSegs)
     if ret:
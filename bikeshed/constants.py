@@ -7,6 +7,11 @@ refStatus: StringEnum = StringEnum("current", "snapshot")
 biblioDisplay: StringEnum = StringEnum("index", "inline", "direct")
 chroot: bool = True
 executeCode: bool = False
+# Run all of processDocument's phases one at a time; see phases.py.
+serialPhases: bool = False
+# How many processes to syntax-highlight with; see highlight.py.
+# None means one per CPU.
+highlightProcesses: int | None = None
 
 # Mark the start and end of macro expansions, so adjacent expansions
 # can't each accidentally supply half of a macro.
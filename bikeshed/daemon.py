@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import stat
+import tempfile
+import traceback
+
+from . import build, constants, retrieve, t
+from . import messages as m
+
+# A long-running build server.
+#
+# Every `bikeshed spec` run re-reads and re-parses the same handful of data files
+# (specs.json, methods.json, fors.json, biblio-keys.json, link-defaults, languages, doctypes...)
+# before it even looks at the document.
+# The daemon instead keeps those parsed (see DataFileRequester.fetchParsed())
+# and runs each submitted build in-process, against the warm copies.
+# The cache is dropped whenever the data files' manifest changes,
+# so an update (by `bikeshed update` or anything else) is picked up by the next job.
+#
+# The protocol is a single line of JSON each way over a Unix socket:
+# the client sends a job (see jobFromOptions()),
+# and the daemon answers with {"exitCode", "messages", "output", "closed"}.
+# "output" is only filled in when the job's outfile is "-".
+#
+# Unix sockets aren't available everywhere (notably, on Windows),
+# in which case there's no daemon, and `--daemon` just builds locally.
+
+
+def supported() -> bool:
+    return hasattr(socket, "AF_UNIX")
+
+
+def defaultSocketPath() -> str:
+    # Per-user, so one user's daemon never runs another user's builds.
+    # XDG_RUNTIME_DIR is already private to the user, if it's available.
+    runtimeDir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtimeDir and os.path.isdir(runtimeDir):
+        return os.path.join(runtimeDir, "bikeshed-daemon.sock")
+    return os.path.join(tempfile.gettempdir(), f"bikeshed-daemon-{os.getuid()}.sock")
+
+
+def serve(socketPath: str | None = None) -> None:
+    if not supported():
+        m.die("The Bikeshed daemon needs Unix sockets, which aren't available on this platform.")
+        return
+    socketPath = socketPath or defaultSocketPath()
+    if os.path.exists(socketPath):
+        if isAlive(socketPath):
+            m.die(f"There's already a Bikeshed daemon listening on '{socketPath}'.")
+            return
+        # Left over from a daemon that didn't shut down cleanly.
+        os.unlink(socketPath)
+
+    retrieve.defaultRequester.cache = retrieve.DataCache()
+    retrieve.defaultRequester.cache.refresh(retrieve.defaultRequester)
+    # Only this user can connect; the socket is created that way,
+    # rather than being chmod-ed after it's already listening.
+    oldUmask = os.umask(0o177)
+    try:
+        server = socketserver.UnixStreamServer(socketPath, JobHandler)
+    finally:
+        os.umask(oldUmask)
+    m.say(f"Bikeshed daemon listening on '{socketPath}'. Ctrl-C to stop.")
+    # Treat a plain `kill` like Ctrl-C, so the socket still gets cleaned up.
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        with contextlib.suppress(OSError):
+            os.unlink(socketPath)
+        m.say("Bikeshed daemon stopped.")
+
+
+class JobHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        line = self.rfile.readline()
+        if not line:
+            # Just checking if the daemon is alive.
+            return
+        try:
+            job = json.loads(line)
+        except ValueError as e:
+            result = {
+                "exitCode": 1,
+                "messages": f"Couldn't parse the build job:\n{e}\n",
+                "output": None,
+                "closed": False,
+            }
+        else:
+            result = runJob(job)
+        self.wfile.write(json.dumps(result).encode("utf-8") + b"\n")
+
+
+def runJob(job: dict[str, t.Any]) -> dict[str, t.Any]:
+    cache = retrieve.defaultRequester.cache
+    if cache is not None and cache.refresh(retrieve.defaultRequester):
+        m.say("Data files changed, reloading.")
+
+    messages = io.StringIO()
+    output = io.StringIO()
+    exitCode = 0
+    closed = False
+    oldCwd = os.getcwd()
+    oldConstants = (
+        constants.dryRun,
+        constants.chroot,
+        constants.executeCode,
+        constants.serialPhases,
+        constants.highlightProcesses,
+    )
+    try:
+        os.chdir(job["cwd"])
+        constants.dryRun = job["constants"]["dryRun"]
+        constants.chroot = job["constants"]["chroot"]
+        constants.executeCode = job["constants"]["executeCode"]
+        constants.serialPhases = job["constants"]["serialPhases"]
+        constants.highlightProcesses = job["constants"]["highlightProcesses"]
+        with m.withMessageState(messages, closed=False, **job["messageState"]), contextlib.redirect_stdout(output):
+            try:
+                build.buildSpec(argparse.Namespace(**job["options"]), job["extras"])
+            except SystemExit as e:
+                exitCode = e.code if isinstance(e.code, int) else 1
+            except Exception:  # pylint: disable=broad-except
+                # One broken build shouldn't take down the daemon.
+                messages.write(traceback.format_exc())
+                exitCode = 1
+            closed = m.state.closed
+    except OSError as e:
+        messages.write(f"Couldn't run the build job:\n{e}\n")
+        exitCode = 1
+    finally:
+        os.chdir(oldCwd)
+        (
+            constants.dryRun,
+            constants.chroot,
+            constants.executeCode,
+            constants.serialPhases,
+            constants.highlightProcesses,
+        ) = oldConstants
+
+    return {
+        "exitCode": exitCode,
+        "messages": messages.getvalue(),
+        "output": output.getvalue() if job["options"].get("outfile") == "-" else None,
+        "closed": closed,
+    }
+
+
+def jobFromOptions(options: argparse.Namespace, extras: list[str]) -> dict[str, t.Any]:
+    # Captures everything the in-process build would have picked up from the command line,
+    # so the daemon can reproduce it.
+    return {
+        "cwd": os.getcwd(),
+        "options": {
+            "infile": options.infile,
+            "outfile": options.outfile,
+            "debug": options.debug,
+            "debugPrint": options.debugPrint,
+            "ghToken": options.ghToken,
+            "lineNumbers": options.lineNumbers,
+            "errorLevel": options.errorLevel,
+            "errorTiming": options.errorTiming,
+            "byos": options.byos,
+            # Timed builds are always run locally.
+            "timings": False,
+        },
+        "extras": extras,
+        "messageState": m.state.settings(),
+        "constants": {
+            "dryRun": constants.dryRun,
+            "chroot": constants.chroot,
+            "executeCode": constants.executeCode,
+            "serialPhases": constants.serialPhases,
+            "highlightProcesses": constants.highlightProcesses,
+        },
+    }
+
+
+def submit(job: dict[str, t.Any], socketPath: str | None = None) -> dict[str, t.Any] | None:
+    """
+    Sends the job to the daemon and waits for the result.
+    Returns None if there's no daemon listening.
+    """
+    if not supported():
+        return None
+    socketPath = socketPath or defaultSocketPath()
+    if not ownedByUser(socketPath):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(socketPath)
+            sock.sendall(json.dumps(job).encode("utf-8") + b"\n")
+            with sock.makefile("rb") as fh:
+                response = fh.readline()
+    except OSError:
+        return None
+    if not response:
+        return None
+    return t.cast("dict[str, t.Any]", json.loads(response))
+
+
+def ownedByUser(socketPath: str) -> bool:
+    # The job includes the GitHub token, and the daemon's answer is trusted as the build's output,
+    # so only talk to a socket this user created.
+    # (Without XDG_RUNTIME_DIR, the default path is in the shared temp folder,
+    # where another user could have put their own socket first.)
+    try:
+        info = os.lstat(socketPath)
+    except OSError:
+        return False
+    if not stat.S_ISSOCK(info.st_mode):
+        return False
+    if info.st_uid != os.getuid():
+        m.warn(f"The daemon socket '{socketPath}' belongs to another user, so it won't be used.")
+        return False
+    return True
+
+
+def isAlive(socketPath: str) -> bool:
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(socketPath)
+    except OSError:
+        return False
+    return True
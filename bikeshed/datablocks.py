@@ -648,7 +648,7 @@ def processAnchors(anchors: InfoTreeT, doc: t.SpecT, lineNum: int | None = None)
             else:
                 aText = displayText
             doc.refs.anchorBlockRefs.refs[aText].append(
-                refs.RefWrapper(
+                refs.RefWrapper.fromData(
                     aText,
                     displayText,
                     refData,
@@ -877,6 +877,10 @@ def transformIncludeRaw(data: str, el: t.ElementT, doc: t.SpecT) -> t.ElementT |
     return ret
 
 
+def parseInfoTreeText(text: str, indent: int = 4, lineNum: int | None = 0) -> InfoTreeT:
+    return parseInfoTree(text.split("\n"), indent, lineNum)
+
+
 def parseInfoTree(lines: list[str], indent: int = 4, lineNum: int | None = 0) -> InfoTreeT:
     # Parses sets of info, which can be arranged into trees.
     # Each info is a set of key/value pairs, semicolon-separated:
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import bisect
+import mmap
+import os
+import struct
+
+from . import t
+
+# Shared reading code for the compiled, mmap-able indexes of the text data files
+# (see refs/anchorindex.py, refs/biblioindex.py, and wpt/wptindex.py for the formats,
+# and update/updateIndexes.py for the compilers).
+#
+# Every index header starts with the same three fields:
+#     magic (8 bytes), source size (u64), source mtime in ns (u64)
+# followed by whatever counts the format needs.
+# An index is only used if its source file still has that size and mtime;
+# otherwise it's stale, and the caller falls back to reading the source as text.
+
+
+def mapFile(path: str) -> mmap.mmap | None:
+    try:
+        with open(path, "rb") as fh:
+            return mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # (mmap raises ValueError for empty files.)
+        return None
+
+
+def openIndex(dataPath: str, indexPath: str, header: struct.Struct, magic: bytes) -> mmap.mmap | None:
+    """
+    Maps the index at indexPath,
+    if it exists, has a full header, and was compiled from the current version of dataPath.
+    Otherwise returns None.
+    """
+    try:
+        dataStat = os.stat(dataPath)
+    except OSError:
+        return None
+    index = mapFile(indexPath)
+    if index is None:
+        return None
+    try:
+        indexMagic, size, mtime, *_ = header.unpack_from(index, 0)
+    except struct.error:
+        index.close()
+        return None
+    if indexMagic != magic or size != dataStat.st_size or mtime != dataStat.st_mtime_ns:
+        index.close()
+        return None
+    return index
+
+
+def openIndexAndData(
+    dataPath: str,
+    indexPath: str,
+    header: struct.Struct,
+    magic: bytes,
+) -> tuple[mmap.mmap, mmap.mmap] | None:
+    # For the indexes that only record where things are in the source file,
+    # and decode them straight from it.
+    index = openIndex(dataPath, indexPath, header, magic)
+    if index is None:
+        return None
+    data = mapFile(dataPath)
+    if data is None:
+        index.close()
+        return None
+    return index, data
+
+
+def lowerBound(count: int, target: bytes, keyAt: t.Callable[[int], bytes]) -> int:
+    # The position of the first of count sorted keys that's >= target.
+    return bisect.bisect_left(range(count), target, key=keyAt)
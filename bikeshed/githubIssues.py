@@ -0,0 +1,384 @@
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import json
+import os
+
+import aiohttp
+
+from . import config, printjson, t
+from . import messages as m
+
+if t.TYPE_CHECKING:
+    from .repository import GithubRepository
+
+# Fetches the GitHub issues that a spec inlines (with `Inline Github Issues`),
+# for unsortedJunk.inlineRemoteIssues().
+#
+# Specs can inline hundreds of issues,
+# so rather than asking for them one at a time:
+# * Issues that have been fetched before are re-requested with their ETag,
+#   so unchanged ones come back as a cheap 304 (which also doesn't count against the rate limit).
+#   These conditional requests are all sent at once,
+#   up to MAX_CONCURRENT_REQUESTS in flight at a time.
+# * Issues that haven't been fetched before (or that were fetched via GraphQL, so have no ETag)
+#   are looked up in batches thru the GraphQL API, GRAPHQL_BATCH_SIZE per request,
+#   if there's a GitHub token to do so with (GraphQL doesn't allow anonymous requests).
+#   Anything the GraphQL lookup couldn't find falls back to a normal REST request,
+#   which produces the usual error messages.
+#   GraphQL has no conditional requests, so issues fetched that way are stored without an ETag,
+#   and authenticated builds re-fetch them thru GraphQL every time rather than getting 304s.
+#   (That's still just one request per GRAPHQL_BATCH_SIZE issues.)
+#
+# Fetched issues are kept in a per-user cache (see IssueStore),
+# on top of the snapshot of issues shipped in spec-data,
+# so if GitHub can't be reached, previously-fetched issues can still be inlined.
+
+MAX_CONCURRENT_REQUESTS = 8
+REQUEST_TIMEOUT = 5
+GRAPHQL_BATCH_SIZE = 50
+
+# Only the parts of the issue that actually get inlined are kept.
+KEPT_FIELDS = ("number", "title", "body_html", "ETag")
+
+
+@dataclasses.dataclass
+class IssueKey:
+    user: str
+    repo: str
+    num: str
+
+    def __str__(self) -> str:
+        return f"{self.user}/{self.repo}/{self.num}"
+
+
+@dataclasses.dataclass
+class IssueResponse:
+    # The parsed issue, from a 200 REST response or a GraphQL lookup
+    data: dict[str, t.Any] | None = None
+    status: int | None = None
+    # The raw body of an error response
+    body: str = ""
+    # "connection", "timeout", or the text of some other exception,
+    # if the request didn't produce a response at all.
+    error: str | None = None
+
+
+def fetchIssues(
+    keys: list[IssueKey],
+    repo: GithubRepository,
+    token: str | None,
+    seed: dict[str, dict[str, t.Any]],
+    store: IssueStore | None,
+) -> dict[str, dict[str, t.Any]]:
+    """
+    Returns the data for each of the issues that could be fetched (or were cached),
+    keyed by "user/repo/num".
+    seed is the issue data shipped with Bikeshed;
+    store, if given, is where fetched issues are cached between runs.
+    """
+    cached: dict[str, dict[str, t.Any]] = {}
+    for key in keys:
+        data = (store.get(str(key)) if store else None) or seed.get(str(key))
+        if data is not None:
+            cached[str(key)] = data
+
+    m.say(f"Fetching {len(keys)} GitHub issue{'s' if len(keys) != 1 else ''}...")
+    responses = asyncio.run(requestIssues(keys, repo, token, cached))
+
+    results: dict[str, dict[str, t.Any]] = {}
+    reported: set[str] = set()
+    try:
+        for key in keys:
+            data = resolve(key, responses[str(key)], cached.get(str(key)), token, reported)
+            if data is None:
+                continue
+            results[str(key)] = data
+            if store and data != cached.get(str(key)):
+                store.add(str(key), data)
+    finally:
+        if store:
+            store.save()
+    return results
+
+
+def resolve(
+    key: IssueKey,
+    res: IssueResponse,
+    cached: dict[str, t.Any] | None,
+    token: str | None,
+    reported: set[str],
+) -> dict[str, t.Any] | None:
+    # Turns the response for an issue into its data, reporting any problems.
+    # Errors that would be the same for every issue (bad token, rate limit)
+    # are only reported once.
+    def reportOnce(msg: str) -> None:
+        if msg not in reported:
+            reported.add(msg)
+            m.die(msg)
+
+    if res.data is not None:
+        return res.data
+    if res.status is None:
+        # Offline or something, recover if possible
+        if cached is not None:
+            return cached
+        if res.error == "connection":
+            m.warn(f"Connection error fetching issue #{key.num}")
+        elif res.error == "timeout":
+            m.warn(f"Timeout while fetching issue #{key.num}")
+        else:
+            m.warn(f"Error while fetching issue #{key.num}:\n{res.error}")
+        return None
+    if res.status == 304 and cached is not None:
+        # Unchanged, I can use the cache
+        return cached
+    try:
+        error = json.loads(res.body)
+    except ValueError:
+        error = None
+    if res.status == 401:
+        if isinstance(error, dict) and error.get("message") == "Bad credentials":
+            reportOnce(f"'{token}' is not a valid GitHub OAuth token. See https://github.com/settings/tokens")
+        else:
+            reportOnce("401 error when fetching GitHub Issues:\n" + printjson.printjson(error))
+    elif res.status == 403:
+        if isinstance(error, dict) and str(error.get("message", "")).startswith("API rate limit exceeded"):
+            reportOnce(
+                "GitHub Issues API rate limit exceeded. Get an OAuth token from https://github.com/settings/tokens to increase your limit, or just wait an hour for your limit to refresh; Bikeshed has cached all the issues so far and will resume from where it left off.",
+            )
+        else:
+            reportOnce("403 error when fetching GitHub Issues:\n" + printjson.printjson(error))
+    else:
+        if error is not None:
+            details = printjson.printjson(error)
+        else:
+            details = "First 100 characters of error:\n" + res.body[0:100]
+        m.die(f"{res.status} error when fetching GitHub Issues:\n" + details)
+    return None
+
+
+async def requestIssues(
+    keys: list[IssueKey],
+    repo: GithubRepository,
+    token: str | None,
+    cached: dict[str, dict[str, t.Any]],
+) -> dict[str, IssueResponse]:
+    limit = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+    unique = list({str(key): key for key in keys}.values())
+    # Issues with an ETag get a conditional request;
+    # the rest are looked up via GraphQL, if possible.
+    conditional = [key for key in unique if cached.get(str(key), {}).get("ETag")]
+    lookups = [key for key in unique if not cached.get(str(key), {}).get("ETag")]
+    async with aiohttp.ClientSession(trust_env=True, timeout=timeout) as session:
+
+        async def rest(key: IssueKey) -> tuple[str, IssueResponse]:
+            async with limit:
+                return str(key), await requestIssue(session, key, repo, token, cached.get(str(key)))
+
+        async def graphql(batch: list[IssueKey]) -> dict[str, IssueResponse]:
+            async with limit:
+                return await requestGraphqlBatch(session, batch, repo, token)
+
+        restTasks = [asyncio.create_task(rest(key)) for key in conditional]
+        found: dict[str, IssueResponse] = {}
+        if token and repo.graphqlApi:
+            batches = [lookups[i : i + GRAPHQL_BATCH_SIZE] for i in range(0, len(lookups), GRAPHQL_BATCH_SIZE)]
+            for batchResult in await asyncio.gather(*[graphql(batch) for batch in batches]):
+                found.update(batchResult)
+        # Whatever GraphQL couldn't find gets a normal request.
+        restTasks.extend(asyncio.create_task(rest(key)) for key in lookups if str(key) not in found)
+        responses = dict(await asyncio.gather(*restTasks))
+    responses.update(found)
+    return responses
+
+
+async def requestIssue(
+    session: aiohttp.ClientSession,
+    key: IssueKey,
+    repo: GithubRepository,
+    token: str | None,
+    cached: dict[str, t.Any] | None,
+) -> IssueResponse:
+    url = f"{repo.api}/repos/{key.user}/{key.repo}/issues/{key.num}"
+    headers = {"Accept": "application/vnd.github.v3.html+json"}
+    if token is not None:
+        headers["Authorization"] = "token " + token
+    if cached is not None and cached.get("ETag"):
+        # Have a cached response, see if it changed
+        headers["If-None-Match"] = cached["ETag"]
+    try:
+        async with session.get(url, headers=headers) as response:
+            body = await response.text()
+            if response.status != 200:
+                return IssueResponse(status=response.status, body=body)
+            data = json.loads(body)
+            data["ETag"] = response.headers.get("ETag")
+            return IssueResponse(data=trimIssue(data), status=200)
+    except TimeoutError:
+        return IssueResponse(error="timeout")
+    except aiohttp.ClientConnectionError:
+        return IssueResponse(error="connection")
+    except Exception as e:
+        return IssueResponse(error=str(e) or type(e).__name__)
+
+
+async def requestGraphqlBatch(
+    session: aiohttp.ClientSession,
+    batch: list[IssueKey],
+    repo: GithubRepository,
+    token: str | None,
+) -> dict[str, IssueResponse]:
+    # Looks up a batch of issues in a single GraphQL query,
+    # with an aliased field per repository and per issue.
+    # Returns just the issues that were found;
+    # if anything goes wrong, that's nothing, and they all get requested normally.
+    query = graphqlQuery(batch)
+    if query is None:
+        return {}
+    headers = {"Authorization": f"bearer {token}"}
+    try:
+        async with session.post(repo.graphqlApi, json={"query": query}, headers=headers) as response:
+            if response.status != 200:
+                return {}
+            result = json.loads(await response.text())
+    except Exception:
+        return {}
+    repos = (result or {}).get("data") or {}
+    found = {}
+    for key, (repoAlias, issueAlias) in graphqlAliases(batch).items():
+        issue = (repos.get(repoAlias) or {}).get(issueAlias)
+        if not issue or "title" not in issue:
+            continue
+        found[key] = IssueResponse(
+            data={"number": issue["number"], "title": issue["title"], "body_html": issue["bodyHTML"], "ETag": None},
+            status=200,
+        )
+    return found
+
+
+def graphqlAliases(batch: list[IssueKey]) -> dict[str, tuple[str, str]]:
+    repoAliases: dict[tuple[str, str], str] = {}
+    aliases = {}
+    for key in batch:
+        repoAlias = repoAliases.setdefault((key.user, key.repo), f"r{len(repoAliases)}")
+        aliases[str(key)] = (repoAlias, f"i{key.num}")
+    return aliases
+
+
+def graphqlQuery(batch: list[IssueKey]) -> str | None:
+    fields = "number title bodyHTML"
+    repos: dict[tuple[str, str], list[str]] = {}
+    for key in batch:
+        if not key.num.isdigit():
+            # Not a real issue number; let the REST request complain about it.
+            continue
+        repos.setdefault((key.user, key.repo), []).append(key.num)
+    if not repos:
+        return None
+    aliases = graphqlAliases(batch)
+    parts = []
+    for (user, repoName), nums in repos.items():
+        repoAlias = aliases[f"{user}/{repoName}/{nums[0]}"][0]
+        issues = " ".join(
+            f"i{num}: issueOrPullRequest(number: {int(num)}) {{ ... on Issue {{ {fields} }} ... on PullRequest {{ {fields} }} }}"
+            for num in dict.fromkeys(nums)
+        )
+        # GraphQL strings are escaped the same way as JSON strings.
+        parts.append(f"{repoAlias}: repository(owner: {json.dumps(user)}, name: {json.dumps(repoName)}) {{ {issues} }}")
+    return "query { " + " ".join(parts) + " }"
+
+
+def trimIssue(data: dict[str, t.Any]) -> dict[str, t.Any]:
+    return {field: data.get(field) for field in KEPT_FIELDS}
+
+
+class IssueStore:
+    """
+    The per-user cache of fetched issues.
+
+    It's a JSON-lines file, one issue per line,
+    so updating a few issues just appends a few lines
+    rather than rewriting the whole thing.
+    Later lines override earlier ones for the same issue,
+    and a half-written last line (from a build that got killed) is ignored.
+    Once enough of the file is overridden lines, it's compacted.
+    Compacting replaces the file with what this build knows,
+    so if another build appended to it in the meantime, those issues are dropped
+    (which just means they get fetched again).
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.issues: dict[str, dict[str, t.Any]] = {}
+        self.lineCount = 0
+        self.pending: dict[str, dict[str, t.Any]] = {}
+        self.load()
+
+    def load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as fh:
+                lines = fh.readlines()
+        except OSError:
+            return
+        if not lines or parseLine(lines[0]) != {"version": self.VERSION}:
+            # Unknown format; it'll be replaced on the next save.
+            self.lineCount = len(lines)
+            return
+        for line in lines[1:]:
+            entry = parseLine(line)
+            if isinstance(entry, dict) and isinstance(entry.get("key"), str) and isinstance(entry.get("issue"), dict):
+                self.issues[entry["key"]] = entry["issue"]
+        self.lineCount = len(lines)
+
+    def get(self, key: str) -> dict[str, t.Any] | None:
+        return self.pending.get(key) or self.issues.get(key)
+
+    def add(self, key: str, data: dict[str, t.Any]) -> None:
+        self.pending[key] = data
+
+    def save(self) -> None:
+        if not self.pending:
+            return
+        self.issues.update(self.pending)
+        lines = [
+            json.dumps({"key": key, "issue": data}, ensure_ascii=False) + "\n" for key, data in self.pending.items()
+        ]
+        self.pending = {}
+        if self.lineCount == 0 or self.lineCount + len(lines) > 2 * len(self.issues) + 100:
+            self.compact()
+            return
+        try:
+            with open(self.path, "a+b") as fh:
+                # Start on a fresh line after a half-written one,
+                # so the first new line isn't glued onto it and lost too.
+                end = fh.seek(0, os.SEEK_END)
+                if end > 0:
+                    fh.seek(end - 1)
+                    if fh.read(1) != b"\n":
+                        fh.write(b"\n")
+                fh.write("".join(lines).encode("utf-8"))
+        except OSError as e:
+            m.warn(f"Couldn't save the GitHub Issues cache to '{self.path}':\n{e}")
+            return
+        self.lineCount += len(lines)
+
+    def compact(self) -> None:
+        # Rewrites the file with just the current version of each issue.
+        lines = [json.dumps({"version": self.VERSION}) + "\n"]
+        lines.extend(
+            json.dumps({"key": key, "issue": data}, ensure_ascii=False) + "\n" for key, data in self.issues.items()
+        )
+        if config.writeCacheFile(self.path, lambda fh: fh.writelines(lines), "GitHub Issues cache"):
+            self.lineCount = len(lines)
+
+
+def parseLine(line: str) -> t.Any:
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
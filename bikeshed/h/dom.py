@@ -8,11 +8,11 @@ from collections import OrderedDict
 import lxml
 import lxml.html
 from lxml import etree
-from lxml.cssselect import CSSSelector
 
 from .. import constants, t
 from ..messages import die, warn
 from . import parser
+from .selectors import compileSelector
 
 if t.TYPE_CHECKING:
     type ElementPredT = t.Callable[[t.ElementT], bool]
@@ -30,7 +30,7 @@ def findAll(sel: str, context: t.SpecT | t.ElementT) -> list[t.ElementT]:
     else:
         context = context.document
     try:
-        return t.cast("list[t.ElementT]", CSSSelector(sel, namespaces={"svg": "http://www.w3.org/2000/svg"})(context))
+        return compileSelector(sel)(context)
     except Exception as e:
         die(f"The selector '{sel}' returned an error:\n{e}")
         return []
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
-import lxml.sax
+import re
+
+from lxml import etree
 
 from ... import constants, t
 from ... import messages as m
@@ -8,9 +10,13 @@ from ... import messages as m
 # This module is an *incredibly simple* HTML parser,
 # whose sole purpose is to parse HTML that's already been Bikeshed-parsed
 # (and thus is serialized to a simple, predictable structure)
-# and generate an LXML tree from it via the SAX api.
+# and generate an LXML tree from it via lxml's TreeBuilder.
 # It *cannot* handle real-world HTML.
 # The only "incorrect" HTML it does something fancy with is auto-closing tags.
+#
+# This runs over the entire serialized document,
+# so rather than stepping thru it a character at a time,
+# it jumps straight to the next interesting character with find()/regexes.
 
 
 def parseDocument(text: str) -> tuple[t.ElementT, t.ElementT, t.ElementT]:
@@ -61,37 +67,37 @@ HEADING_ELEMENTS = {
 }
 
 
+_markupStart = re.compile(r"[<&]")
+_tagNameEnd = re.compile(r"[ >/]")
+_spaces = re.compile(r" *")
+
+
 def parse(s: SimpleStream, start: int) -> tuple[t.ElementT, t.ElementT, t.ElementT]:
+    text = s.text
     i = start
     segmentStart = i
-    while not s.eof(i):
+    while match := _markupStart.search(text, i):
+        i = match.start()
+        if segmentStart < i:
+            s.characters(text[segmentStart:i])
         if s[i] == "<":
-            if segmentStart < i:
-                s.characters(s.slice(segmentStart, i))
             if s[i + 1] == "/":
                 i = parseEndTag(s, i)
             elif s[i + 1] == "!":
                 i = parseDoctype(s, i)
             else:
                 i = parseStartTag(s, i)
-            segmentStart = i
-        elif s[i] == "&":
-            if segmentStart < i:
-                s.characters(s.slice(segmentStart, i))
+        else:
             escape, i = parseEscape(s, i)
             s.characters(escape)
-            segmentStart = i
-        else:
-            i += 1
-    if segmentStart < i:
-        s.characters(s.slice(segmentStart, i))
+        segmentStart = i
+    if segmentStart < len(text):
+        s.characters(text[segmentStart:])
     return s.finish()
 
 
 def parseDoctype(s: SimpleStream, start: int) -> int:
-    i = start + 2  # skip the <!
-    while s[i] != ">":
-        i += 1
+    i = s.text.index(">", start + 2)  # skip the <!
     return i + 1
 
 
@@ -99,14 +105,14 @@ def parseStartTag(s: SimpleStream, start: int) -> int:
     i = start + 1  # skip the <
 
     tagStart = i
-    while s[i] not in (" ", ">", "/"):
-        i += 1
+    match = _tagNameEnd.search(s.text, i)
+    assert match is not None
+    i = match.start()
     tagName = s.slice(tagStart, i)
 
     attrs, i = parseAttributeList(s, i)
 
-    while s[i] == " ":
-        i += 1
+    i = skipSpaces(s, i)
 
     if s[i] == "/" and s[i + 1] == ">":
         s.selfClosedTag(tagName, attrs)
@@ -121,10 +127,8 @@ def parseStartTag(s: SimpleStream, start: int) -> int:
 
 
 def parseEndTag(s: SimpleStream, start: int) -> int:
-    i = start + 2  # skip the </
-    tagStart = i
-    while s[i] != ">":
-        i += 1
+    tagStart = start + 2  # skip the </
+    i = s.text.index(">", tagStart)
     tagName = s.slice(tagStart, i)
     s.endTag(tagName)
     return i + 1
@@ -136,8 +140,7 @@ def parseAttributeList(s: SimpleStream, start: int) -> tuple[dict[str, str], int
     while True:
         if s.eof(i):
             break
-        while s[i] == " ":
-            i += 1
+        i = skipSpaces(s, i)
         if s[i] == ">":
             break
         attrName, attrValue, i = parseAttribute(s, i)
@@ -153,28 +156,31 @@ def undoLineBreakSmuggling(attrs: dict[str, str]) -> None:
         attrs[attrName] = attrs[attrName].replace(constants.virtualLineBreak, "\n")
 
 
+def skipSpaces(s: SimpleStream, start: int) -> int:
+    match = _spaces.match(s.text, start)
+    assert match is not None
+    return match.end()
+
+
 def parseAttribute(s: SimpleStream, start: int) -> tuple[str, str, int]:
-    i = start
-    while s[i] != "=":
-        i += 1
+    text = s.text
+    i = text.index("=", start)
 
     attrName = s.slice(start, i)
     if ":" in attrName:
         _, _, attrName = attrName.partition(":")
     i += 2  # skip the ="
-    segmentStart = i
     attrValue = ""
-    while s[i] != '"':
-        if s[i] == "&":  # &#0000;
-            attrValue += s.slice(segmentStart, i)
-            escape, i = parseEscape(s, i)
-            attrValue += escape
-            segmentStart = i
-            continue
-        else:
-            i += 1
-    attrValue += s.slice(segmentStart, i)
-    i += 1  # skip the "
+    while True:
+        end = text.index('"', i)
+        escapeStart = text.find("&", i, end)  # &#0000;
+        if escapeStart == -1:
+            attrValue += text[i:end]
+            break
+        attrValue += text[i:escapeStart]
+        escape, i = parseEscape(s, escapeStart)
+        attrValue += escape
+    i = end + 1  # skip the "
     return (attrName, attrValue, i)
 
 
@@ -183,8 +189,7 @@ def parseEscape(s: SimpleStream, start: int) -> tuple[str, int]:
     if s[i] == "#" and s[i + 1] == "x":
         i += 2
         digitStart = i
-        while s[i] != ";":
-            i += 1
+        i = s.text.index(";", i)
         try:
             escape = chr(int(s.slice(digitStart, i), 16))
         except:
@@ -195,8 +200,7 @@ def parseEscape(s: SimpleStream, start: int) -> tuple[str, int]:
     elif s[i] == "#":
         i += 1
         digitStart = i
-        while s[i] != ";":
-            i += 1
+        i = s.text.index(";", i)
         try:
             escape = chr(int(s.slice(digitStart, i)))
         except:
@@ -204,31 +208,31 @@ def parseEscape(s: SimpleStream, start: int) -> tuple[str, int]:
             return "&", start + 1
         i += 1  # skip the ;
         return escape, i
-    elif s.slice(i, i + 3) == "lt;":
+    elif s.text.startswith("lt;", i):
         i += 3
         return "<", i
-    elif s.slice(i, i + 4) == "amp;":
+    elif s.text.startswith("amp;", i):
         i += 4
         return "&", i
-    elif s.slice(i, i + 5) == "apos;":
+    elif s.text.startswith("apos;", i):
         i += 5
         return "'", i
-    elif s.slice(i, i + 5) == "quot;":
+    elif s.text.startswith("quot;", i):
         i += 5
         return '"', i
     else:
         return "&", i
 
 
-# SimpleStream holds the text to be parsed, and an lxml sax handler
+# SimpleStream holds the text to be parsed, and an lxml TreeBuilder
 # for constructing a document from that text, plus enough tag context
 # to ensure the document structure is reasonably correct per HTML's rules.
 # Note that tagStack never holds the html/head/body element; those are
 # handled specially instead.
 class SimpleStream:
-    _text: str
+    text: str
     _len: int
-    _handler: t.Any  # Ugh, lxml doesn't give this a type
+    _handler: etree.TreeBuilder
     _tagStack: list[str]
     _inHead: bool
     _htmlAttrs: list[dict[str, str]]
@@ -236,24 +240,24 @@ class SimpleStream:
     _bodyAttrs: list[dict[str, str]]
 
     def __init__(self, text: str) -> None:
-        self._text = text
+        self.text = text
         self._len = len(text)
-        self._handler = lxml.sax.ElementTreeContentHandler()
+        self._handler = etree.TreeBuilder()
         self._htmlAttrs = []
         self._headAttrs = []
         self._bodyAttrs = []
         self._inHead = True
         self._tagStack = []
-        self._handler.startElement("html", {})
-        self._handler.startElement("head", {})
+        self._handler.start("html", {})
+        self._handler.start("head", {})
 
     def __getitem__(self, key: int) -> str:
         if key < 0 or key >= self._len:
             return ""
-        return self._text[key]
+        return self.text[key]
 
     def slice(self, start: int, end: int) -> str:
-        return self._text[start:end]
+        return self.text[start:end]
 
     def eof(self, i: int) -> bool:
         return i >= self._len
@@ -262,9 +266,9 @@ class SimpleStream:
         if self._inHead:
             self.startBody()
         self.autoCloseAll()
-        self._handler.endElement("body")
-        self._handler.endElement("html")
-        html = self._handler.etree.getroot()
+        self._handler.end("body")
+        self._handler.end("html")
+        html = self._handler.close()
         head = html[0]
         body = html[1]
         assert head is not None
@@ -293,9 +297,9 @@ class SimpleStream:
         if tagName == "tr" and self._tagStack and self._tagStack[-1] == "table":
             self.startTag("tbody", {})
         try:
-            self._handler.startElement(tagName, attrs)
+            self._handler.start(tagName, t.cast("dict[str | bytes, str | bytes]", attrs))
         except ValueError:
-            self._handler.startElement(tagName)
+            self._handler.start(tagName, {})
             m.die(
                 f"PROGRAMMING ERROR: A <{tagName}> start tag ended up with invalid attributes. Please report this!\n  (Element was still added to the tree, but without attributes.)\n  {attrs!r}",
                 lineNum=attrs.get("bs-line-number"),
@@ -306,12 +310,12 @@ class SimpleStream:
         if self._tagStack and tagName == self._tagStack[-1]:
             # Simple case
             self.popEl()
-            self._handler.endElement(tagName)
+            self._handler.end(tagName)
             return
         if self._inHead and tagName in HEAD_ELEMENTS:
             self.autoCloseEnd(tagName)
             self.popEl()
-            self._handler.endElement(tagName)
+            self._handler.end(tagName)
             return
         self.startBody()
         if tagName in ("html", "head", "body"):
@@ -325,7 +329,7 @@ class SimpleStream:
         if tagName in self._tagStack:
             self.autoCloseEnd(tagName)
             self.popEl()
-            self._handler.endElement(tagName)
+            self._handler.end(tagName)
 
     def selfClosedTag(self, tagName: str, attrs: dict[str, str]) -> None:
         self.startTag(tagName, attrs)
@@ -334,7 +338,7 @@ class SimpleStream:
     def characters(self, chars: str) -> None:
         if self._inHead and chars.strip() != "":
             self.startBody()
-        self._handler.characters(chars)
+        self._handler.data(chars)
 
     def pushEl(self, tagName: str) -> None:
         self._tagStack.append(tagName)
@@ -347,20 +351,20 @@ class SimpleStream:
         if self._inHead:
             self._inHead = False
             self.autoCloseAll()
-            self._handler.endElement("head")
-            self._handler.startElement("body")
+            self._handler.end("head")
+            self._handler.start("body", {})
 
     def autoCloseAll(self) -> None:
         # Close all currently-open elements
         while self._tagStack:
             tag = self._tagStack.pop()
-            self._handler.endElement(tag)
+            self._handler.end(tag)
 
     def autoCloseEnd(self, tagName: str) -> None:
         # auto-close all tags still open until you hit the one that's actually being closed
         while self._tagStack[-1] != tagName:
             endTagName = self._tagStack.pop()
-            self._handler.endElement(endTagName)
+            self._handler.end(endTagName)
 
     def autoCloseStart(self, tagName: str) -> None:
         # auto-close special tags who get closed by another tag opening
@@ -447,7 +451,7 @@ class SimpleStream:
                 closers = self._tagStack[i:]
                 self._tagStack = self._tagStack[0:i]
                 for closeTagName in closers[::-1]:
-                    self._handler.endElement(closeTagName)
+                    self._handler.end(closeTagName)
                 return
             elif scopes and self._tagStack[i] in scopes:
                 # Found a scoping element without finding the tag, just stop
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import cssselect
+from lxml import etree
+from lxml.cssselect import CSSSelector
+
+from .. import t
+
+if t.TYPE_CHECKING:
+    type SelectorFnT = t.Callable[[t.ElementT], list[t.ElementT]]
+    type ElementTestT = t.Callable[[t.ElementT], bool]
+
+# Compiles the CSS selectors passed to findAll().
+#
+# Going through lxml's CSSSelector means parsing the selector, translating it to XPath,
+# and compiling the XPath, and then every alternative in a selector list
+# is a separate walk over the tree, merged back into document order at the end.
+# Nearly all of Bikeshed's selectors are just lists of simple compound selectors
+# (tags, classes, ids, and attribute tests, maybe in a :not()),
+# so those instead get compiled into plain element tests,
+# run in a single walk over the tree.
+# (When every alternative names a tag, lxml can even skip the other elements itself.)
+# Anything fancier (combinators, pseudo-classes, namespaces)
+# still uses CSSSelector.
+#
+# Either way, a selector is only compiled once per run.
+
+_selectorCache: dict[str, SelectorFnT] = {}
+
+NAMESPACES = {"svg": "http://www.w3.org/2000/svg"}
+
+# XPath's normalize-space(), which CSSSelector uses for class matching,
+# only treats these as whitespace.
+_xmlWhitespace = str.maketrans("\t\n\r", "   ")
+
+
+def compileSelector(sel: str) -> SelectorFnT:
+    """
+    Returns a function that finds all the elements matching sel
+    in (and including) the element it's given, in document order.
+    Raises an exception if sel can't be parsed.
+    """
+    if sel not in _selectorCache:
+        selFn = _compileSimpleSelectors(sel)
+        if selFn is None:
+            selFn = t.cast("SelectorFnT", CSSSelector(sel, namespaces=NAMESPACES))
+        _selectorCache[sel] = selFn
+    return _selectorCache[sel]
+
+
+class UnsupportedSelectorError(Exception):
+    pass
+
+
+def _compileSimpleSelectors(sel: str) -> SelectorFnT | None:
+    # Returns None if the selector isn't simple enough to handle here.
+    try:
+        parsed = cssselect.parse(sel)
+    except cssselect.SelectorError:
+        # Let CSSSelector produce the error.
+        return None
+    tags: set[str] = set()
+    anyTag = False
+    compounds: list[tuple[str | None, list[ElementTestT]]] = []
+    try:
+        for selector in parsed:
+            if selector.pseudo_element is not None:
+                return None
+            tag, tests = _compileCompound(selector.parsed_tree)
+            compounds.append((tag, tests))
+            if tag is None:
+                anyTag = True
+            else:
+                tags.add(tag)
+    except UnsupportedSelectorError:
+        return None
+
+    iterTags: tuple[t.Any, ...] = (etree.Element,) if anyTag else tuple(sorted(tags))
+
+    if len(compounds) == 1:
+        # The tag (if any) is already handled by iter(),
+        # so only the other tests need checking.
+        tests = compounds[0][1]
+        if not tests:
+            return lambda context: list(context.iter(*iterTags))
+        if len(tests) == 1:
+            test = tests[0]
+            return lambda context: [el for el in context.iter(*iterTags) if test(el)]
+
+    def matches(el: t.ElementT) -> bool:
+        for tag, tests in compounds:
+            if tag is not None and el.tag != tag:
+                continue
+            for test in tests:
+                if not test(el):
+                    break
+            else:
+                return True
+        return False
+
+    return lambda context: [el for el in context.iter(*iterTags) if matches(el)]
+
+
+def _compileCompound(tree: t.Any) -> tuple[str | None, list[ElementTestT]]:
+    # Turns a parsed compound selector into a required tag name (or None for any tag)
+    # and a list of tests the element has to pass.
+    # cssselect parses "a.foo[bar]" as Attrib(Class(Element(a), foo), bar),
+    # so the outermost test is at the top; they're reversed at the end
+    # so they run left-to-right like the source.
+    tests: list[ElementTestT] = []
+    while True:
+        if isinstance(tree, cssselect.parser.Element):
+            if tree.namespace is not None:
+                raise UnsupportedSelectorError
+            tests.reverse()
+            return tree.element, tests
+        elif isinstance(tree, cssselect.parser.Class):
+            tests.append(_classTest(tree.class_name))
+        elif isinstance(tree, cssselect.parser.Hash):
+            tests.append(_attrTest("id", "=", tree.id))
+        elif isinstance(tree, cssselect.parser.Attrib):
+            if tree.namespace is not None:
+                raise UnsupportedSelectorError
+            value = None if tree.value is None else tree.value.value
+            tests.append(_attrTest(tree.attrib, tree.operator, value))
+        elif isinstance(tree, cssselect.parser.Negation):
+            negatedTag, negatedTests = _compileCompound(tree.subselector)
+            tests.append(_negatedTest(negatedTag, negatedTests))
+        else:
+            raise UnsupportedSelectorError
+        tree = tree.selector
+
+
+def _negatedTest(tag: str | None, tests: list[ElementTestT]) -> ElementTestT:
+    def negatedTest(el: t.ElementT) -> bool:
+        if tag is not None and el.tag != tag:
+            return True
+        return not all(test(el) for test in tests)
+
+    return negatedTest
+
+
+def _classTest(cls: str) -> ElementTestT:
+    return _attrTest("class", "~=", cls)
+
+
+def _attrTest(name: str, op: str, value: str | None) -> ElementTestT:
+    # Mirrors how cssselect translates each operator to XPath,
+    # including its edge cases for empty values.
+    if op == "exists":
+        return lambda el: el.get(name) is not None
+    assert value is not None
+    if op == "=":
+        return lambda el: el.get(name) == value
+    if op == "~=":
+        if not value or any(c in value for c in " \t\r\n\f"):
+            return lambda el: False
+        padded = f" {value} "
+
+        def includesTest(el: t.ElementT) -> bool:
+            attr = el.get(name)
+            if attr is None or value not in attr:
+                return False
+            return padded in f" {attr.translate(_xmlWhitespace)} "
+
+        return includesTest
+    if op == "|=":
+        dashed = value + "-"
+
+        def dashTest(el: t.ElementT) -> bool:
+            attr = el.get(name)
+            return attr is not None and (attr == value or attr.startswith(dashed))
+
+        return dashTest
+    if not value:
+        # ^=, $=, and *= never match an empty value.
+        if op in ("^=", "$=", "*="):
+            return lambda el: False
+        raise UnsupportedSelectorError
+    if op == "^=":
+        return lambda el: (el.get(name) or "").startswith(value)
+    if op == "$=":
+        return lambda el: (el.get(name) or "").endswith(value)
+    if op == "*=":
+        return lambda el: value in (el.get(name) or "")
+    raise UnsupportedSelectorError
@@ -98,13 +98,18 @@ class Serializer:
 
     def serialize(self, root: t.ElementT) -> str:
         output = io.StringIO()
-        writer = output.write
-        writer("<!doctype html>")
-        self._serializeEl(root, writer)
+        self.serializeTo(root, output.write)
         s = output.getvalue()
         output.close()
         return s
 
+    def serializeTo(self, root: t.ElementT, write: WriterFn) -> None:
+        # Streams the serialization to write(), a chunk at a time,
+        # rather than building up the whole string.
+        # Every chunk is a complete tag, text node, or run of whitespace.
+        write("<!doctype html>")
+        self._serializeEl(root, write)
+
     def unfuckName(self, n: str) -> str:
         # LXML does namespaces stupidly
         if n.startswith("{"):
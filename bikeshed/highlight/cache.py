@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import hashlib
+import importlib.metadata
+
+import pygments
+
+from .. import config, t
+
+if t.TYPE_CHECKING:
+    # (text, color) runs, as produced by highlight.tokenize()
+    type RunsT = list[tuple[str, str | None]]
+
+# Remembers the highlighting of each code block,
+# keyed by its language and a hash of its text,
+# so blocks that haven't changed since the last build aren't re-tokenized.
+#
+# Entries live in memory for the rest of the process
+# (so watch-mode rebuilds and the daemon reuse them),
+# and are also saved to a per-user cache file
+# (so repeated builds, like in CI with a persisted cache folder, do too).
+#
+# The highlighting depends on Pygments, widlparser, and Bikeshed's own lexers,
+# so the cache is thrown away whenever any of their versions change.
+
+CACHE_VERSION = 1
+
+# The on-disk cache keeps the most recently used entries, up to this many.
+MAX_ENTRIES = 20000
+
+
+class HighlightCache:
+    def __init__(self) -> None:
+        self.entries: dict[str, RunsT] = {}
+        self.loadedFrom: set[str] = set()
+        # Keys added or used since the last save
+        self.touched: set[str] = set()
+        self.dirty = False
+
+    def get(self, lang: str, text: str) -> RunsT | None:
+        key = cacheKey(lang, text)
+        runs = self.entries.get(key)
+        if runs is not None:
+            self.touched.add(key)
+        return runs
+
+    def set(self, lang: str, text: str, runs: RunsT) -> None:
+        key = cacheKey(lang, text)
+        self.entries[key] = runs
+        self.touched.add(key)
+        self.dirty = True
+
+    def load(self, path: str) -> None:
+        if path in self.loadedFrom:
+            return
+        self.loadedFrom.add(path)
+
+        def addEntries(data: dict[str, t.Any]) -> bool:
+            for key, runs in data["entries"].items():
+                # Anything already in memory is at least as fresh.
+                # (JSON gives back each run as a list rather than a tuple, which unpacks the same.)
+                self.entries.setdefault(key, runs)
+            return True
+
+        config.loadJsonCache(path, versionStamp(), addEntries)
+
+    def save(self, path: str) -> None:
+        if not self.dirty:
+            return
+        # Most recently used last, so trimming drops the stalest.
+        keys = [key for key in self.entries if key not in self.touched] + [
+            key for key in self.entries if key in self.touched
+        ]
+        self.entries = {key: self.entries[key] for key in keys[-MAX_ENTRIES:]}
+        config.saveJsonCache(path, versionStamp(), {"entries": self.entries}, "syntax-highlighting cache")
+        self.dirty = False
+        self.touched = set()
+
+
+def cacheKey(lang: str, text: str) -> str:
+    return lang + ":" + hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+_versionStamp: str | None = None
+
+
+def versionStamp() -> str:
+    global _versionStamp  # noqa: PLW0603
+    if _versionStamp is None:
+        try:
+            with open(config.scriptPath("semver.txt"), encoding="utf-8") as fh:
+                bikeshedVersion = fh.read().strip()
+        except OSError:
+            bikeshedVersion = "unknown"
+        try:
+            widlparserVersion = importlib.metadata.version("widlparser")
+        except importlib.metadata.PackageNotFoundError:
+            widlparserVersion = "unknown"
+        _versionStamp = (
+            f"{CACHE_VERSION} bikeshed/{bikeshedVersion} pygments/{pygments.__version__} widlparser/{widlparserVersion}"
+        )
+    return _versionStamp
+
+
+# Shared by every build in this process
+shared = HighlightCache()
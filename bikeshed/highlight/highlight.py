@@ -3,16 +3,20 @@
 from __future__ import annotations
 
 import collections
+import concurrent.futures
 import dataclasses
+import functools
 import itertools
+import os
 import re
 
 import pygments
 import widlparser
 from pygments.lexers import get_lexer_by_name
 
-from .. import h, lexers, t
+from .. import config, constants, h, lexers, t
 from .. import messages as m
+from . import cache
 
 
 def loadCSSLexer() -> lexers.CSSLexer:
@@ -33,8 +37,13 @@ def addSyntaxHighlighting(doc: t.SpecT) -> None:
     if doc.md.slimBuildArtifact:
         return
     normalizeHighlightMarkers(doc)
+    cachePath = config.docCachePath(doc, "highlighting.json")
+    if cachePath:
+        cache.shared.load(cachePath)
 
-    for el in h.collectSyntaxHighlightables(doc.body):
+    els = h.collectSyntaxHighlightables(doc.body)
+    prefetchHighlighting(doc, els)
+    for el in els:
         # Find whether to highlight, and what the lang is
         lang = determineHighlightLang(doc, el)
         if lang is False:
@@ -51,6 +60,71 @@ def addSyntaxHighlighting(doc: t.SpecT) -> None:
                 doc.extraJC.addLineNumbers()
             if ln.highlights:
                 doc.extraJC.addLineHighlighting()
+    if cachePath:
+        cache.shared.save(cachePath)
+
+
+# Tokenizing is pure CPU work on plain text,
+# so when a spec has a lot of code blocks that aren't in the cache yet,
+# they're tokenized ahead of time on a pool of worker processes,
+# and their results are put in the cache for highlightEl() to find.
+# This doesn't change the tree (or print any messages) itself;
+# anything it doesn't predict correctly just gets tokenized as normal.
+#
+# The --highlight-processes flag sets how many workers to use
+# (one per CPU by default); 1 or 0 turns this off, as does --serial.
+
+# Fewer than this many uncached blocks, and starting the workers isn't worth it.
+PARALLEL_THRESHOLD = 200
+
+# Shared by every build in this process, since starting it is the slow part.
+_pool: concurrent.futures.ProcessPoolExecutor | None = None
+
+
+def prefetchHighlighting(doc: t.SpecT, els: list[t.ElementT]) -> None:
+    numProcesses = highlightProcesses()
+    if numProcesses < 2 or len(els) < PARALLEL_THRESHOLD:
+        return
+    jobs: dict[tuple[str, str], None] = {}
+    for el in els:
+        lang = determineHighlightLang(doc, el)
+        if not lang:
+            continue
+        text = h.textContent(el)
+        if not canTokenize(text, lang) or cache.shared.get(lang, text) is not None:
+            continue
+        jobs[(lang, text)] = None
+    if len(jobs) < PARALLEL_THRESHOLD:
+        return
+    langs = [lang for lang, _ in jobs]
+    texts = [text for _, text in jobs]
+    global _pool  # noqa: PLW0603
+    try:
+        if _pool is None:
+            _pool = concurrent.futures.ProcessPoolExecutor(max_workers=numProcesses)
+        chunksize = max(1, len(texts) // (numProcesses * 4))
+        results = list(_pool.map(tokenize, texts, langs, chunksize=chunksize))
+    except (OSError, concurrent.futures.process.BrokenProcessPool) as e:
+        # Everything still gets highlighted, just on this process.
+        m.warn(f"Couldn't highlight code blocks in parallel, so they'll be highlighted one at a time:\n{e}")
+        _pool = None
+        return
+    for lang, text, runs in zip(langs, texts, results, strict=True):
+        cache.shared.set(lang, text, runs)
+
+
+def highlightProcesses() -> int:
+    if constants.serialPhases:
+        return 1
+    if constants.highlightProcesses is not None:
+        return constants.highlightProcesses
+    return os.cpu_count() or 1
+
+
+def canTokenize(text: str, lang: str) -> bool:
+    if lang == "webidl":
+        return not ("\1" in text or "\2" in text or "\3" in text)
+    return lexerFromLang(lang) is not None
 
 
 def determineHighlightLang(doc: t.SpecT, el: t.ElementT) -> str | t.Literal[False] | None:
@@ -143,16 +217,40 @@ def determineLineNumbers(doc: t.SpecT, el: t.ElementT) -> LineNumberOptions:
 
 def highlightEl(doc: t.SpecT, el: t.ElementT, lang: str) -> None:
     text = h.textContent(el)
-    coloredText: t.Deque[ColoredText] | None
+    if not canTokenize(text, lang):
+        if lang == "webidl":
+            m.die(
+                "WebIDL text contains some U+0001-0003 characters, which are used by the highlighter. This block can't be highlighted. :(",
+                el=el,
+            )
+        else:
+            m.die(
+                f"'{lang}' isn't a known syntax-highlighting language. See http://pygments.org/docs/lexers/. Seen on:\n"
+                + h.outerHTML(el),
+                el=el,
+            )
+        return
+    runs = cache.shared.get(lang, text)
+    if runs is None:
+        runs = tokenize(text, lang)
+        cache.shared.set(lang, text, runs)
+    mergeHighlighting(el, collections.deque(ColoredText(runText, color) for runText, color in runs))
+    h.addClass(doc, el, "highlight")
+
+
+def tokenize(text: str, lang: str) -> list[tuple[str, str | None]]:
+    """
+    Highlights the text as the given lang,
+    returning it as a list of (text, color) runs.
+    The lang must be known to be valid.
+    """
     if lang == "webidl":
-        coloredText = highlightWithWebIDL(text, el=el)
+        coloredText = highlightWithWebIDL(text)
     else:
-        coloredText = highlightWithPygments(text, lang, el=el)
-    if coloredText is not None:
-        coloredText = mergeColors(coloredText)
-        readdWhitespacePrefix(text, coloredText)
-        mergeHighlighting(el, coloredText)
-        h.addClass(doc, el, "highlight")
+        coloredText = highlightWithPygments(text, lang)
+    coloredText = mergeColors(coloredText)
+    readdWhitespacePrefix(text, coloredText)
+    return [(ct.text, ct.color) for ct in coloredText]
 
 
 def mergeColors(coloredText: t.Deque[ColoredText]) -> t.Deque[ColoredText]:
@@ -196,7 +294,7 @@ def readdWhitespacePrefix(rawText: str, coloredText: t.Deque[ColoredText]) -> t.
     return coloredText
 
 
-def highlightWithWebIDL(text: str, el: t.ElementT) -> t.Deque[ColoredText] | None:
+def highlightWithWebIDL(text: str) -> t.Deque[ColoredText]:
     """
     Trick the widlparser emitter,
     which wants to output HTML via wrapping with start/end tags,
@@ -241,13 +339,6 @@ def highlightWithWebIDL(text: str, el: t.ElementT) -> t.Deque[ColoredText] | Non
         ) -> tuple[str | None, str | None]:
             return ("\1s\2", "\3")
 
-    if "\1" in text or "\2" in text or "\3" in text:
-        m.die(
-            "WebIDL text contains some U+0001-0003 characters, which are used by the highlighter. This block can't be highlighted. :(",
-            el=el,
-        )
-        return None
-
     widl = widlparser.parser.Parser(text, SilentUI())
     return coloredTextFromWidlStack(str(widl.markup(t.cast(widlparser.protocols.Marker, HighlightMarker()))))
 
@@ -297,15 +388,9 @@ def coloredTextFromWidlStack(widlText: str) -> t.Deque[ColoredText]:
     return coloredTexts
 
 
-def highlightWithPygments(text: str, lang: str, el: t.ElementT) -> t.Deque[ColoredText] | None:
+def highlightWithPygments(text: str, lang: str) -> t.Deque[ColoredText]:
     lexer = lexerFromLang(lang)
-    if lexer is None:
-        m.die(
-            f"'{lang}' isn't a known syntax-highlighting language. See http://pygments.org/docs/lexers/. Seen on:\n"
-            + h.outerHTML(el),
-            el=el,
-        )
-        return None
+    assert lexer is not None
     rawTokens = [(str(ttype), val) for (ttype, val) in pygments.lex(text, lexer)]
     coloredText = coloredTextFromRawTokens(rawTokens)
     return coloredText
@@ -466,7 +551,10 @@ def normalizeHighlightMarkers(doc: t.SpecT) -> None:
             el.set("highlight", match.group(1))
 
 
+@functools.lru_cache(maxsize=64)
 def lexerFromLang(lang: str) -> pygments.lexer.Lexer | None:
+    # Lexers don't keep any state between uses,
+    # so each language's is only created once.
     if lang in customLexers:
         return customLexers[lang]()
     try:
@@ -5,7 +5,7 @@ import re
 
 import widlparser
 
-from . import config, h, t
+from . import config, constants, h, t
 from . import messages as m
 
 
@@ -50,97 +50,81 @@ class IDLSilent:
 
 
 if t.TYPE_CHECKING:
-    MarkupReturnT = tuple[str | None, str | None]
+    type MarkupReturnT = MarkupTag | None
 
 
-class DebugMarker(widlparser.protocols.Marker):
+@dataclasses.dataclass
+class MarkupTag:
+    # The element a Marker wants wrapped around a piece of the IDL.
+    tagName: str
+    attrs: dict[str, str]
+
+    def element(self) -> t.ElementT:
+        return h.createElement(self.tagName, self.attrs)
+
+
+class DebugMarker:
     # Debugging tool for IDL markup
+    # Same Marker protocol as IDLMarker.
+    # pylint: disable=unused-argument
 
     def markup_construct(
         self,
         text: str,
         construct: widlparser.Construct,
     ) -> MarkupReturnT:  # pylint: disable=unused-argument
-        return (
-            startTag("construct-" + construct.idl_type),
-            endTag("construct-" + construct.idl_type),
-        )
+        return startTag("construct-" + construct.idl_type)
 
     def markup_type(self, text: str, construct: widlparser.Construct) -> MarkupReturnT:
-        return (
-            startTag("TYPE", {"for": construct.idl_type, "idlType": text}),
-            endTag("TYPE"),
-        )
+        return startTag("type", {"for": construct.idl_type, "idltype": text})
 
     def markup_primitive_type(self, text: str, construct: widlparser.Construct) -> MarkupReturnT:
-        return (
-            startTag("PRIMITIVE", {"for": construct.idl_type, "idlType": text}),
-            endTag("PRIMITIVE"),
-        )
+        return startTag("primitive", {"for": construct.idl_type, "idltype": text})
 
     def markup_buffer_type(self, text: str, construct: widlparser.Construct) -> MarkupReturnT:
-        return (
-            startTag("BUFFER", {"for": construct.idl_type, "idlType": text}),
-            endTag("BUFFER"),
-        )
+        return startTag("buffer", {"for": construct.idl_type, "idltype": text})
 
     def markup_string_type(self, text: str, construct: widlparser.Construct) -> MarkupReturnT:
-        return (
-            startTag("STRING", {"for": construct.idl_type, "idlType": text}),
-            endTag("STRING"),
-        )
+        return startTag("string", {"for": construct.idl_type, "idltype": text})
 
     def markup_object_type(self, text: str, construct: widlparser.Construct) -> MarkupReturnT:
-        return (
-            startTag("OBJECT", {"for": construct.idl_type, "idlType": text}),
-            endTag("OBJECT"),
-        )
+        return startTag("object", {"for": construct.idl_type, "idltype": text})
 
     def markup_type_name(
         self,
         text: str,
         construct: widlparser.Construct,
     ) -> MarkupReturnT:  # pylint: disable=unused-argument
-        return (
-            startTag("TYPE-NAME", {"idlType": construct.idl_type}),
-            endTag("TYPE-NAME"),
-        )
+        return startTag("type-name", {"idltype": construct.idl_type})
 
     def markup_name(
         self,
         text: str,
         construct: widlparser.Construct,
     ) -> MarkupReturnT:  # pylint: disable=unused-argument
-        return (
-            startTag("NAME", {"idlType": construct.idl_type}),
-            endTag("NAME"),
-        )
+        return startTag("name", {"idltype": construct.idl_type})
 
     def markup_keyword(
         self,
         text: str,
         construct: widlparser.Construct,
     ) -> MarkupReturnT:  # pylint: disable=unused-argument
-        return (
-            startTag("KEYWORD", {"idlType": construct.idl_type}),
-            endTag("KEYWORD"),
-        )
+        return startTag("keyword", {"idltype": construct.idl_type})
 
     def markup_enum_value(
         self,
         text: str,
         construct: widlparser.Construct,
     ) -> MarkupReturnT:  # pylint: disable=unused-argument
-        return (
-            startTag("ENUM-VALUE", {"for": construct.idl_type}),
-            endTag("ENUM-VALUE"),
-        )
+        return startTag("enum-value", {"for": construct.idl_type})
 
-    def encode(self, text: str) -> str:
-        return h.escapeHTML(text)
 
+class IDLMarker:
+    # Implements widlparser's Marker protocol (minus encode(), since the markup is built as nodes),
+    # but returns MarkupTags rather than strings, so it doesn't subclass the protocol itself.
+    # Every method takes the same arguments whether or not it uses them.
+    # pylint: disable=unused-argument
 
-class IDLMarker(widlparser.protocols.Marker):
     def markup_construct(
         self,
         text: str,
@@ -148,7 +132,7 @@ class IDLMarker(widlparser.protocols.Marker):
     ) -> MarkupReturnT:  # pylint: disable=unused-argument
         # Fires for every 'construct' in the WebIDL.
         # Some things are "productions", not "constructs".
-        return (None, None)
+        return None
 
     def markup_type(
         self,
@@ -159,35 +143,35 @@ class IDLMarker(widlparser.protocols.Marker):
         # It'll contain keywords or names, or sometimes more types.
         # For example, a "type" wrapper surrounds an entire union type,
         # as well as its component types.
-        return (None, None)
+        return None
 
     def markup_primitive_type(
         self,
         text: str,
         construct: widlparser.Construct,
     ) -> MarkupReturnT:  # pylint: disable=unused-argument
-        return (startTag("a", {"data-link-type": "interface"}), endTag("a"))
+        return startTag("a", {"data-link-type": "interface"})
 
     def markup_string_type(
         self,
         text: str,
         construct: widlparser.Construct,
     ) -> MarkupReturnT:  # pylint: disable=unused-argument
-        return (startTag("a", {"data-link-type": "interface"}), endTag("a"))
+        return startTag("a", {"data-link-type": "interface"})
 
     def markup_buffer_type(
         self,
         text: str,
         construct: widlparser.Construct,
     ) -> MarkupReturnT:  # pylint: disable=unused-argument
-        return (startTag("a", {"data-link-type": "interface"}), endTag("a"))
+        return startTag("a", {"data-link-type": "interface"})
 
     def markup_object_type(
         self,
         text: str,
         construct: widlparser.Construct,
     ) -> MarkupReturnT:  # pylint: disable=unused-argument
-        return (startTag("a", {"data-link-type": "interface"}), endTag("a"))
+        return startTag("a", {"data-link-type": "interface"})
 
     def markup_type_name(self, text: str, construct: widlparser.Construct) -> MarkupReturnT:
         # Fires for non-defining type names, such as arg types.
@@ -195,7 +179,7 @@ class IDLMarker(widlparser.protocols.Marker):
         # The names in [Exposed=Foo] are [Global] tokens, not interface names.
         # Since I don't track globals as a link target yet, don't link them at all.
         if construct.idl_type == "extended-attribute" and construct.name == "Exposed":
-            return (None, None)
+            return None
 
         # The name in [PutForwards=foo] is an attribute of the same interface.
         if construct.idl_type == "extended-attribute" and construct.name == "PutForwards":
@@ -211,12 +195,12 @@ class IDLMarker(widlparser.protocols.Marker):
             typeName = str(memberType).strip()
             if typeName.endswith("?"):
                 typeName = typeName[:-1]
-            return (startTag("a", {"data-link-type": "attribute", "data-link-for": typeName}), endTag("a"))
+            return startTag("a", {"data-link-type": "attribute", "data-link-for": typeName})
 
         # LegacyWindowAlias defines additional names for the construct,
         # so all the names should be forced <dfn>s, just like the interface name itself.
         if construct.idl_type == "extended-attribute" and construct.name == "LegacyWindowAlias":
-            return (startTag("idl", {"data-idl-type": "interface", "data-lt": text}), endTag("idl"))
+            return startTag("idl", {"data-idl-type": "interface", "data-lt": text})
 
         # The constructor name in [LegacyFactoryFunction], needs to actually be marked up
         # as the definition of the function.
@@ -225,15 +209,12 @@ class IDLMarker(widlparser.protocols.Marker):
             assert interfaceName is not None
             methodName = construct.normal_name
             assert methodName is not None
-            return (
-                startTag(
-                    "idl",
-                    {"data-idl-type": "constructor", "data-idl-for": interfaceName, "data-lt": methodName},
-                ),
-                endTag("idl"),
+            return startTag(
+                "idl",
+                {"data-idl-type": "constructor", "data-idl-for": interfaceName, "data-lt": methodName},
             )
 
-        return (startTag("a", {"data-link-type": "idl-name"}), endTag("a"))
+        return startTag("a", {"data-link-type": "idl-name"})
 
     def markup_keyword(self, text: str, construct: widlparser.Construct) -> MarkupReturnT:
         # Fires on the various "keywords" of WebIDL -
@@ -245,23 +226,20 @@ class IDLMarker(widlparser.protocols.Marker):
             assert parentName is not None
             if construct.name is None:
                 # If no name was defined, you're required to define stringification behavior.
-                return (
-                    startTag("a", {"data-link-type": "dfn", "for": parentName, "data-lt": "stringification behavior"}),
-                    endTag("a"),
+                return startTag(
+                    "a",
+                    {"data-link-type": "dfn", "for": parentName, "data-lt": "stringification behavior"},
                 )
             # Otherwise, you *can* point to/dfn stringification behavior if you want.
-            return (
-                startTag(
-                    "idl",
-                    {
-                        "data-export": "",
-                        "data-idl-type": "dfn",
-                        "data-idl-for": parentName,
-                        "data-lt": "stringification behavior",
-                        "id": f"{parentName}-stringification-behavior",
-                    },
-                ),
-                endTag("idl"),
+            return startTag(
+                "idl",
+                {
+                    "data-export": "",
+                    "data-idl-type": "dfn",
+                    "data-idl-for": parentName,
+                    "data-lt": "stringification behavior",
+                    "id": f"{parentName}-stringification-behavior",
+                },
             )
         # The remaining built-in types that aren't covered by a more specific function.
         builtinTypes = {
@@ -276,11 +254,8 @@ class IDLMarker(widlparser.protocols.Marker):
             "setlike": "dfn",
         }
         if text in builtinTypes:
-            return (
-                startTag("a", {"data-link-spec": "webidl", "data-link-type": builtinTypes[text]}),
-                endTag("a"),
-            )
-        return (None, None)
+            return startTag("a", {"data-link-spec": "webidl", "data-link-type": builtinTypes[text]})
+        return None
 
     def markup_name(
         self,
@@ -290,7 +265,7 @@ class IDLMarker(widlparser.protocols.Marker):
         # Fires for defining names: method names, arg names, interface names, etc.
         idlType = construct.idl_type
         if idlType not in config.idlTypes:
-            return (None, None)
+            return None
 
         if idlType == "constructor":
             # one of the constructor extended attr, now deprecated
@@ -298,13 +273,13 @@ class IDLMarker(widlparser.protocols.Marker):
                 m.die(
                     f"The [Constructor] extended attribute (on {construct.parent.name}) is deprecated, please switch to a constructor() method.",
                 )
-                return (None, None)
+                return None
             # Otherwise it's [LegacyNamedConstructor], which is allowed
-            return (startTag("a", {"data-link-type": "extended-attribute", "data-link-for": ""}), endTag("a"))
+            return startTag("a", {"data-link-type": "extended-attribute", "data-link-for": ""})
 
         if idlType == "argument" and construct.parent.idl_type == "constructor":
             # Don't mark up the arguments to [Constructor] either
-            return (None, None)
+            return None
 
         attrs: dict[str, str] = {}
         refType = "idl"
@@ -328,7 +303,7 @@ class IDLMarker(widlparser.protocols.Marker):
                 rest = member.attribute
             else:
                 m.die(f"Can't figure out how to construct attribute-info from:\n  {construct}")
-                return (None, None)
+                return None
             if rest.readonly is not None:
                 attrs["data-readonly"] = ""
             attrs["data-type"] = str(rest.type.type) + str(rest.type.suffix or "")
@@ -363,20 +338,14 @@ class IDLMarker(widlparser.protocols.Marker):
 
         attrs["data-lt"] = idlTitle
         attrs[f"data-{refType}-type"] = idlType
-        return (startTag(elementName, attrs), endTag(elementName))
+        return startTag(elementName, attrs)
 
     def markup_enum_value(self, text: str, construct: widlparser.Construct) -> MarkupReturnT:
-        return (
-            startTag(
-                "idl",
-                {"data-idl-type": "enum-value", "data-idl-for": t.cast(str, construct.name), "data-lt": text},
-            ),
-            endTag("idl"),
+        return startTag(
+            "idl",
+            {"data-idl-type": "enum-value", "data-idl-for": t.cast(str, construct.name), "data-lt": text},
         )
 
-    def encode(self, text: str) -> str:
-        return h.escapeHTML(text)
-
     def methodLinkingTexts(self, method: widlparser.OperationRest) -> list[str]:
         """
         Given a method-ish widlparser Construct,
@@ -419,25 +388,28 @@ def markupIDL(doc: t.SpecT) -> None:
         el.tag = "pre"
         h.removeAttr(el, "type")
         h.addClass(doc, el, "idl")
-    # One pass with a silent parser to collect the symbol table.
-    symbolTable = None
-    for el in idlEls:
-        p = widlparser.parser.Parser(h.textContent(el), ui=IDLSilent(), symbol_table=symbolTable)
-        symbolTable = p.symbol_table
-    # Then a real pass to actually mark up the IDL,
-    # and collect it for the index.
+    # Every block is parsed exactly once.
+    # Normative blocks are parsed straight into doc.widl (which collects the IDL for the index),
+    # remembering which of its constructs came from which block,
+    # and those same constructs are then marked up.
+    # Every block, normative or not, adds its definitions to one shared symbol table.
+    symbolTable = SymbolTable()
+    doc.widl.symbol_table = symbolTable
+    blocks: dict[t.ElementT, IDLBlock] = {}
     for el in idlEls:
         if h.isNormative(doc, el):
-            lineNum = getContentStartingLineNum(el) or 1
-            text = h.textContent(el)
-            # Parse once with a fresh parser, so I can spit out just this <pre>'s markup.
-            widl = widlparser.parser.Parser(text, ui=IDLUI.fromEl(el), symbol_table=symbolTable)
+            blocks[el] = IDLBlock.parse(doc.widl, h.textContent(el), symbolTable)
+        else:
+            parser = getParser()
+            parser.symbol_table = symbolTable
+            parser.parse(h.textContent(el))
+    doc.widl.ui = IDLSilent()
+    for el in idlEls:
+        block = blocks.get(el)
+        if block is not None:
+            block.report(doc.widl, symbolTable, IDLUI.fromEl(el))
             marker = DebugMarker() if doc.debug else IDLMarker()
-            markedUp = str(widl.markup(marker)).lstrip()
-            parsed = list(h.parseHTML(h.safeHtml(markedUp, startLine=lineNum)))
-            h.replaceContents(el, parsed)
-            # Parse a second time with the global one, which collects all data in the doc.
-            doc.widl.parse(text)
+            h.replaceContents(el, markupNodes(block.constructs(doc.widl), marker))
         h.addClass(doc, el, "highlight")
         doc.extraJC.addIDLHighlighting()
     if doc.md.slimBuildArtifact:
@@ -449,25 +421,172 @@ def markupIDL(doc: t.SpecT) -> None:
         return
 
 
-def getContentStartingLineNum(el: t.ElementT) -> int | None:
-    lineNum = h.parseLineNumber(el)
-    if not lineNum:
-        return None
-    lineNum += int(el.get("bs-line-number-content-adjustment", "0"))
-    if len(el) == 0:
-        return lineNum
-    for node in h.childNodes(el):
-        if isinstance(node, str):
-            if node.strip() != "":
-                return lineNum
-            else:
-                pass
-        if h.isElement(node):
-            if h.hasAttr(el, "bs-line-number-content-adjustment"):
-                lineNum += int(el.get("bs-line-number-content-adjustment", "0"))
+class SymbolTable(dict[str, widlparser.Construct]):
+    """
+    The symbol table shared by all the IDL in a document.
+
+    The parser consults it while parsing,
+    to check that a required argument isn't a dictionary with no required members
+    (which would have to be optional).
+    That can depend on a dictionary defined later in the document,
+    so each lookup made while parsing a block is recorded (see IDLBlock),
+    along with how the check came out;
+    once everything's been parsed,
+    any block whose checks would come out differently gets parsed again.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.lookups: list[tuple[str, bool]] | None = None
+
+    def get(self, name: str, default: t.Any = None) -> t.Any:
+        result = super().get(name, default)
+        if self.lookups is not None:
+            # Checking the result can look up the dictionary's parents,
+            # which aren't the parser's lookups.
+            lookups, self.lookups = self.lookups, None
+            lookups.append((name, isOptionalDictionary(result)))
+            self.lookups = lookups
+        return result
+
+    def changedLookups(self, lookups: list[tuple[str, bool]]) -> bool:
+        # The plain dict lookup, so checking doesn't record more lookups.
+        dictGet = super().get
+        return any(isOptionalDictionary(dictGet(name)) != result for name, result in lookups)
+
+
+def isOptionalDictionary(construct: widlparser.Construct | None) -> bool:
+    # A dictionary with no required members
+    return construct is not None and construct.idl_type == "dictionary" and not construct.required  # type: ignore[attr-defined]
+
+
+@dataclasses.dataclass
+class IDLBlock:
+    # One normative IDL block, parsed into the doc's parser.
+    text: str
+    start: int
+    end: int
+    lookups: list[tuple[str, bool]]
+    # The parser's messages are held onto until the block is marked up,
+    # so they're reported in the same order as the markup's own messages.
+    messages: list[tuple[str, str]]
+
+    @staticmethod
+    def parse(widl: widlparser.parser.Parser, text: str, symbolTable: SymbolTable) -> IDLBlock:
+        recorder = IDLRecorder()
+        widl.ui = recorder
+        start = len(widl.constructs)
+        symbolTable.lookups = []
+        try:
+            widl.parse(text)
+        finally:
+            lookups, symbolTable.lookups = symbolTable.lookups, None
+        return IDLBlock(text, start, len(widl.constructs), lookups, recorder.messages)
+
+    def constructs(self, widl: widlparser.parser.Parser) -> list[widlparser.Construct]:
+        return widl.constructs[self.start : self.end]
+
+    def report(self, widl: widlparser.parser.Parser, symbolTable: SymbolTable, ui: IDLUI) -> None:
+        if symbolTable.changedLookups(self.lookups):
+            # Parse it again, now that the whole symbol table is known,
+            # and use that instead.
+            reparsed = getParser()
+            reparsed.ui = ui
+            reparsed.symbol_table = symbolTable
+            reparsed.parse(self.text)
+            # The symbol table only changes how names resolve, not how the text splits into constructs,
+            # so the reparse has to line up exactly with the constructs it's replacing
+            # (or every later block's start/end would be off).
+            assert (
+                len(reparsed.constructs) == self.end - self.start
+            ), f"Reparsing an IDL block produced {len(reparsed.constructs)} constructs, rather than {self.end - self.start}."
+            widl.constructs[self.start : self.end] = reparsed.constructs
+            return
+        for kind, msg in self.messages:
+            if kind == "warn":
+                ui.warn(msg)
             else:
-                return lineNum
-    return lineNum
+                ui.note(msg)
+
+
+class IDLRecorder:
+    def __init__(self) -> None:
+        self.messages: list[tuple[str, str]] = []
+
+    def warn(self, msg: str) -> None:
+        self.messages.append(("warn", msg))
+
+    def note(self, msg: str) -> None:
+        self.messages.append(("note", msg))
+
+
+def markupNodes(constructs: list[widlparser.Construct], marker: IDLMarker | DebugMarker) -> list[t.NodeT]:
+    # Builds the marked-up IDL directly as nodes,
+    # by walking widlparser's markup tree and asking the marker
+    # what element (if any) to wrap around each piece,
+    # rather than having widlparser produce an HTML string that then has to be parsed.
+    generator = widlparser.markup.MarkupGenerator(None)
+    for construct in constructs:
+        construct.define_markup(generator)
+    container = h.E.div()
+    _appendMarkup(container, generator, marker, None)
+    if container.text:
+        container.text = container.text.lstrip()
+    return h.childNodes(container, clear=True)
+
+
+def _appendMarkup(
+    parent: t.ElementT,
+    generator: widlparser.markup.MarkupGenerator,
+    marker: IDLMarker | DebugMarker,
+    construct: widlparser.Construct | None,
+) -> None:
+    # Mirrors widlparser's MarkupGenerator.markup(),
+    # walking its internal markup tree (the MarkupText/MarkupType/etc classes and their fields),
+    # which isn't part of widlparser's documented API.
+    # That's tied to the widlparser==1.5.0 pin in requirements.txt;
+    # check this still matches MarkupGenerator.markup() whenever the pin changes.
+    # pylint: disable=protected-access
+    markup = widlparser.markup
+    tag: MarkupTag | None = None
+    if isinstance(generator, markup.MarkupText):
+        # Text-ish pieces are marked up according to their parent's construct.
+        construct = t.cast("widlparser.Construct", construct)
+        if isinstance(generator, markup.MarkupTypeName):
+            tag = marker.markup_type_name(generator.text, construct)
+        elif isinstance(generator, markup.MarkupName):
+            tag = marker.markup_name(generator.text, construct)
+        elif isinstance(generator, markup.MarkupKeyword):
+            tag = marker.markup_keyword(generator.text, construct)
+        elif isinstance(generator, markup.MarkupEnumValue):
+            tag = marker.markup_enum_value(generator.text, construct)
+        text = generator.text.replace(constants.virtualLineBreak, "\n")
+        if tag is None:
+            h.appendChild(parent, text)
+        else:
+            el = tag.element()
+            el.text = text
+            h.appendChild(parent, el)
+        return
+    if generator.construct is not None:
+        if isinstance(generator, markup.MarkupType):
+            tag = marker.markup_type(generator.text, generator.construct)
+        elif isinstance(generator, markup.MarkupPrimitiveType):
+            tag = marker.markup_primitive_type(generator.text, generator.construct)
+        elif isinstance(generator, markup.MarkupStringType):
+            tag = marker.markup_string_type(generator.text, generator.construct)
+        elif isinstance(generator, markup.MarkupBufferType):
+            tag = marker.markup_buffer_type(generator.text, generator.construct)
+        elif isinstance(generator, markup.MarkupObjectType):
+            tag = marker.markup_object_type(generator.text, generator.construct)
+        else:
+            tag = marker.markup_construct(generator.text, generator.construct)
+    target = parent
+    if tag is not None:
+        target = tag.element()
+        h.appendChild(parent, target)
+    for child in generator.children:
+        _appendMarkup(target, child, marker, generator.construct)
 
 
 def markupIDLBlock(pre: t.ElementT, doc: t.SpecT) -> set[t.ElementT]:
@@ -725,14 +844,5 @@ def _nodesFromProduction(prod: widlparser.productions.Production | widlparser.pr
     return [str(prod)]
 
 
-def startTag(tagName: str, attrs: dict[str, str] | None = None) -> str:
-    s = f"<{tagName} "
-    if attrs:
-        for k, v in attrs.items():
-            s += f' {k}="{h.escapeAttr(v)}"'
-    s += ">"
-    return s
-
-
-def endTag(tagName: str) -> str:
-    return f"</{tagName}>"
+def startTag(tagName: str, attrs: dict[str, str] | None = None) -> MarkupTag:
+    return MarkupTag(tagName, attrs or {})
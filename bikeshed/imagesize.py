@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import concurrent.futures
+import dataclasses
+import os
+import re
+import struct
+
+from PIL import Image
+
+from . import config, t
+
+if t.TYPE_CHECKING:
+    type SizeT = tuple[int, int]
+
+# Finds the dimensions of local images, for unsortedJunk.addImageSize().
+#
+# The common formats (PNG, GIF, JPEG, WebP, and SVGs with pixel dimensions)
+# are sized by reading just enough of the file's header to find them;
+# anything else is handed to PIL.
+# Sizes are remembered by path, keyed by the file's mtime and size,
+# both for the rest of the process (so watch-mode rebuilds only have to stat each image)
+# and in a per-user cache file (so a fresh build doesn't have to open them either).
+# Images that do need to be read are read in parallel,
+# since image-heavy specs can have hundreds.
+
+CACHE_VERSION = 1
+
+# More than this many images to read, and they're read on worker threads.
+PARALLEL_THRESHOLD = 4
+
+# How much of an SVG to look thru for the root <svg> start tag.
+SVG_HEADER_BYTES = 64 * 1024
+
+
+@dataclasses.dataclass
+class CachedSize:
+    mtime: int
+    size: int
+    width: int
+    height: int
+
+
+# path => size, shared by every build in this process
+_sizes: dict[str, CachedSize] = {}
+_loadedCaches: set[str] = set()
+
+
+def imageSizes(paths: t.Iterable[str], cachePath: str | None = None) -> dict[str, SizeT | Exception]:
+    """
+    Returns the (width, height) of each image,
+    or the exception that prevented finding it
+    (FileNotFoundError if the image doesn't exist).
+    If cachePath is given, sizes are also remembered there between runs.
+    """
+    if cachePath and cachePath not in _loadedCaches:
+        _loadedCaches.add(cachePath)
+        _sizes.update(loadCache(cachePath))
+
+    results: dict[str, SizeT | Exception] = {}
+    toRead: dict[str, os.stat_result] = {}
+    for path in dict.fromkeys(paths):
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            results[path] = e
+            continue
+        cached = _sizes.get(path)
+        if cached and cached.mtime == stat.st_mtime_ns and cached.size == stat.st_size:
+            results[path] = (cached.width, cached.height)
+        else:
+            toRead[path] = stat
+    if not toRead:
+        return results
+
+    if len(toRead) > PARALLEL_THRESHOLD:
+        with concurrent.futures.ThreadPoolExecutor(thread_name_prefix="imagesize") as pool:
+            sizes = dict(zip(toRead, pool.map(readSize, toRead), strict=True))
+    else:
+        sizes = {path: readSize(path) for path in toRead}
+    for path, size in sizes.items():
+        results[path] = size
+        if not isinstance(size, Exception):
+            stat = toRead[path]
+            _sizes[path] = CachedSize(stat.st_mtime_ns, stat.st_size, *size)
+    if cachePath:
+        saveCache(cachePath, _sizes)
+    return results
+
+
+def readSize(path: str) -> SizeT | Exception:
+    try:
+        with open(path, "rb") as fh:
+            size = sniffSize(fh)
+        if size is not None:
+            return size
+        with Image.open(path) as im:
+            return im.size
+    except Exception as e:
+        return e
+
+
+def sniffSize(fh: t.BinaryIO) -> SizeT | None:
+    """
+    Reads the image's dimensions from its header, without decoding it.
+    Returns None if it's not a format (or a variant) this understands.
+    """
+    head = fh.read(32)
+    try:
+        if head.startswith(b"\x89PNG\r\n\x1a\n") and head[12:16] == b"IHDR":
+            return t.cast("SizeT", struct.unpack(">II", head[16:24]))
+        if head[:6] in (b"GIF87a", b"GIF89a"):
+            return t.cast("SizeT", struct.unpack("<HH", head[6:10]))
+        if head.startswith(b"\xff\xd8"):
+            fh.seek(2)
+            return jpegSize(fh)
+        if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+            return webpSize(head)
+    except struct.error:
+        # Truncated; let PIL figure out what to complain about.
+        return None
+    if b"<svg" in head or head.lstrip().startswith((b"<?xml", b"<!--", b"<!DOCTYPE")):
+        fh.seek(0)
+        return svgSize(fh.read(SVG_HEADER_BYTES))
+    return None
+
+
+# Start-of-frame markers, which hold the dimensions.
+# (C4, C8, and CC are other things that happen to share the range.)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def jpegSize(fh: t.BinaryIO) -> SizeT | None:
+    # Walks the segments until it finds a start-of-frame.
+    while True:
+        byte = fh.read(1)
+        if not byte:
+            return None
+        if byte != b"\xff":
+            continue
+        marker = fh.read(1)
+        while marker == b"\xff":
+            # Fill bytes
+            marker = fh.read(1)
+        if not marker:
+            return None
+        code = marker[0]
+        if code == 0x01 or 0xD0 <= code <= 0xD9:
+            # Standalone markers, with no length
+            continue
+        (length,) = struct.unpack(">H", fh.read(2))
+        if code in JPEG_SOF_MARKERS:
+            height, width = struct.unpack(">xHH", fh.read(5))
+            return width, height
+        fh.seek(length - 2, os.SEEK_CUR)
+
+
+def webpSize(head: bytes) -> SizeT | None:
+    # Each variant's dimensions end at a different spot;
+    # a head that stops short of them is a truncated file, left for PIL.
+    chunk = head[12:16]
+    if chunk == b"VP8 " and len(head) >= 30 and head[23:26] == b"\x9d\x01\x2a":
+        width, height = struct.unpack("<HH", head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L" and len(head) >= 25 and head[20] == 0x2F:
+        (bits,) = struct.unpack("<I", head[21:25])
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X" and len(head) >= 30:
+        width = int.from_bytes(head[24:27], "little") + 1
+        height = int.from_bytes(head[27:30], "little") + 1
+        return width, height
+    return None
+
+
+def svgSize(data: bytes) -> SizeT | None:
+    # Only SVGs that give their width and height in pixels have a definite size;
+    # anything else is left for PIL (which will say it can't tell).
+    match = re.search(rb"<svg\b([^>]*)>", data)
+    if match is None:
+        return None
+    attrs = match.group(1)
+    width = svgLength(attrs, b"width")
+    height = svgLength(attrs, b"height")
+    if width is None or height is None:
+        return None
+    return width, height
+
+
+def svgLength(attrs: bytes, name: bytes) -> int | None:
+    match = re.search(rb"(?:^|\s)" + name + rb"\s*=\s*[\"']\s*(\d+(?:\.\d+)?)\s*(?:px)?\s*[\"']", attrs)
+    if match is None:
+        return None
+    value = float(match.group(1))
+    if not value.is_integer():
+        return None
+    return int(value)
+
+
+def loadCache(path: str) -> dict[str, CachedSize]:
+    sizes = config.loadJsonCache(
+        path,
+        CACHE_VERSION,
+        lambda data: {imgPath: CachedSize(**size) for imgPath, size in data["images"].items()},
+    )
+    return sizes or {}
+
+
+def saveCache(path: str, sizes: dict[str, CachedSize]) -> None:
+    # Images that have since been deleted aren't worth remembering.
+    images = {imgPath: dataclasses.asdict(size) for imgPath, size in sizes.items() if os.path.exists(imgPath)}
+    config.saveJsonCache(path, CACHE_VERSION, {"images": images}, "image size cache")
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import copy
+import dataclasses
 import hashlib
 import itertools
 import re
@@ -9,6 +11,7 @@ from . import messages as m
 
 
 def processInclusions(doc: t.SpecT) -> None:
+    doc.includeCache.startBuild()
     iters = 0
     while True:
         # Loop because an include can contain more includes.
@@ -25,6 +28,7 @@ def processInclusions(doc: t.SpecT) -> None:
         handleCodeInclude(el, doc)
     for el in h.findAll("pre.include-raw", doc):
         handleRawInclude(el, doc)
+    doc.includeCache.finishBuild()
 
 
 def handleBikeshedInclude(el: t.ElementT, doc: t.SpecT) -> None:
@@ -80,10 +84,9 @@ def handleBikeshedInclude(el: t.ElementT, doc: t.SpecT) -> None:
             context=f"file '{path}' (included by a block on {h.approximateLineNumber(el)})",
         )
         parseConfig.macros = {**parseConfig.macros, **macros}
-        lines = h.parseLines(lines, parseConfig, context=el)
-        lines = markdown.parse(t.cast("list[str]", lines), markdown.MarkdownConfig.fromSpec(doc))
-        text = t.EarlyParsedHtmlStr("".join(lines))
-        subtree = h.parseInto(h.E.div(), text)
+        subtree = doc.includeCache.parse(lines, parseConfig, markdown.MarkdownConfig.fromSpec(doc))
+        # Data blocks can add to the doc's refs and such,
+        # so they're processed for every include, even cached ones.
         datablocks.transformDataBlocks(doc, subtree)
         for childInclude in h.findAll("pre.include", subtree):
             childInclude.set("hash", hash)
@@ -99,6 +102,94 @@ def handleBikeshedInclude(el: t.ElementT, doc: t.SpecT) -> None:
         return
 
 
+def parseInclude(lines: list[str], parseConfig: h.ParseConfig, mdConfig: markdown.MarkdownConfig) -> t.ElementT:
+    parsedLines = h.parseLines(lines, parseConfig, context=None)
+    mdLines = markdown.parse(t.cast("list[str]", parsedLines), mdConfig)
+    text = t.EarlyParsedHtmlStr("".join(mdLines))
+    return h.parseInto(h.E.div(), text)
+
+
+# Big specs are often assembled from lots of include files,
+# many of them included repeatedly (with the same macros),
+# and parsing each one (HTML, then Markdown, then into a tree)
+# is most of the cost of an include.
+# The IncludeCache keeps the parsed tree of each include,
+# keyed by its text and everything that affects how it parses,
+# and hands out copies of it when the same thing is included again.
+#
+# The parse also records where each element came from
+# (the bs-line-number and bs-parse-context attributes,
+# naming the file and the block that included it),
+# which differs between inclusions.
+# If parsing produced no messages, the copy just gets its elements' context rewritten;
+# otherwise the messages would mention the wrong place,
+# so the include is only reused from the exact same inclusion
+# (replaying its messages), and is otherwise parsed again.
+#
+# The Spec keeps its cache across watch-mode rebuilds,
+# so unchanged includes don't need to be parsed again at all.
+# Entries that weren't used in a build are dropped at the end of it.
+
+
+@dataclasses.dataclass
+class CachedInclude:
+    subtree: t.ElementT
+    context: str | None
+    messages: m.CapturedMessages
+
+    def isSilent(self) -> bool:
+        return not self.messages.text and not self.messages.categoryCounts
+
+
+class IncludeCache:
+    def __init__(self) -> None:
+        self.entries: dict[str, CachedInclude] = {}
+        self.used: set[str] = set()
+
+    def startBuild(self) -> None:
+        self.used = set()
+
+    def finishBuild(self) -> None:
+        self.entries = {key: entry for key, entry in self.entries.items() if key in self.used}
+
+    def parse(self, lines: list[str], parseConfig: h.ParseConfig, mdConfig: markdown.MarkdownConfig) -> t.ElementT:
+        """
+        Returns the parsed include, wrapped in a <div>,
+        reusing an earlier parse of it if possible.
+        """
+        # (The macros are a defaultdict, whose repr includes its factory function's address.)
+        configKey = repr(dataclasses.replace(parseConfig, macros=dict(parseConfig.macros), context=None))
+        key = hashlib.sha256(f"{configKey}\n{mdConfig!r}\n{''.join(lines)}".encode("utf-8")).hexdigest()
+        self.used.add(key)
+        context = parseConfig.context
+        cached = self.entries.get(key)
+        if cached is not None:
+            if cached.context == context:
+                cached.messages.replay()
+                return copy.deepcopy(cached.subtree)
+            if cached.isSilent() and cached.context is not None and context is not None:
+                subtree = copy.deepcopy(cached.subtree)
+                replaceContext(subtree, cached.context, context)
+                return subtree
+        with m.captureMessages() as messages:
+            subtree = parseInclude(lines, parseConfig, mdConfig)
+        self.entries[key] = CachedInclude(copy.deepcopy(subtree), context, messages)
+        return subtree
+
+
+def replaceContext(subtree: t.ElementT, oldContext: str, newContext: str) -> None:
+    # The context shows up in bs-parse-context,
+    # and at the end of bs-line-number ("12:3 of file 'foo.bs' ...").
+    # Nothing else is touched, even if it happens to contain the same text.
+    for el in subtree.iter():
+        if not h.isElement(el):
+            continue
+        for name in ("bs-line-number", "bs-parse-context"):
+            value = el.get(name)
+            if value is not None and oldContext in value:
+                el.set(name, value.replace(oldContext, newContext))
+
+
 def handleCodeInclude(el: t.ElementT, doc: t.SpecT) -> None:
     if not el.get("path"):
         m.die(
@@ -1,13 +1,47 @@
 from __future__ import annotations
 
-import logging
+import asyncio
+import collections
+import dataclasses
 import time
+import urllib.parse
 
-import requests
+import aiohttp
 
-from .. import h, t
+from .. import config, h, t
 from .. import messages as m
 
+if t.TYPE_CHECKING:
+    from ..metadata import LinkCheckerTimeout
+
+# How many requests can be in flight to a single host at once.
+# Specs tend to link to the same few hosts over and over,
+# so this keeps us from hammering them (and getting rate-limited).
+MAX_REQUESTS_PER_HOST = 4
+
+# How long a cached result is trusted before the link is checked again.
+# Working links rarely break, so they're rechecked rarely;
+# broken ones get rechecked sooner, since they're presumably being fixed.
+# Timeouts and connection errors are usually transient, so they're never cached.
+GOOD_LINK_TTL = 7 * 24 * 60 * 60
+BAD_LINK_TTL = 24 * 60 * 60
+
+CACHE_VERSION = 1
+
+
+@dataclasses.dataclass
+class LinkResult:
+    status: int | None = None
+    # "timeout" or "error" if the request didn't produce a status at all.
+    error: str | None = None
+    checked: float = dataclasses.field(default_factory=time.time)
+
+    def isFresh(self, now: float) -> bool:
+        if self.status is None:
+            return False
+        ttl = GOOD_LINK_TTL if self.status < 400 else BAD_LINK_TTL
+        return now - self.checked < ttl
+
 
 def brokenLinks(doc: t.SpecT) -> None:
     """
@@ -20,15 +54,10 @@ def brokenLinks(doc: t.SpecT) -> None:
     timeout = doc.md.linkCheckerTimeout
 
     m.say("Checking links, this may take a while...")
-    logging.captureWarnings(True)  # Silence the requests library :/
-    startTime = time.time()
+    # Every link, in document order, so they're reported in that order;
+    # each distinct href is only requested once, though.
+    links: list[tuple[t.ElementT, str]] = []
     for el in h.findAll("a", doc):
-        if time.time() - startTime > timeout.total:
-            if not doc.testing:
-                # This is the only real non-determinism in the testsuite,
-                # and it's KILLING ME. BEGONE, FOUL TEST FAILURE
-                m.lint(f"Link checking took longer than {timeout.total} seconds, skipping the rest.")
-            break
         href = el.get("href")
         if not href or href[0] == "#":
             # Local link
@@ -36,14 +65,105 @@ def brokenLinks(doc: t.SpecT) -> None:
         if href.startswith("mailto:"):
             # Can't check mailto links
             continue
-        try:
-            res = requests.get(href, timeout=timeout.each)
-        except requests.exceptions.Timeout:
-            m.lint(f"Checking the following link timed out:\n{href}", el=el)
+        links.append((el, href))
+    hrefs = list(dict.fromkeys(href for _, href in links))
+
+    cachePath = config.docCachePath(doc, "link-checks.json")
+    cache = loadCache(cachePath) if cachePath else {}
+    now = time.time()
+    results = {href: cache[href] for href in hrefs if href in cache and cache[href].isFresh(now)}
+    staleHrefs = [href for href in hrefs if href not in results]
+    if staleHrefs:
+        results.update(asyncio.run(checkLinks(staleHrefs, timeout)))
+
+    for el, href in links:
+        result = results.get(href)
+        if result is None:
             continue
-        except:  # pylint: disable=bare-except
+        if result.error == "timeout":
+            m.lint(f"Checking the following link timed out:\n{href}", el=el)
+        elif result.error is not None:
             m.lint(f"The following link caused an error when I tried to request it:\n{href}", el=el)
-            continue
-        if res.status_code >= 400:
-            m.lint(f"Got a {res.status_code} status when fetching the link for:\n{href}", el=el)
+        elif result.status is not None and result.status >= 400:
+            m.lint(f"Got a {result.status} status when fetching the link for:\n{href}", el=el)
+    if len(results) < len(hrefs) and not doc.testing:
+        # This is the only real non-determinism in the testsuite,
+        # and it's KILLING ME. BEGONE, FOUL TEST FAILURE
+        m.lint(f"Link checking took longer than {timeout.total} seconds, skipping the rest.")
+
+    if cachePath:
+        cache.update(results)
+        saveCache(cachePath, cache)
     m.say("Done checking links!")
+
+
+async def checkLinks(hrefs: list[str], timeout: LinkCheckerTimeout) -> dict[str, LinkResult]:
+    # Checks all the links concurrently.
+    # Anything not done within the total timeout is left out of the results.
+    hostLimits: collections.defaultdict[str, asyncio.Semaphore] = collections.defaultdict(
+        lambda: asyncio.Semaphore(MAX_REQUESTS_PER_HOST),
+    )
+    results: dict[str, LinkResult] = {}
+    async with aiohttp.ClientSession(trust_env=True) as session:
+        tasks = {asyncio.create_task(checkLink(session, href, hostLimits, timeout)): href for href in hrefs}
+        done, pending = await asyncio.wait(tasks, timeout=timeout.total)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        for task in done:
+            results[tasks[task]] = task.result()
+    return results
+
+
+async def checkLink(
+    session: aiohttp.ClientSession,
+    href: str,
+    hostLimits: t.Mapping[str, asyncio.Semaphore],
+    timeout: LinkCheckerTimeout,
+) -> LinkResult:
+    try:
+        host = urllib.parse.urlsplit(href).hostname or ""
+    except ValueError:
+        return LinkResult(error="error")
+    async with hostLimits[host]:
+        try:
+            try:
+                status = await fetchStatus(session, "HEAD", href, timeout)
+            except aiohttp.ClientError as e:
+                if isinstance(e, TimeoutError):
+                    # aiohttp's timeouts are also ClientErrors,
+                    # but there's no point waiting all over again for a GET.
+                    raise
+                status = None
+            if status is None or status >= 400:
+                # Plenty of servers don't handle HEAD properly,
+                # so double-check with a real GET before complaining.
+                status = await fetchStatus(session, "GET", href, timeout)
+        except TimeoutError:
+            return LinkResult(error="timeout")
+        except Exception:
+            return LinkResult(error="error")
+    return LinkResult(status=status)
+
+
+async def fetchStatus(session: aiohttp.ClientSession, method: str, href: str, timeout: LinkCheckerTimeout) -> int:
+    # The timeout only starts once the request actually gets to go,
+    # not while it's waiting on the per-host limit.
+    # The body is never read; the status is all that matters.
+    async with session.request(method, href, timeout=aiohttp.ClientTimeout(total=timeout.each)) as response:
+        return response.status
+
+
+def loadCache(path: str) -> dict[str, LinkResult]:
+    cache = config.loadJsonCache(
+        path,
+        CACHE_VERSION,
+        lambda data: {href: LinkResult(**result) for href, result in data["links"].items()},
+    )
+    return cache or {}
+
+
+def saveCache(path: str, cache: dict[str, LinkResult]) -> None:
+    now = time.time()
+    links = {href: dataclasses.asdict(result) for href, result in cache.items() if result.isFresh(now)}
+    config.saveJsonCache(path, CACHE_VERSION, {"links": links}, "link checker's cache")
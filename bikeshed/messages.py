@@ -6,6 +6,7 @@ import io
 import json
 import os
 import sys
+import threading
 from collections import Counter
 
 from . import t
@@ -80,6 +81,18 @@ class MessagesState:
     def replace(self, **kwargs: t.Any) -> MessagesState:
         return dataclasses.replace(self, seenMessages=set(), categoryCounts=Counter(), **kwargs)
 
+    def settings(self) -> dict[str, t.Any]:
+        # The user-controlled options, in a form that can be sent to another process
+        # and passed back to replace().
+        return {
+            "dieOn": self.dieOn,
+            "dieWhen": self.dieWhen,
+            "printOn": self.printOn,
+            "silent": self.silent,
+            "printMode": self.printMode,
+            "asciiOnly": self.asciiOnly,
+        }
+
     def shouldDie(self, category: str, timing: str = "early") -> bool:
         if self.dieWhen == "never":
             return False
@@ -201,7 +214,10 @@ def printCloser() -> None:
 
 
 def die(msg: str, el: t.ElementT | None = None, lineNum: str | int | None = None) -> None:
+    recorded(die, msg, el, lineNum)
     lineNum = getLineNum(lineNum, el)
+    if deferred(die, msg, None, lineNum):
+        return
     formattedMsg = formatMessage("fatal", msg, lineNum=lineNum)
     if formattedMsg not in state.seenMessages:
         state.record("fatal", formattedMsg)
@@ -212,7 +228,10 @@ def die(msg: str, el: t.ElementT | None = None, lineNum: str | int | None = None
 
 
 def linkerror(msg: str, el: t.ElementT | None = None, lineNum: str | int | None = None) -> None:
+    recorded(linkerror, msg, el, lineNum)
     lineNum = getLineNum(lineNum, el)
+    if deferred(linkerror, msg, None, lineNum):
+        return
     formattedMsg = formatMessage("link", msg, lineNum=lineNum)
     if formattedMsg not in state.seenMessages:
         state.record("link-error", formattedMsg)
@@ -223,7 +242,10 @@ def linkerror(msg: str, el: t.ElementT | None = None, lineNum: str | int | None
 
 
 def lint(msg: str, el: t.ElementT | None = None, lineNum: str | int | None = None) -> None:
+    recorded(lint, msg, el, lineNum)
     lineNum = getLineNum(lineNum, el)
+    if deferred(lint, msg, None, lineNum):
+        return
     formattedMsg = formatMessage("lint", msg, lineNum=lineNum)
     if formattedMsg not in state.seenMessages:
         state.record("lint", formattedMsg)
@@ -234,7 +256,10 @@ def lint(msg: str, el: t.ElementT | None = None, lineNum: str | int | None = Non
 
 
 def warn(msg: str, el: t.ElementT | None = None, lineNum: str | int | None = None) -> None:
+    recorded(warn, msg, el, lineNum)
     lineNum = getLineNum(lineNum, el)
+    if deferred(warn, msg, None, lineNum):
+        return
     formattedMsg = formatMessage("warning", msg, lineNum=lineNum)
     if formattedMsg not in state.seenMessages:
         state.record("warning", formattedMsg)
@@ -245,6 +270,8 @@ def warn(msg: str, el: t.ElementT | None = None, lineNum: str | int | None = Non
 
 
 def say(msg: str) -> None:
+    if deferred(say, msg):
+        return
     if state.shouldPrint("message"):
         p(formatMessage("message", msg))
 
@@ -396,6 +423,112 @@ def withMessageState(
             fh.close()
 
 
+@dataclasses.dataclass
+class CapturedMessages:
+    text: str = ""
+    categoryCounts: Counter[str] = dataclasses.field(default_factory=Counter)
+    seenMessages: set[str | tuple[str, str]] = dataclasses.field(default_factory=set)
+
+    def replay(self) -> None:
+        # Outputs and records the messages again,
+        # as if the code that produced them had just run.
+        state.fh.write(self.text)
+        state.categoryCounts.update(self.categoryCounts)
+        state.seenMessages.update(self.seenMessages)
+
+
+@contextlib.contextmanager
+def captureMessages() -> t.Generator[CapturedMessages, None, None]:
+    # Messages still go to the output as normal (tho only once the block exits),
+    # but are also recorded so they can be replayed later.
+    captured = CapturedMessages()
+    oldFh = state.fh
+    oldCounts = state.categoryCounts.copy()
+    oldSeen = set(state.seenMessages)
+    buffer = io.StringIO()
+    state.fh = buffer
+    try:
+        yield captured
+    finally:
+        state.fh = oldFh
+        captured.text = buffer.getvalue()
+        captured.categoryCounts = state.categoryCounts - oldCounts
+        captured.seenMessages = state.seenMessages - oldSeen
+        oldFh.write(captured.text)
+
+
+# Phases running on worker threads (see phases.py) can't print their messages directly,
+# or they'd come out interleaved in some random order.
+# Instead, their messages get queued up,
+# and then reported for real on the main thread, in a predictable order.
+_threadLocal = threading.local()
+
+
+@dataclasses.dataclass
+class DeferredMessages:
+    calls: list[tuple[t.Callable[..., None], tuple[t.Any, ...]]] = dataclasses.field(default_factory=list)
+
+    def replay(self) -> None:
+        # Reports the messages, exactly as if they'd been reported on this thread originally
+        # (including dying, if they're fatal).
+        for fn, args in self.calls:
+            fn(*args)
+
+
+@contextlib.contextmanager
+def deferMessages() -> t.Generator[DeferredMessages, None, None]:
+    messages = DeferredMessages()
+    _threadLocal.deferred = messages
+    try:
+        yield messages
+    finally:
+        _threadLocal.deferred = None
+
+
+def deferred(fn: t.Callable[..., None], *args: t.Any) -> bool:
+    # Queues up the message instead, if this thread's messages are being deferred.
+    messages = getattr(_threadLocal, "deferred", None)
+    if messages is None:
+        return False
+    messages.calls.append((fn, args))
+    return True
+
+
+@dataclasses.dataclass
+class RecordedMessages:
+    # The element the recorded code was reporting about.
+    el: t.ElementT | None = None
+    calls: list[tuple[t.Callable[..., None], str, t.ElementT | None, str | int | None]] = dataclasses.field(
+        default_factory=list,
+    )
+
+    def replay(self, el: t.ElementT | None = None) -> None:
+        # Reports the messages again, as if the recorded code had just run for el instead.
+        for fn, msg, msgEl, lineNum in self.calls:
+            if msgEl is not None and msgEl is self.el:
+                msgEl = el
+            fn(msg, el=msgEl, lineNum=lineNum)
+
+
+@contextlib.contextmanager
+def recordMessages(el: t.ElementT | None = None) -> t.Generator[RecordedMessages, None, None]:
+    # Messages are reported as normal, but also remembered so they can be replayed later.
+    messages = RecordedMessages(el=el)
+    recorders = getattr(_threadLocal, "recorders", None)
+    if recorders is None:
+        recorders = _threadLocal.recorders = []
+    recorders.append(messages)
+    try:
+        yield messages
+    finally:
+        recorders.pop()
+
+
+def recorded(fn: t.Callable[..., None], msg: str, el: t.ElementT | None, lineNum: str | int | None) -> None:
+    for messages in getattr(_threadLocal, "recorders", ()):
+        messages.calls.append((fn, msg, el, lineNum))
+
+
 @contextlib.contextmanager
 def messagesSilent() -> t.Generator[t.TextIO, None, None]:
     fh = open(os.devnull, "w", encoding="utf-8")
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import contextlib
+import gzip
+import io
+import os
+import shutil
+import stat
+
+from . import t
+
+# Where the rendered spec gets written.
+#
+# The serializer streams its output straight into the file,
+# rather than building the whole document as a string first.
+# The file is written under a temporary name next to the real one,
+# and only moved into place once everything's been written successfully,
+# so a failed build never leaves a half-written spec behind
+# (or clobbers the previous good one).
+# The new file keeps the old one's permissions,
+# and if the old one has other hardlinks,
+# it's overwritten in place instead, so they all see the new spec.
+#
+# If the filename ends in .gz or .br, the output is compressed as it's written,
+# with gzip or brotli respectively.
+# (Brotli needs the optional `brotli` package.)
+
+
+class OutputFile:
+    def __init__(self, filename: str, newline: str | None = None) -> None:
+        # Write thru symlinks, like opening the file directly would.
+        self.path = os.path.realpath(filename)
+        self.tempPath = f"{self.path}.{os.getpid()}.tmp"
+        self.raw = open(self.tempPath, "wb")  # noqa: SIM115  # pylint: disable=consider-using-with
+        try:
+            compressed = compressedWriter(self.raw, self.path)
+        except Exception:
+            self.raw.close()
+            os.remove(self.tempPath)
+            raise
+        self.fh = io.TextIOWrapper(compressed, encoding="utf-8", newline=newline)
+        self.committed = False
+
+    def write(self, text: str) -> None:
+        self.fh.write(text)
+
+    def commit(self) -> None:
+        # Finishes the file and moves it into place.
+        self.fh.close()
+        # (GzipFile doesn't close the file it's wrapping.)
+        self.raw.close()
+        try:
+            existing = os.stat(self.path)
+        except FileNotFoundError:
+            existing = None
+        if existing is not None and existing.st_nlink > 1:
+            shutil.copyfile(self.tempPath, self.path)
+            os.remove(self.tempPath)
+        else:
+            if existing is not None:
+                os.chmod(self.tempPath, stat.S_IMODE(existing.st_mode))
+            os.replace(self.tempPath, self.path)
+        self.committed = True
+
+    def discard(self) -> None:
+        if self.committed:
+            return
+        with contextlib.suppress(Exception):
+            self.fh.close()
+        self.raw.close()
+        if os.path.exists(self.tempPath):
+            os.remove(self.tempPath)
+
+    def __enter__(self) -> OutputFile:
+        return self
+
+    def __exit__(self, *args: t.Any) -> None:
+        self.discard()
+
+
+def compressedWriter(raw: t.BinaryIO, path: str) -> t.BinaryIO:
+    if path.endswith(".gz"):
+        # Name the original file in the gzip header, not the temp file.
+        return t.cast("t.BinaryIO", gzip.GzipFile(filename=os.path.basename(path)[:-3], mode="wb", fileobj=raw))
+    if path.endswith(".br"):
+        try:
+            import brotli  # type: ignore[import-not-found] # noqa: PLC0415
+        except ImportError:
+            msg = "Brotli compression needs the 'brotli' package. Install it with `pip install brotli`, or use a .gz output file instead."
+            raise ImportError(msg) from None
+        return t.cast("t.BinaryIO", io.BufferedWriter(BrotliWriter(raw, brotli.Compressor())))
+    return raw
+
+
+class BrotliWriter(io.RawIOBase):
+    def __init__(self, raw: t.BinaryIO, compressor: t.Any) -> None:
+        self.raw = raw
+        self.compressor = compressor
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: t.Any) -> int:
+        self.raw.write(self.compressor.process(bytes(data)))
+        return len(data)
+
+    def close(self) -> None:
+        if not self.closed:
+            self.raw.write(self.compressor.finish())
+            self.raw.close()
+        super().close()
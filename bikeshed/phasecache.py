@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+
+from . import messages as m
+from . import t
+
+if t.TYPE_CHECKING:
+    PhaseT = t.TypeVar("PhaseT")
+
+
+# Watch mode rebuilds the whole document on every save,
+# but some phases are pure functions of the source text and a handful of settings
+# (the early parse, the Markdown pass), and most edits leave at least some of those inputs untouched.
+# A PhaseCache remembers the last result of each such phase,
+# keyed by a hash of everything the phase depends on,
+# and reuses it (replaying any messages it emitted) when those inputs haven't changed.
+#
+# Results are handed out as-is, so phases must return immutable values
+# (strings, tuples) that the rest of the build can't mutate.
+
+
+@dataclasses.dataclass
+class CachedPhase:
+    digest: str
+    result: t.Any
+    messages: m.CapturedMessages
+
+
+class PhaseCache:
+    def __init__(self) -> None:
+        # Only the most recent result for each phase is kept;
+        # watch mode only ever builds one document.
+        self.phases: dict[str, CachedPhase] = {}
+
+    def run(self, name: str, inputs: str, fn: t.Callable[[], PhaseT]) -> PhaseT:
+        digest = hashlib.sha256(inputs.encode("utf-8")).hexdigest()
+        cached = self.phases.get(name)
+        if cached is not None and cached.digest == digest:
+            cached.messages.replay()
+            return t.cast("PhaseT", cached.result)
+        with m.captureMessages() as captured:
+            result = fn()
+        self.phases[name] = CachedPhase(digest, result, captured)
+        return result
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import concurrent.futures
+
+from . import constants, t, timings
+from . import messages as m
+
+if t.TYPE_CHECKING:
+    type PhaseFnT = t.Callable[[t.SpecT], t.Any]
+
+# Spec.processDocument() is a long list of phases,
+# each reading and/or modifying some part of the document.
+# A phase can declare what it reads and writes,
+# in terms of a few coarse resources:
+#
+# "tree"
+#     The document's DOM.
+# "refs"
+#     doc.refs, and the biblio refs collected while linking.
+# "idl"
+#     doc.widl, the parsed WebIDL.
+#
+# Phases that don't declare anything are assumed to read and write everything,
+# so they always run by themselves.
+# A run of consecutive phases that don't write anything the others read or write
+# doesn't depend on the order they run in,
+# so the phases in it are run at the same time, on worker threads.
+#
+# Because of the GIL, that only really helps phases that spend their time waiting
+# (on the network, mostly), but those can be slow;
+# checking a spec's links can take longer than the entire rest of the build,
+# and now the other lints run while it waits.
+#
+# Messages from phases on worker threads are held back,
+# then reported in the order the phases were declared,
+# so the output is exactly what running them one at a time would have printed.
+#
+# The --serial flag turns all this off,
+# and just runs every phase in order on the main thread.
+
+EVERYTHING = frozenset(["*"])
+
+
+class Phase:
+    def __init__(
+        self,
+        fn: PhaseFnT,
+        reads: t.Iterable[str] = EVERYTHING,
+        writes: t.Iterable[str] = EVERYTHING,
+        name: str | None = None,
+    ) -> None:
+        self.fn = fn
+        self.reads = frozenset(reads)
+        self.writes = frozenset(writes)
+        if name is None:
+            # Named by where it lives in bikeshed, like "boilerplate.addLogo".
+            name = f"{fn.__module__.removeprefix('bikeshed.')}.{fn.__qualname__}"
+        self.name = name
+
+    def run(self, doc: t.SpecT) -> None:
+        with timings.step("processDocument", self.name, doc):
+            self.fn(doc)
+
+    def conflictsWith(self, other: Phase) -> bool:
+        return overlaps(self.writes, other.reads | other.writes) or overlaps(other.writes, self.reads)
+
+    def __repr__(self) -> str:
+        return f"Phase({self.name}, reads={sorted(self.reads)}, writes={sorted(self.writes)})"
+
+
+def overlaps(a: frozenset[str], b: frozenset[str]) -> bool:
+    if not a or not b:
+        return False
+    return "*" in a or "*" in b or not a.isdisjoint(b)
+
+
+def run(doc: t.SpecT, phases: t.Iterable[Phase | PhaseFnT]) -> None:
+    """
+    Runs the phases on the doc,
+    with each run of independent phases run concurrently
+    (unless --serial was passed).
+    Plain functions are treated as phases that read and write everything.
+    """
+    for batch in batches(asPhase(phase) for phase in phases):
+        if len(batch) == 1 or constants.serialPhases:
+            for phase in batch:
+                phase.run(doc)
+        else:
+            runConcurrently(doc, batch)
+
+
+def asPhase(phase: Phase | PhaseFnT) -> Phase:
+    if isinstance(phase, Phase):
+        return phase
+    return Phase(phase)
+
+
+def batches(phases: t.Iterable[Phase]) -> list[list[Phase]]:
+    # Splits the phases into runs that can be run concurrently,
+    # keeping the declared order.
+    result: list[list[Phase]] = []
+    batch: list[Phase] = []
+    for phase in phases:
+        if any(phase.conflictsWith(other) for other in batch):
+            result.append(batch)
+            batch = []
+        batch.append(phase)
+    if batch:
+        result.append(batch)
+    return result
+
+
+def runConcurrently(doc: t.SpecT, batch: list[Phase]) -> None:
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(batch), thread_name_prefix="phase") as pool:
+        futures = [pool.submit(runDeferred, doc, phase) for phase in batch]
+    for future in futures:
+        messages, error = future.result()
+        # If an earlier phase's messages are fatal, this stops right there,
+        # just like it would have if the phases were run one at a time.
+        messages.replay()
+        if error is not None:
+            raise error
+
+
+def runDeferred(doc: t.SpecT, phase: Phase) -> tuple[m.DeferredMessages, BaseException | None]:
+    # Exceptions are handed back rather than raised,
+    # so the messages the phase reported before failing aren't lost.
+    with m.deferMessages() as messages:
+        try:
+            phase.run(doc)
+        except BaseException as e:
+            return messages, e
+    return messages, None
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import mmap
+import struct
+
+from .. import dataindex, t
+from . import wrapper
+
+if t.TYPE_CHECKING:
+    from .. import retrieve
+
+# Compiled, mmap-able version of the anchors-XX.data files.
+#
+# The text format has to be decoded line-by-line,
+# building a RefWrapper for every anchor in the group,
+# even though nearly all of them are never looked at.
+# This format instead lets a RefSource find the anchors for a single key
+# with a binary search, and only decode those.
+#
+# Layout (all integers are little-endian u32s unless noted):
+#
+# header
+#     magic (8 bytes), source size (u64), source mtime in ns (u64),
+#     then the counts of strings, keys, records, and for-values.
+# string offsets
+#     (numStrings + 1) byte offsets into the string blob;
+#     string N is blob[offsets[N]:offsets[N+1]], UTF-8 encoded.
+# keys
+#     (string id, first record, record count), sorted by the key's UTF-8 bytes.
+# records
+#     string ids for displayText/type/spec/shortname/level/status/url,
+#     then a flags word (export, normative), then (first for-value, for-value count).
+# for-values
+#     string ids.
+# string blob
+#
+# Strings are stored already normalized the way RefWrapper normalizes them
+# (without the data fields' trailing newlines),
+# so the resulting RefWrappers are identical to the text-parsed ones.
+#
+# The index records the size and mtime of the .data file it was compiled from,
+# and is ignored if those no longer match.
+
+MAGIC = b"BSANCHR2"
+INDEX_FOLDER = "anchors-index"
+HEADER = struct.Struct("<8sQQIIII")
+KEY = struct.Struct("<III")
+RECORD = struct.Struct("<10I")
+U32 = struct.Struct("<I")
+
+FLAG_EXPORT = 1
+FLAG_NORMATIVE = 2
+
+
+class AnchorIndex:
+    __slots__ = [
+        "_forsStart",
+        "_keysStart",
+        "_mm",
+        "_recordsStart",
+        "_strings",
+        "_stringsStart",
+        "blobStart",
+        "numKeys",
+        "numRecords",
+    ]
+
+    def __init__(self, mm: mmap.mmap) -> None:
+        self._mm = mm
+        _, _, _, numStrings, numKeys, numRecords, numFors = HEADER.unpack_from(mm, 0)
+        self.numKeys: int = numKeys
+        self.numRecords: int = numRecords
+        self._stringsStart = HEADER.size
+        self._keysStart = self._stringsStart + U32.size * (numStrings + 1)
+        self._recordsStart = self._keysStart + KEY.size * numKeys
+        self._forsStart = self._recordsStart + RECORD.size * numRecords
+        self.blobStart = self._forsStart + U32.size * numFors
+        # Decoded strings, by id. Most of them are the handful of types/statuses/specs,
+        # so caching them saves decoding (and allocating) the same strings repeatedly.
+        self._strings: dict[int, str] = {}
+
+    @staticmethod
+    def open(dataPath: str, indexPath: str) -> AnchorIndex | None:
+        """
+        Opens the index at indexPath,
+        if it exists and was compiled from the current version of dataPath.
+        Otherwise returns None, and the caller should fall back to the .data file.
+        """
+        mm = dataindex.openIndex(dataPath, indexPath, HEADER, MAGIC)
+        if mm is None:
+            return None
+        return AnchorIndex(mm)
+
+    def _bytes(self, id: int) -> bytes:
+        start, end = struct.unpack_from("<II", self._mm, self._stringsStart + U32.size * id)
+        return self._mm[self.blobStart + start : self.blobStart + end]
+
+    def _str(self, id: int) -> str:
+        s = self._strings.get(id)
+        if s is None:
+            s = self._bytes(id).decode("utf-8")
+            self._strings[id] = s
+        return s
+
+    def _key(self, i: int) -> bytes:
+        (strId,) = U32.unpack_from(self._mm, self._keysStart + KEY.size * i)
+        return self._bytes(strId)
+
+    def _findKey(self, key: str) -> int | None:
+        target = key.encode("utf-8")
+        i = dataindex.lowerBound(self.numKeys, target, self._key)
+        if i < self.numKeys and self._key(i) == target:
+            return i
+        return None
+
+    def __contains__(self, key: str) -> bool:
+        return self._findKey(key) is not None
+
+    def get(self, key: str) -> list[wrapper.RefWrapper]:
+        i = self._findKey(key)
+        if i is None:
+            return []
+        _, recStart, recCount = KEY.unpack_from(self._mm, self._keysStart + KEY.size * i)
+        return self._refs(key, recStart, recCount)
+
+    def items(self) -> t.Generator[tuple[str, list[wrapper.RefWrapper]], None, None]:
+        # Yields in the same order as the source file,
+        # rather than the sorted order of the key table.
+        keys = [KEY.unpack_from(self._mm, self._keysStart + KEY.size * i) for i in range(self.numKeys)]
+        for strId, recStart, recCount in sorted(keys, key=lambda x: x[1]):
+            key = self._bytes(strId).decode("utf-8")
+            yield key, self._refs(key, recStart, recCount)
+
+    def _refs(self, key: str, recStart: int, recCount: int) -> list[wrapper.RefWrapper]:
+        refs = []
+        for i in range(recStart, recStart + recCount):
+            (
+                displayId,
+                typeId,
+                specId,
+                shortnameId,
+                levelId,
+                statusId,
+                urlId,
+                flags,
+                forStart,
+                forCount,
+            ) = RECORD.unpack_from(self._mm, self._recordsStart + RECORD.size * i)
+            fors = [
+                self._str(U32.unpack_from(self._mm, self._forsStart + U32.size * j)[0])
+                for j in range(forStart, forStart + forCount)
+            ]
+            refs.append(
+                wrapper.RefWrapper(
+                    key,
+                    self._str(displayId),
+                    self._str(typeId),
+                    self._str(specId),
+                    self._str(shortnameId),
+                    self._str(levelId),
+                    self._str(statusId),
+                    self._str(urlId),
+                    bool(flags & FLAG_EXPORT),
+                    bool(flags & FLAG_NORMATIVE),
+                    fors,
+                ),
+            )
+        return refs
+
+
+def indexForGroup(dataFile: retrieve.DataFileRequester, group: str) -> AnchorIndex | None:
+    # The index used is always the one next to the file that would otherwise be read.
+    requester = dataFile.findWithFallback("anchors", f"anchors-{group}.data")
+    if requester is None:
+        return None
+    return AnchorIndex.open(
+        requester.path("anchors", f"anchors-{group}.data"),
+        requester.path(INDEX_FOLDER, f"anchors-{group}.idx"),
+    )
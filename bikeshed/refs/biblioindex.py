@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import io
+import mmap
+import struct
+
+from .. import biblio, dataindex, t
+
+if t.TYPE_CHECKING:
+    from .. import retrieve
+
+# Key index for the biblio-XX.data files.
+#
+# A single [[FOO]] reference used to mean parsing the whole biblio-fo.data file,
+# building an entry object for every spec in it.
+# This index instead records where each key's entries are in the .data file,
+# so only the requested ones get decoded.
+# Unlike the anchor index, it doesn't copy the data itself;
+# the .data file is mmapped and the entries are decoded straight from it,
+# with the same code that reads the whole file.
+#
+# Layout (all integers are little-endian u32s unless noted):
+#
+# header
+#     magic (8 bytes), source size (u64), source mtime in ns (u64),
+#     then the counts of keys and entries.
+# keys
+#     (key start, key end, first entry, entry count), sorted by the key's UTF-8 bytes.
+#     Key start/end are byte offsets into the key blob.
+# entries
+#     (byte offset, byte length) of each entry in the .data file,
+#     in file order within each key.
+# key blob
+#
+# The index records the size and mtime of the .data file it was compiled from,
+# and is ignored if those no longer match.
+
+MAGIC = b"BSBIBLI1"
+INDEX_FOLDER = "biblio-index"
+HEADER = struct.Struct("<8sQQII")
+KEY = struct.Struct("<IIII")
+ENTRY = struct.Struct("<II")
+
+
+class BiblioIndex:
+    __slots__ = [
+        "_data",
+        "_decodedKeys",
+        "_entriesStart",
+        "_index",
+        "_keysStart",
+        "blobStart",
+        "numEntries",
+        "numKeys",
+    ]
+
+    def __init__(self, index: mmap.mmap, data: mmap.mmap) -> None:
+        self._index = index
+        self._data = data
+        _, _, _, numKeys, numEntries = HEADER.unpack_from(index, 0)
+        self.numKeys: int = numKeys
+        self.numEntries: int = numEntries
+        self._keysStart = HEADER.size
+        self._entriesStart = self._keysStart + KEY.size * numKeys
+        self.blobStart = self._entriesStart + ENTRY.size * numEntries
+        # Keys whose entries have already been put into a storage,
+        # so asking again doesn't add duplicates.
+        self._decodedKeys: set[str] = set()
+
+    @staticmethod
+    def open(dataPath: str, indexPath: str) -> BiblioIndex | None:
+        """
+        Opens the index at indexPath,
+        if it exists and was compiled from the current version of dataPath.
+        Otherwise returns None, and the caller should fall back to reading the .data file.
+        """
+        maps = dataindex.openIndexAndData(dataPath, indexPath, HEADER, MAGIC)
+        if maps is None:
+            return None
+        return BiblioIndex(*maps)
+
+    def _key(self, i: int) -> tuple[bytes, int, int]:
+        start, end, entryStart, entryCount = KEY.unpack_from(self._index, self._keysStart + KEY.size * i)
+        return self._index[self.blobStart + start : self.blobStart + end], entryStart, entryCount
+
+    def _lowerBound(self, target: bytes) -> int:
+        # The position of the first key that's >= target.
+        return dataindex.lowerBound(self.numKeys, target, lambda i: self._key(i)[0])
+
+    def __contains__(self, key: str) -> bool:
+        target = key.encode("utf-8")
+        i = self._lowerBound(target)
+        return i < self.numKeys and self._key(i)[0] == target
+
+    def loadKey(self, key: str, storage: t.BiblioStorageT) -> None:
+        """
+        Decodes the entries for key into storage,
+        the same as loadBiblioDataFile() would have for the whole file.
+        """
+        if key in self._decodedKeys:
+            return
+        self._decodedKeys.add(key)
+        target = key.encode("utf-8")
+        i = self._lowerBound(target)
+        if i < self.numKeys:
+            keyBytes, entryStart, entryCount = self._key(i)
+            if keyBytes == target:
+                self._loadEntries(entryStart, entryCount, storage)
+
+    def loadPrefix(self, prefix: str, storage: t.BiblioStorageT) -> None:
+        # Decodes the entries for every key starting with prefix.
+        # Since the keys are sorted, they're all next to each other.
+        target = prefix.encode("utf-8")
+        for i in range(self._lowerBound(target), self.numKeys):
+            keyBytes, entryStart, entryCount = self._key(i)
+            if not keyBytes.startswith(target):
+                break
+            key = keyBytes.decode("utf-8")
+            if key in self._decodedKeys:
+                continue
+            self._decodedKeys.add(key)
+            self._loadEntries(entryStart, entryCount, storage)
+
+    def _loadEntries(self, entryStart: int, entryCount: int, storage: t.BiblioStorageT) -> None:
+        for j in range(entryStart, entryStart + entryCount):
+            offset, length = ENTRY.unpack_from(self._index, self._entriesStart + ENTRY.size * j)
+            # Read it the same way a text-mode file would be, newline translation and all.
+            text = self._data[offset : offset + length].decode("utf-8")
+            biblio.loadBiblioDataFile(iter(io.StringIO(text, newline=None)), storage)
+
+
+def indexForGroup(dataFile: retrieve.DataFileRequester, group: str) -> BiblioIndex | None:
+    # See anchorindex.indexForGroup().
+    requester = dataFile.findWithFallback("biblio", f"biblio-{group}.data")
+    if requester is None:
+        return None
+    return BiblioIndex.open(
+        requester.path("biblio", f"biblio-{group}.data"),
+        requester.path(INDEX_FOLDER, f"biblio-{group}.idx"),
+    )
@@ -6,9 +6,9 @@ import random
 import re
 from collections import defaultdict
 
-from .. import biblio, config, constants, h, retrieve, t
+from .. import biblio, config, constants, h, retrieve, t, timings
 from .. import messages as m
-from . import headingdata, source, utils, wrapper
+from . import biblioindex, headingdata, source, utils, wrapper
 from .utils import LinkFailure
 
 if t.TYPE_CHECKING:
@@ -20,6 +20,8 @@ if t.TYPE_CHECKING:
 class ReferenceManager:
     __slots__ = [
         "anchorBlockRefs",
+        "biblioIndexes",
+        "biblioKeyIndex",
         "biblioKeys",
         "biblioNumericSuffixes",
         "biblios",
@@ -32,6 +34,7 @@ class ReferenceManager:
         "loadedBiblioGroups",
         "localRefs",
         "preferredBiblioNames",
+        "refCache",
         "replacedSpecs",
         "shortname",
         "spec",
@@ -70,10 +73,15 @@ class ReferenceManager:
         # Sparsely populated, with more loaded on demand
         self.biblios: defaultdict[str, list[biblio.BiblioEntry]] = defaultdict(list)
         self.loadedBiblioGroups: set[str] = set()
+        # Dict of {group => key index}, for groups that are being read through an index
+        # rather than fully loaded into self.biblios.
+        self.biblioIndexes: dict[str, biblioindex.BiblioIndex] = {}
 
         # Most of the biblio keys, for biblio near-miss correction
         # (Excludes dated versions, and all huge "foo\d+" groups that can't usefully correct typos.)
         self.biblioKeys: set[str] = set()
+        # Built from biblioKeys the first time a near-miss is looked for.
+        self.biblioKeyIndex: biblio.KeyIndex | None = None
 
         # Dict of {suffixless key => [keys with numeric suffixes]}
         # (So you can tell when it's appropriate to default a numeric-suffix ref to a suffixless one.)
@@ -91,6 +99,9 @@ class ReferenceManager:
         else:
             self.defaultStatus = constants.refStatus[defaultStatus]
 
+        # Dict of {getRef() arguments => (result, messages it reported)}
+        self.refCache: dict[tuple[t.Any, ...], tuple[RefWrapper | str | None, m.RecordedMessages]] = {}
+
         self.localRefs: source.RefSource = source.RefSource("local", fileRequester=fileRequester)
         self.anchorBlockRefs: source.RefSource = source.RefSource("anchor-block", fileRequester=fileRequester)
         self.foreignRefs: source.RefSource = source.RefSource(
@@ -110,35 +121,37 @@ class ReferenceManager:
         This is oddly split up into sub-functions to make it easier to track performance.
         """
 
+        # The parsed data files might be shared with other builds (see DataFileRequester.fetchParsed()),
+        # so they're copied in rather than used directly.
+
         def initSpecs() -> None:
-            self.specs.update(json.loads(self.dataFile.fetch("specs.json", str=True)))
+            self.specs.update(self.dataFile.fetchParsed("specs.json", parse=json.loads))
 
-        initSpecs()
+        with timings.step("initializeRefs", "specs.json", doc):
+            initSpecs()
 
         def initMethods() -> None:
-            for arglessSig, argfulls in json.loads(self.dataFile.fetch("methods.json", str=True)).items():
-                variants = source.MethodVariants(arglessSig, {})
-                self.foreignRefs.methods[arglessSig] = variants
-                for argfullSig, data in argfulls.items():
-                    variants.variants[argfullSig] = source.MethodVariant(
-                        argfullSig,
-                        data["args"],
-                        data["for"],
-                        data["shortname"],
-                    )
+            self.foreignRefs.methods.update(self.dataFile.fetchParsed("methods.json", parse=source.parseMethods))
 
-        initMethods()
+        with timings.step("initializeRefs", "methods.json", doc):
+            initMethods()
 
         def initFors() -> None:
-            self.foreignRefs.fors.update(json.loads(self.dataFile.fetch("fors.json", str=True)))
+            self.foreignRefs.fors.update(self.dataFile.fetchParsed("fors.json", parse=json.loads))
 
-        initFors()
+        with timings.step("initializeRefs", "fors.json", doc):
+            initFors()
 
         def initLinkDefaults() -> None:
-            ldData = self.dataFile.fetch("link-defaults.infotree").read()
-            datablocks.transformInfo(ldData, None, doc=doc)
+            infos = self.dataFile.fetchParsed(
+                "link-defaults.infotree",
+                parse=datablocks.parseInfoTreeText,
+                args=(doc.md.indent if doc else 4, 1),
+            )
+            datablocks.processInfo(infos, doc, 1)
 
-        initLinkDefaults()
+        with timings.step("initializeRefs", "link-defaults.infotree", doc):
+            initLinkDefaults()
 
         if doc and doc.inputSource and doc.inputSource.hasDirectory():
             # Get local anchor data
@@ -152,14 +165,15 @@ class ReferenceManager:
                 # We should remove this after giving specs time to react to the warning:
                 shouldGetLocalAnchorData = True
             if shouldGetLocalAnchorData:
-                try:
-                    anchorFile = doc.inputSource.relative("anchors.bsdata")
-                    if not anchorFile:
-                        raise OSError
-                    anchorData = anchorFile.read().content
-                    datablocks.transformAnchors(anchorData, None, doc=doc)
-                except OSError:
-                    m.warn("anchors.bsdata not found despite being listed in the External Infotrees metadata.")
+                with timings.step("initializeRefs", "local anchors.bsdata", doc):
+                    try:
+                        anchorFile = doc.inputSource.relative("anchors.bsdata")
+                        if not anchorFile:
+                            raise OSError
+                        anchorData = anchorFile.read().content
+                        datablocks.transformAnchors(anchorData, None, doc=doc)
+                    except OSError:
+                        m.warn("anchors.bsdata not found despite being listed in the External Infotrees metadata.")
 
             # Get local link defaults
             shouldGetLocalLinkDefaults = doc.md.externalInfotrees["link-defaults.infotree"]
@@ -172,14 +186,17 @@ class ReferenceManager:
                 # We should remove this after giving specs time to react to the warning:
                 shouldGetLocalLinkDefaults = True
             if shouldGetLocalLinkDefaults:
-                try:
-                    ldFile = doc.inputSource.relative("link-defaults.infotree")
-                    if not ldFile:
-                        raise OSError
-                    ldData = ldFile.read().content
-                    datablocks.transformInfo(ldData, None, doc=doc)
-                except OSError:
-                    m.warn("link-defaults.infotree not found despite being listed in the External Infotrees metadata.")
+                with timings.step("initializeRefs", "local link-defaults.infotree", doc):
+                    try:
+                        ldFile = doc.inputSource.relative("link-defaults.infotree")
+                        if not ldFile:
+                            raise OSError
+                        ldData = ldFile.read().content
+                        datablocks.transformInfo(ldData, None, doc=doc)
+                    except OSError:
+                        m.warn(
+                            "link-defaults.infotree not found despite being listed in the External Infotrees metadata.",
+                        )
 
     def fetchHeadings(self, spec: str) -> headingdata.SpecHeadings:
         if spec in self.headings:
@@ -207,8 +224,8 @@ class ReferenceManager:
         return specHeadings.get(id, status, el)
 
     def initializeBiblio(self, doc: t.SpecT) -> None:
-        self.biblioKeys.update(json.loads(self.dataFile.fetch("biblio-keys.json", str=True)))
-        self.biblioNumericSuffixes.update(json.loads(self.dataFile.fetch("biblio-numeric-suffixes.json", str=True)))
+        self.biblioKeys.update(self.dataFile.fetchParsed("biblio-keys.json", parse=json.loads))
+        self.biblioNumericSuffixes.update(self.dataFile.fetchParsed("biblio-numeric-suffixes.json", parse=json.loads))
 
         # Get local bibliography data
         try:
@@ -265,10 +282,12 @@ class ReferenceManager:
         # TODO: This is dumb.
         for _, refs in self.foreignRefs.refs.items():
             for ref in refs:
-                if ref.status != "local" and ref.shortname.rstrip() == self.shortname:
-                    ref._ref["export"] = False  # pylint: disable=protected-access
+                if ref.status != "local" and ref.shortname == self.shortname:
+                    ref.export = False
 
     def addLocalDfns(self, doc: t.SpecT, dfns: t.Iterable[t.ElementT]) -> None:
+        # New local dfns can change what any link resolves to.
+        self.refCache.clear()
         for el in dfns:
             if h.hasClass(doc, el, "no-ref"):
                 continue
@@ -330,7 +349,7 @@ class ReferenceManager:
                 # convert back into a list now, for easier JSONing
                 dfnForList = sorted(dfnFor)
                 refKey, displayKey = config.adjustKey(linkText, linkType)
-                ref = wrapper.RefWrapper(
+                ref = wrapper.RefWrapper.fromData(
                     refKey,
                     displayKey,
                     {
@@ -383,6 +402,56 @@ class ReferenceManager:
         linkForHint: str | None = None,
         error: bool = True,
         el: t.ElementT | None = None,
+    ) -> RefWrapper | str | None:
+        # The same link (same text, type, for, etc) tends to show up many times in a spec,
+        # and processAutolinks() runs twice, so results are remembered
+        # until addLocalDfns() changes what's available to link to.
+        # (Anchor blocks and link defaults are all in place before linking starts.)
+        # Any messages the lookup reported are remembered too,
+        # and reported again for each link that reuses the result.
+        key = (
+            linkType,
+            text,
+            spec,
+            status,
+            statusHint,
+            tuple(linkFor) if isinstance(linkFor, list) else linkFor,
+            explicitFor,
+            linkForHint,
+            error,
+        )
+        if key in self.refCache:
+            ref, messages = self.refCache[key]
+            messages.replay(el=el)
+            return ref
+        with m.recordMessages(el=el) as messages:
+            ref = self._getRef(
+                linkType,
+                text,
+                spec=spec,
+                status=status,
+                statusHint=statusHint,
+                linkFor=linkFor,
+                explicitFor=explicitFor,
+                linkForHint=linkForHint,
+                error=error,
+                el=el,
+            )
+        self.refCache[key] = (ref, messages)
+        return ref
+
+    def _getRef(
+        self,
+        linkType: str,
+        text: str,
+        spec: str | None = None,
+        status: str | None = None,
+        statusHint: str | None = None,
+        linkFor: str | list[str] | None = None,
+        explicitFor: bool = False,
+        linkForHint: str | None = None,
+        error: bool = True,
+        el: t.ElementT | None = None,
     ) -> RefWrapper | str | None:
         # If error is False, this function just shuts up and returns a reference or None
         # Otherwise, it pops out debug messages for the user,
@@ -695,7 +764,7 @@ class ReferenceManager:
             # then [[foo-2]] is just an error.
             match = re.match(r"(.+)-\d+$", key)
             failFromWrongSuffix = False
-            if match and match.group(1) in self.biblios:
+            if match and self.bibliosFromKey(match.group(1)):
                 unversionedKey = match.group(1)
                 if unversionedKey in self.biblioNumericSuffixes:
                     # Nope, there are more numeric-suffixed versions,
@@ -773,15 +842,28 @@ class ReferenceManager:
         # and then actually fetch it.
         # If you don't call this,
         # the current data might not be reliable.
-        if key not in self.biblios:
-            # Try to load the group up, if necessary
-            group = key[0:2]
-            if group not in self.loadedBiblioGroups:
+        group = key[0:2]
+        if key not in self.biblios and group not in self.loadedBiblioGroups:
+            # Try to load the group up, if necessary.
+            # Prefer the index, which only decodes the keys that are asked for.
+            index = biblioindex.indexForGroup(self.dataFile, group)
+            if index is not None:
+                self.biblioIndexes[group] = index
+            else:
                 with self.dataFile.fetch("biblio", f"biblio-{group}.data", okayToFail=True) as fh:
                     biblio.loadBiblioDataFile(fh, self.biblios)
             self.loadedBiblioGroups.add(group)
+        if group in self.biblioIndexes:
+            # Act like the whole group was loaded, like it is without an index.
+            self.biblioIndexes[group].loadKey(key, self.biblios)
         return self.biblios.get(key, [])
 
+    def findCloseBiblios(self, text: str) -> list[str]:
+        # Keys only ever get added, so a count mismatch means the index is stale.
+        if self.biblioKeyIndex is None or len(self.biblioKeyIndex.keys) != len(self.biblioKeys):
+            self.biblioKeyIndex = biblio.KeyIndex(self.biblioKeys)
+        return biblio.findCloseBiblios(self.biblioKeys, text, index=self.biblioKeyIndex)
+
     def _bestCandidateBiblio(self, candidates: list[biblio.BiblioEntry]) -> biblio.BiblioEntry:
         return sorted(candidates, key=lambda x: x.order or 0)[0].strip()
 
@@ -792,6 +874,8 @@ class ReferenceManager:
         candidates = self.bibliosFromKey(key)
         if not candidates:
             return None
+        if key[0:2] in self.biblioIndexes:
+            self.biblioIndexes[key[0:2]].loadPrefix(key, self.biblios)
         latestDate = None
         latestRefs = None
         for k, biblios in self.biblios.items():
@@ -975,7 +1059,7 @@ def errorFromFailureCategory(
             m.linkerror(msg, el=el)
             return msg
     elif failure == LinkFailure.IgnoredSpecs:
-        msg = f"The only '{linkType}' refs for '{text}' were in ignored specs:\n{h.outerHTML(el)}"
+        msg = f"The only '{linkType}' refs for '{text}' were in ignored specs."
         m.linkerror(msg, el=el)
         return msg
     else:
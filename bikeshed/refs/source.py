@@ -2,12 +2,14 @@ from __future__ import annotations
 
 import copy
 import dataclasses
+import json
 import re
+import sys
 from collections import defaultdict
 
 from .. import config, constants, retrieve, t
 from .. import messages as m
-from . import utils, wrapper
+from . import anchorindex, utils, wrapper
 from .utils import LinkFailure
 
 LAZY_LOADED_SOURCES: list[str] = ["foreign"]
@@ -15,7 +17,10 @@ LAZY_LOADED_SOURCES: list[str] = ["foreign"]
 
 class RefSource:
     __slots__ = [
+        "_anchorIndexes",
+        "_forIndexes",
         "_loadedAnchorGroups",
+        "_textIndexes",
         "dataFile",
         "fors",
         "ignoredSpecs",
@@ -57,6 +62,13 @@ class RefSource:
         self.ignoredSpecs = set() if ignored is None else ignored
         self.replacedSpecs = set() if replaced is None else replaced
         self._loadedAnchorGroups: set[str] = set()
+        # Dict of {group => compiled index}, for groups that are being read from an index
+        # rather than fully loaded into self.refs.
+        self._anchorIndexes: dict[str, anchorindex.AnchorIndex] = {}
+        # Secondary indexes over the refs, built as queries need them (see textIndex() and forRefs()).
+        self._textIndexes: dict[str, TextIndex] = {}
+        # Dict of {for value => (number of terms it had, [refs for it])}
+        self._forIndexes: dict[str, tuple[int, list[t.RefWrapper]]] = {}
 
     def fetchRefs(self, key: str) -> list[t.RefWrapper]:
         """Safe, lazy-loading version of self.refs[key]"""
@@ -68,14 +80,25 @@ class RefSource:
             return []
 
         group = config.groupFromKey(key)
-        if group in self._loadedAnchorGroups:
-            # Group was loaded, but previous check didn't find it, so it's just not here.
-            return []
-        # Otherwise, load the group file.
-        with self.dataFile.fetch("anchors", f"anchors-{group}.data", okayToFail=True) as fh:
-            self.refs.update(decodeAnchors(fh))
-            self._loadedAnchorGroups.add(group)
-        return self.refs.get(key, [])
+        if group not in self._loadedAnchorGroups:
+            # Prefer the compiled index, which only decodes the refs that are asked for.
+            index = anchorindex.indexForGroup(self.dataFile, group)
+            if index is not None:
+                self._anchorIndexes[group] = index
+                self._loadedAnchorGroups.add(group)
+            else:
+                # Otherwise, load the whole group file.
+                with self.dataFile.fetch("anchors", f"anchors-{group}.data", okayToFail=True) as fh:
+                    self.refs.update(decodeAnchors(fh))
+                    self._loadedAnchorGroups.add(group)
+                return self.refs.get(key, [])
+        if group in self._anchorIndexes:
+            refs = self._anchorIndexes[group].get(key)
+            if refs:
+                self.refs[key] = refs
+            return refs
+        # Group was loaded, but previous check didn't find it, so it's just not here.
+        return []
 
     def fetchAllRefs(self) -> list[tuple[str, list[t.RefWrapper]]]:
         """Nuts to lazy-loading, just load everything at once."""
@@ -89,6 +112,17 @@ class RefSource:
                 m.warn(f"Ignoring a data file in the /anchors folder with a weird name: '{file}'")
                 continue
             group = match[1]
+            if group not in self._loadedAnchorGroups:
+                index = anchorindex.indexForGroup(self.dataFile, group)
+                if index is not None:
+                    self._anchorIndexes[group] = index
+                    self._loadedAnchorGroups.add(group)
+            if group in self._anchorIndexes:
+                # Materialize whatever hasn't been pulled out of the index yet.
+                for key, refs in self._anchorIndexes.pop(group).items():
+                    if key not in self.refs:
+                        self.refs[key] = refs
+                continue
             if group in self._loadedAnchorGroups:
                 # Already loaded
                 continue
@@ -188,8 +222,40 @@ class RefSource:
         if isinstance(targetFors, str):
             targetFors = [targetFors]
         for for_ in targetFors:
-            for x in self.fors[for_]:
-                yield from self.fetchRefs(x)
+            yield from self.forRefs(for_)
+
+    def textIndex(self, key: str) -> TextIndex | None:
+        """
+        Returns the index of the refs with the given linking text,
+        or None if there aren't any.
+        """
+        refs = self.fetchRefs(key)
+        if not refs:
+            return None
+        index = self._textIndexes.get(key)
+        # Refs only ever get appended to a text's list (by addLocalDfns() or anchor blocks),
+        # so if the list has grown since the index was built, it's stale.
+        if index is None or index.refs is not refs or index.size != len(refs):
+            index = TextIndex(refs)
+            self._textIndexes[key] = index
+        return index
+
+    def forRefs(self, for_: str) -> list[t.RefWrapper]:
+        # The refs that are for the given value.
+        # self.fors only lists the *terms* for a value,
+        # and a term can have refs for lots of other values too,
+        # so this does the filtering once rather than on every query.
+        terms = self.fors.get(for_)
+        if not terms:
+            return []
+        # Adding a ref for a value always adds its term to that value's list,
+        # so the list's length tells whether the cached refs are stale.
+        cached = self._forIndexes.get(for_)
+        if cached is not None and cached[0] == len(terms):
+            return cached[1]
+        refs = [ref for term in dict.fromkeys(terms) for ref in self.fetchRefs(term) if matchFor(ref.for_, for_)]
+        self._forIndexes[for_] = (len(terms), refs)
+        return refs
 
     def _queryRefs(
         self,
@@ -212,10 +278,13 @@ class RefSource:
         # Query the ref database.
         # If it fails to find a ref, also returns the stage at which it finally ran out of possibilities.
 
-        # Set up the initial list of refs to query
+        # Set up the initial list of refs to query.
+        # Text queries (the vast majority) go through the text indexes,
+        # so the type and spec filters are lookups rather than scans.
+        indexes: list[TextIndex] | None = None
         if text:
             if exact:
-                refs = list(self.textRefsIterator([text]))
+                textsToSearch = [text]
             else:
                 textsToSearch = list(utils.linkTextVariations(text, linkType))
 
@@ -227,7 +296,8 @@ class RefSource:
 
                 if (linkType is None or linkType in config.lowercaseTypes) and text.lower() != text:
                     textsToSearch += [t.lower() for t in textsToSearch]
-                refs = list(self.textRefsIterator(textsToSearch))
+            indexes = [index for index in map(self.textIndex, textsToSearch) if index is not None]
+            refs = [ref for index in indexes for ref in index.refs]
         elif linkFor:
             refs = list(self.forRefsIterator(linkFor))
         else:
@@ -245,7 +315,10 @@ class RefSource:
                 if error:
                     m.linkerror(f"Unknown link type '{linkType}'.", el=el)
                 return [], LinkFailure.Type, []
-            refs = [x for x in refs if x.type in linkTypes]
+            if indexes is not None:
+                refs = [ref for index in indexes for ref in index.ofTypes(linkTypes)]
+            else:
+                refs = [x for x in refs if x.type in linkTypes]
         if not refs:
             return [], LinkFailure.Type, oldRefs
 
@@ -257,7 +330,11 @@ class RefSource:
 
         oldRefs = refs
         if spec:
-            refs = [x for x in refs if spec in (x.spec, x.shortname)]
+            if indexes is not None:
+                specRefs = {id(ref) for index in indexes for ref in index.bySpec.get(spec, ())}
+                refs = [x for x in refs if id(x) in specRefs]
+            else:
+                refs = [x for x in refs if spec in (x.spec, x.shortname)]
         if not refs:
             return [], LinkFailure.Spec, oldRefs
 
@@ -353,6 +430,32 @@ class RefSource:
         variants[methodSig].for_.extend(forVals)
 
 
+class TextIndex:
+    # The refs for a single linking text, bucketed by the things queries filter on.
+    __slots__ = ["bySpec", "byType", "refs", "size"]
+
+    def __init__(self, refs: list[t.RefWrapper]) -> None:
+        self.refs = refs
+        self.size = len(refs)
+        # Dict of {dfn type => [positions in self.refs]}
+        self.byType: defaultdict[str, list[int]] = defaultdict(list)
+        # Dict of {spec or shortname => [refs]}
+        self.bySpec: defaultdict[str, list[t.RefWrapper]] = defaultdict(list)
+        for i, ref in enumerate(refs):
+            self.byType[ref.type].append(i)
+            self.bySpec[ref.spec].append(ref)
+            if ref.shortname != ref.spec:
+                self.bySpec[ref.shortname].append(ref)
+
+    def ofTypes(self, linkTypes: t.Container[str]) -> list[t.RefWrapper]:
+        # Keeps the refs in their original order,
+        # since that decides which one wins when several are equally good.
+        positions = [i for dfnType, typePositions in self.byType.items() if dfnType in linkTypes for i in typePositions]
+        if len(self.byType) > 1:
+            positions.sort()
+        return [self.refs[i] for i in positions]
+
+
 def filterByFor(refs: t.Sequence[t.RefWrapper], linkFor: str | list[str]) -> list[t.RefWrapper]:
     return [x for x in refs if matchFor(x.for_, linkFor)]
 
@@ -395,32 +498,62 @@ def filterByStatus(source: RefSource, refs: t.Sequence[t.RefWrapper], status: st
 
 def decodeAnchors(linesIter: t.Iterator[str]) -> defaultdict[str, list[t.RefWrapper]]:
     # Decodes the anchor storage format into {key: [{anchor-data}]}
+    # The fields are normalized (see RefWrapper) as they're read.
     anchors = defaultdict(list)
+    intern = sys.intern
     try:
         while True:
             aText = next(linesIter)[:-1]
             displayText = next(linesIter)[:-1]
-            data: wrapper.RefDataT = {
-                "type": next(linesIter),
-                "spec": next(linesIter),
-                "shortname": next(linesIter),
-                "level": next(linesIter),
-                "status": next(linesIter),
-                "url": next(linesIter),
-                "export": next(linesIter) != "\n",
-                "normative": next(linesIter) != "\n",
-                "for_": [],
-            }
+            refType = intern(next(linesIter).strip())
+            spec = intern(next(linesIter).strip())
+            shortname = intern(next(linesIter).strip())
+            level = intern(next(linesIter).strip())
+            status = intern(next(linesIter).strip())
+            url = next(linesIter).strip()
+            export = next(linesIter) != "\n"
+            normative = next(linesIter) != "\n"
+            for_ = []
             while True:
                 line = next(linesIter)
                 if line == "-\n":
                     break
-                data["for_"].append(line)
-            anchors[aText].append(wrapper.RefWrapper(aText, displayText, data))
+                for_.append(intern(line.strip()))
+            anchors[aText].append(
+                wrapper.RefWrapper(
+                    aText,
+                    displayText,
+                    refType,
+                    spec,
+                    shortname,
+                    level,
+                    status,
+                    url,
+                    export,
+                    normative,
+                    for_,
+                ),
+            )
     except StopIteration:
         return anchors
 
 
+def parseMethods(text: str) -> dict[str, MethodVariants]:
+    # Decodes methods.json into {argless signature => variants}
+    methods = {}
+    for arglessSig, argfulls in json.loads(text).items():
+        variants = MethodVariants(arglessSig, {})
+        methods[arglessSig] = variants
+        for argfullSig, data in argfulls.items():
+            variants.variants[argfullSig] = MethodVariant(
+                argfullSig,
+                data["args"],
+                data["for"],
+                data["shortname"],
+            )
+    return methods
+
+
 def getArgfulMethodVariants(maybeMethodSig: str, refs: RefSource) -> list[str]:
     if maybeMethodSig.endswith("()") and maybeMethodSig in refs.methods:
         return list(refs.methods[maybeMethodSig].variants.keys())
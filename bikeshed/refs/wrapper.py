@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-import dataclasses
+import sys
 
 from .. import t
 
@@ -19,80 +19,131 @@ class RefDataT(t.TypedDict, total=False):
     el: t.ElementT | None
 
 
-@dataclasses.dataclass
 class RefWrapper:
     # Refs don't contain their own name, so I don't have to copy as much when there are multiple linkTexts
     # This wraps that, producing an object that looks like it has a text property.
-    # It also makes all the ref dict keys look like object attributes.
+    #
+    # Foreign refs get loaded by the hundreds of thousands,
+    # and their fields are read over and over by the filters in every link resolution,
+    # so the data is normalized once, when the ref is created:
+    # the data files' trailing newlines are stripped, missing values become "",
+    # and the handful of values that repeat across nearly every ref
+    # (types, specs, shortnames, levels, statuses, and for-values)
+    # are interned, so each ref shares the same string objects.
+
+    __slots__ = [
+        "displayText",
+        "el",
+        "export",
+        "for_",
+        "level",
+        "normative",
+        "shortname",
+        "spec",
+        "status",
+        "text",
+        "type",
+        "uniquifier",
+        "url",
+    ]
 
     text: str
     displayText: str
-    _ref: RefDataT
-
-    @property
-    def type(self) -> str:
-        return self._ref["type"].strip()
-
-    @property
-    def spec(self) -> str:
-        if self._ref["spec"] is None:
-            return ""
-        return self._ref["spec"].strip()
-
-    @property
-    def shortname(self) -> str:
-        if self._ref["shortname"] is None:
-            return ""
-        return self._ref["shortname"].strip()
-
-    @property
-    def level(self) -> str:
-        if self._ref["level"] is None:
-            return ""
-        return self._ref["level"].strip()
-
-    @property
-    def status(self) -> str:
-        if self._ref["status"] is None:
-            return ""
-        return self._ref["status"].strip()
-
-    @property
-    def url(self) -> str:
-        if self._ref["url"] is None:
-            return ""
-        return self._ref["url"].strip()
-
-    @property
-    def export(self) -> bool:
-        return self._ref["export"]
-
-    @property
-    def normative(self) -> bool:
-        return self._ref["normative"]
-
-    @property
-    def for_(self) -> list[str]:
-        return [x.strip() for x in self._ref["for_"]]
-
-    @property
-    def el(self) -> t.ElementT | None:
-        return self._ref.get("el", None)
-
-    @property
-    def uniquifier(self) -> str | None:
-        return self._ref.get("uniquifier", None)
+    type: str
+    spec: str
+    shortname: str
+    level: str
+    status: str
+    url: str
+    export: bool
+    normative: bool
+    for_: list[str]
+    el: t.ElementT | None
+    uniquifier: str | None
+
+    def __init__(
+        self,
+        text: str,
+        displayText: str,
+        type: str,
+        spec: str,
+        shortname: str,
+        level: str,
+        status: str,
+        url: str,
+        export: bool,
+        normative: bool,
+        for_: list[str],
+        el: t.ElementT | None = None,
+        uniquifier: str | None = None,
+    ) -> None:
+        # Takes already-normalized values;
+        # use fromData() to normalize a ref's data first.
+        self.text = text
+        self.displayText = displayText
+        self.type = type
+        self.spec = spec
+        self.shortname = shortname
+        self.level = level
+        self.status = status
+        self.url = url
+        self.export = export
+        self.normative = normative
+        self.for_ = for_
+        self.el = el
+        self.uniquifier = uniquifier
+
+    @staticmethod
+    def fromData(text: str, displayText: str, data: RefDataT) -> RefWrapper:
+        return RefWrapper(
+            text,
+            displayText,
+            sys.intern(data["type"].strip()),
+            normalizeField(data["spec"]),
+            normalizeField(data["shortname"]),
+            normalizeField(data["level"]),
+            normalizeField(data["status"]),
+            "" if data["url"] is None else data["url"].strip(),
+            data["export"],
+            data["normative"],
+            [sys.intern(x.strip()) for x in data["for_"]],
+            el=data.get("el", None),
+            uniquifier=data.get("uniquifier", None),
+        )
 
     def refKey(self) -> str:
         return self.uniquifier or self.url
 
+    def _data(self) -> tuple[t.Any, ...]:
+        # The text isn't part of a ref's identity:
+        # the same anchor reached thru different linking texts is the same ref,
+        # which is what lets ref-hints share one entry per URL.
+        return (
+            self.type,
+            self.spec,
+            self.shortname,
+            self.level,
+            self.status,
+            self.url,
+            self.export,
+            self.normative,
+            self.for_,
+            self.el,
+            self.uniquifier,
+        )
+
     def __eq__(self, other: t.Any) -> bool:
         if not isinstance(other, RefWrapper):
             return NotImplemented
-        return self._ref == other._ref
+        return self._data() == other._data()
 
     def __hash__(self) -> int:
-        return hash(frozenset(self._ref))
+        # Only hashes fields that never change after creation
+        # (export does get cleared on the spec's own refs), so equal refs always hash the same.
+        return hash((self.type, self.url))
+
+    def __repr__(self) -> str:
+        return f"RefWrapper(text={self.text!r}, displayText={self.displayText!r}, type={self.type!r}, spec={self.spec!r}, url={self.url!r}, for_={self.for_!r})"
 
     def __json__(self) -> dict[str, bool | str | list[str]]:
         return {
@@ -106,5 +157,11 @@ class RefWrapper:
             "url": self.url,
             "export": self.export,
             "normative": self.normative,
-            "for_": self.for_,
+            "for_": list(self.for_),
         }
+
+
+def normalizeField(val: str | None) -> str:
+    if val is None:
+        return ""
+    return sys.intern(val.strip())
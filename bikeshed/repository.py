@@ -34,8 +34,10 @@ class GithubRepository(Repository):
         self.repo = repo
         if ns == "com":
             self.api = "https://api.github.com"
+            self.graphqlApi = "https://api.github.com/graphql"
         else:
             self.api = f"https://github.{ns}/api/v3"
+            self.graphqlApi = f"https://github.{ns}/api/graphql"
 
     def formatIssueUrl(self, id: str | None = None) -> str:
         if id is None:
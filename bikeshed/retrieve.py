@@ -11,18 +11,36 @@ from . import messages as m
 if t.TYPE_CHECKING:
     from .doctypes import Group, Org, Status
 
+ParsedT = t.TypeVar("ParsedT")
+
 
 class DataFileRequester:
-    def __init__(self, fileType: str | None = None, fallback: DataFileRequester | None = None) -> None:
+    def __init__(
+        self,
+        fileType: str | None = None,
+        fallback: DataFileRequester | None = None,
+        root: str | None = None,
+    ) -> None:
         if fileType not in ("readonly", "latest"):
             msg = f"Bad value for DataFileRequester.type, got '{fileType}'."
             raise Exception(msg)
         self.fileType: str = fileType
         # fallback is another requester, used if the main one fails.
         self.fallback = fallback
+        # root, if given, is a folder to read the data files from
+        # instead of Bikeshed's own spec-data (like tests that bring their own data);
+        # any file it doesn't have comes from the fallback.
+        self.root = root
+        # Parsed data files, kept between builds by long-running processes (see daemon.py).
+        # When None, fetchParsed() re-reads and re-parses the file every time.
+        self.cache: DataCache | None = None
 
     def path(self, *segs: str, fileType: str | None = None) -> str:
-        return self._buildPath(segs=segs, fileType=fileType or self.fileType)
+        location = self._buildPath(segs=segs, fileType=fileType or self.fileType)
+        if self.root is not None and self.fallback and not os.path.exists(location):
+            # A root only holds the files it overrides.
+            return self.fallback.path(*segs)
+        return location
 
     @t.overload
     def fetch(self, *segs: str, str: t.Literal[True], okayToFail: bool = False, fileType: str | None = None) -> str: ...
@@ -67,11 +85,44 @@ class DataFileRequester:
                         return self._fail(location, str=False, okayToFail=okayToFail)
             return self._fail(location, str, okayToFail)
 
+    def fetchParsed(
+        self,
+        *segs: str,
+        parse: t.Callable[..., ParsedT],
+        args: tuple[t.Any, ...] = (),
+    ) -> ParsedT:
+        """
+        Returns parse(fileContents, *args),
+        reusing an earlier result if this requester has a cache.
+        Cached results are shared between builds,
+        so callers must copy them rather than mutating them.
+        """
+        if self.cache is None:
+            return parse(self.fetch(*segs, str=True), *args)
+        key = (segs, parse, args)
+        if key not in self.cache.entries:
+            self.cache.entries[key] = parse(self.fetch(*segs, str=True), *args)
+        return t.cast("ParsedT", self.cache.entries[key])
+
+    def findWithFallback(self, *segs: str) -> DataFileRequester | None:
+        """
+        Returns the requester that fetch() would read the file from
+        (this one, or one of its fallbacks),
+        or None if none of them have it.
+        """
+        if os.path.exists(self._buildPath(segs=segs)):
+            return self
+        if self.fallback:
+            return self.fallback.findWithFallback(*segs)
+        return None
+
     def walkFiles(self, *segs: str, fileType: str | None = None) -> t.Generator[str, None, None]:
-        for _, _, files in os.walk(self._buildPath(segs, fileType=fileType or self.fileType)):
+        for _, _, files in os.walk(self.path(*segs, fileType=fileType)):
             yield from files
 
     def _buildPath(self, segs: t.Sequence[str], fileType: str | None = None) -> str:
+        if self.root is not None:
+            return os.path.join(self.root, *segs)
         if fileType is None:
             fileType = self.fileType
         if fileType == "readonly":
@@ -98,6 +149,40 @@ class DataFileRequester:
         raise OSError(msg)
 
 
+class DataCache:
+    """
+    Holds parsed data files for DataFileRequester.fetchParsed().
+    Everything is dropped whenever the data files' manifest changes,
+    so a long-running process picks up a `bikeshed update`.
+    """
+
+    def __init__(self) -> None:
+        self.entries: dict[t.Any, t.Any] = {}
+        self.manifestStamp: list[tuple[int, int] | None] | None = None
+
+    def refresh(self, requester: DataFileRequester) -> bool:
+        # Returns whether the cache was invalidated.
+        stamp = manifestStamp(requester)
+        if stamp == self.manifestStamp:
+            return False
+        self.entries.clear()
+        self.manifestStamp = stamp
+        return True
+
+
+def manifestStamp(requester: DataFileRequester) -> list[tuple[int, int] | None]:
+    stamp: list[tuple[int, int] | None] = []
+    r: DataFileRequester | None = requester
+    while r is not None:
+        try:
+            stat = os.stat(r.path("manifest.txt"))
+            stamp.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            stamp.append(None)
+        r = r.fallback
+    return stamp
+
+
 defaultRequester = DataFileRequester(fileType="latest", fallback=DataFileRequester(fileType="readonly"))
 
 
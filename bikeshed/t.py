@@ -19,9 +19,11 @@ if TYPE_CHECKING:
         Any,
         AnyStr,
         Awaitable,
+        BinaryIO,
         Callable,
         Collection,
         Container,
+        ContextManager,
         DefaultDict,
         Deque,
         FrozenSet,
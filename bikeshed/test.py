@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import concurrent.futures
 import dataclasses
 import difflib
 import io
@@ -90,9 +91,19 @@ def sortTests(tests: t.Iterable[str]) -> t.Iterable[str]:
     return sorted(tests, key=lambda x: ("/" in testNameForPath(x), x))
 
 
+@dataclasses.dataclass
+class TestResult:
+    name: str
+    passed: bool
+    # Anything to print about the test (like the diffs of a failure),
+    # already formatted.
+    output: str = ""
+
+
 def run(
     filters: TestFilter,
     md: t.MetadataManager | None = None,
+    jobs: int = 1,
 ) -> bool:
     paths = testPaths(filters)
     if len(paths) == 0:
@@ -101,67 +112,116 @@ def run(
     numPassed = 0
     total = 0
     fails = []
-    pathProgress = alive_it(paths, dual_line=True, length=20)
+    results = runEach(runTest, paths, md, jobs)
+    # alive_it() is typed as only taking sized collections, but it's fine with an iterator plus a total.
+    pathProgress: t.Iterable[TestResult] = alive_it(results, total=len(paths), dual_line=True, length=20)  # type: ignore[arg-type]
     try:
-        for path in pathProgress:
-            testName = testNameForPath(path)
-            pathProgress.text(testName)  # type: ignore
+        for result in pathProgress:
+            pathProgress.text(result.name)  # type: ignore
             total += 1
-            consoleFh = io.StringIO()
-            with m.withMessageState(fh=consoleFh, printMode="plain") as _:
-                doc = processTest(path, md)
-                testConsole = consoleFh.getvalue()
-            testOutput = doc.serialize()
-            if testOutput is None:
-                m.p(m.printColor("Serialization failed.", color="red"))
-                fails.append(testName)
-                continue
-            with open(replaceExtension(path, ".html"), "r", encoding="utf-8") as golden:
-                goldenOutput = golden.read()
-            with open(replaceExtension(path, ".console.txt"), "r", encoding="utf-8") as golden:
-                goldenConsole = golden.read()
-            if compare(testOutput, goldenOutput, path=path) and compare(testConsole, goldenConsole, path=path):
+            if result.output:
+                m.state.fh.write(result.output)
+            if result.passed:
                 numPassed += 1
             else:
-                fails.append(testName)
+                fails.append(result.name)
     except UnicodeEncodeError:
         # On Windows, the alive_it() library throws this error
         # *sometimes*. Can't figure out wth is going on.
         pass
-    except Exception as e:
-        print(f"Python threw an error when running '{testName}':\n{e}")  # noqa: T201
-        raise e
     if numPassed == total:
         m.p(m.printColor("✔ All tests passed.", color="green"))
         return True
     m.p(m.printColor(f"✘ {numPassed}/{total} tests passed.", color="red"))
     m.p(m.printColor("Failed Tests:", color="red"))
-    for fail in fails:
+    # Parallel runs finish out of order.
+    testOrder = {testNameForPath(path): i for i, path in enumerate(paths)}
+    for fail in sorted(fails, key=testOrder.__getitem__):
         m.p("* " + fail)
     return False
 
 
+def runTest(path: str, md: t.MetadataManager | None = None) -> TestResult:
+    testName = testNameForPath(path)
+    try:
+        consoleFh = io.StringIO()
+        with m.withMessageState(fh=consoleFh, printMode="plain") as _:
+            doc = processTest(path, md)
+            testConsole = consoleFh.getvalue()
+        testOutput = doc.serialize()
+        outputFh = io.StringIO()
+        with m.withMessageState(fh=outputFh) as _:
+            if testOutput is None:
+                m.p(m.printColor("Serialization failed.", color="red"))
+                passed = False
+            else:
+                with open(replaceExtension(path, ".html"), "r", encoding="utf-8") as golden:
+                    goldenOutput = golden.read()
+                with open(replaceExtension(path, ".console.txt"), "r", encoding="utf-8") as golden:
+                    goldenConsole = golden.read()
+                passed = compare(testOutput, goldenOutput, path=path) and compare(
+                    testConsole,
+                    goldenConsole,
+                    path=path,
+                )
+        return TestResult(testName, passed, outputFh.getvalue())
+    except Exception as e:
+        print(f"Python threw an error when running '{testName}':\n{e}")  # noqa: T201
+        raise e
+
+
 def rebase(
     filters: TestFilter,
     md: t.MetadataManager | None = None,
+    jobs: int = 1,
 ) -> bool:
     paths = testPaths(filters)
     if len(paths) == 0:
         m.p("No tests were found.")
         return True
-    pathProgress = alive_it(paths, dual_line=True, length=20)
+    results = runEach(rebaseTest, paths, md, jobs)
+    # alive_it() is typed as only taking sized collections, but it's fine with an iterator plus a total.
+    pathProgress: t.Iterable[TestResult] = alive_it(results, total=len(paths), dual_line=True, length=20)  # type: ignore[arg-type]
+    for result in pathProgress:
+        pathProgress.text(result.name)  # type: ignore
+    return True
+
+
+def rebaseTest(path: str, md: t.MetadataManager | None = None) -> TestResult:
+    testName = testNameForPath(path)
     try:
-        for path in pathProgress:
-            testName = testNameForPath(path)
-            pathProgress.text(testName)  # type: ignore
-            with m.withMessageState(fh=replaceExtension(path, ".console.txt"), printMode="plain") as _:
-                doc = processTest(path, md)
-            with m.messagesSilent() as _:
-                doc.finish(newline="\n")
+        with m.withMessageState(fh=replaceExtension(path, ".console.txt"), printMode="plain") as _:
+            doc = processTest(path, md)
+        with m.messagesSilent() as _:
+            doc.finish(newline="\n")
     except Exception as e:
         print(f"Python threw an error when running '{testName}':\n{e}")  # noqa: T201
         raise e
-    return True
+    return TestResult(testName, True)
+
+
+def runEach(
+    func: t.Callable[[str, t.MetadataManager | None], TestResult],
+    paths: list[str],
+    md: t.MetadataManager | None,
+    jobs: int,
+) -> t.Generator[TestResult, None, None]:
+    # Runs func over every test path,
+    # sharded across a pool of worker processes if jobs > 1.
+    # Parallel results are yielded as they finish, rather than in path order.
+    if jobs <= 1:
+        for path in paths:
+            yield func(path, md)
+        return
+    from . import batch  # noqa: PLC0415
+
+    executor = batch.processPool(min(jobs, len(paths)))
+    try:
+        futures = [executor.submit(func, path, md) for path in paths]
+        for future in concurrent.futures.as_completed(futures):
+            yield future.result()
+    finally:
+        executor.shutdown(cancel_futures=True)
 
 
 def processTest(
@@ -169,6 +229,12 @@ def processTest(
     md: metadata.MetadataManager | None = None,
     fileRequester: t.DataFileRequester = retrieve.DataFileRequester(fileType="readonly"),
 ) -> t.SpecT:
+    # Tests can supply their own data files (like a small wpt-tests.txt)
+    # in a spec-data folder next to them;
+    # anything not there comes from the usual readonly data.
+    testDataFolder = os.path.join(os.path.dirname(path), "spec-data")
+    if os.path.isdir(testDataFolder):
+        fileRequester = retrieve.DataFileRequester(fileType="readonly", fallback=fileRequester, root=testDataFolder)
     try:
         doc = None
         doc = Spec(inputFilename=path, fileRequester=fileRequester, testing=True)
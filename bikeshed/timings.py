@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import contextlib
+import dataclasses
+import json
+import threading
+import time
+import tracemalloc
+
+from lxml import etree
+
+from . import t
+
+# Lightweight instrumentation of the build,
+# turned on by `bikeshed spec --timings`.
+#
+# Each step of Spec.assembleDocument() and Spec.processDocument(),
+# and each of the data loads in ReferenceManager.initializeRefs(),
+# is wrapped in a step(), which records how long it took (wall and CPU time),
+# how much memory it allocated (net, via tracemalloc),
+# and (optionally, since it walks the whole document every time)
+# how many elements the document had when it finished.
+# When nothing's being recorded, step() does nothing,
+# so the wrapping costs next to nothing in normal builds.
+#
+# A few caveats when reading the numbers:
+# * Tracing allocations slows Python down considerably,
+#   so wall times are inflated relative to a normal build
+#   (but consistently so, which is what matters for spotting regressions).
+# * CPU time is per-thread, so it's accurate even for phases run concurrently,
+#   but allocation deltas are process-wide, so concurrent phases muddle each other's.
+#   Use --serial if that matters.
+# * Steps nest (the initializeRefs loads happen during assembleDocument's initializeRefs step),
+#   so summing every step double-counts.
+#   The report's "total" is the real total.
+
+
+@dataclasses.dataclass
+class StepTiming:
+    section: str
+    name: str
+    # Seconds
+    wall: float = 0
+    cpu: float = 0
+    # Bytes, or None if allocations weren't being traced
+    allocated: int | None = None
+    # Number of elements in the document after the step,
+    # or None if they weren't being counted or there wasn't a document yet
+    elements: int | None = None
+
+
+class Timings:
+    def __init__(self, trackMemory: bool = True, trackElements: bool = False) -> None:
+        self.trackMemory = trackMemory
+        self.trackElements = trackElements
+        self.steps: list[StepTiming] = []
+        self.wall: float = 0
+        self.cpu: float = 0
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def step(self, section: str, name: str, doc: t.SpecT | None = None) -> t.Generator[StepTiming, None, None]:
+        timing = StepTiming(section, name)
+        # Added up front, so steps stay in the order they started
+        # even when some run concurrently.
+        with self.lock:
+            self.steps.append(timing)
+        tracing = self.trackMemory and tracemalloc.is_tracing()
+        startMemory = tracemalloc.get_traced_memory()[0] if tracing else 0
+        startWall = time.perf_counter()
+        startCpu = time.thread_time()
+        try:
+            yield timing
+        finally:
+            timing.wall = time.perf_counter() - startWall
+            timing.cpu = time.thread_time() - startCpu
+            if tracing:
+                timing.allocated = tracemalloc.get_traced_memory()[0] - startMemory
+            if self.trackElements and doc is not None:
+                timing.elements = countElements(doc)
+
+    def toJson(self) -> dict[str, t.Any]:
+        return {
+            "total": {"wall": self.wall, "cpu": self.cpu},
+            "steps": [dataclasses.asdict(timing) for timing in self.steps],
+        }
+
+    def formatJson(self) -> str:
+        return json.dumps(self.toJson(), indent=2)
+
+    def formatText(self) -> str:
+        lines = [f"{'wall ms':>10} {'cpu ms':>10} {'alloc KiB':>10} {'elements':>9}  step"]
+        for timing in self.steps:
+            allocated = "" if timing.allocated is None else str(round(timing.allocated / 1024))
+            elements = "" if timing.elements is None else str(timing.elements)
+            lines.append(
+                f"{timing.wall * 1000:10.1f} {timing.cpu * 1000:10.1f} {allocated:>10} {elements:>9}  {timing.section}/{timing.name}",
+            )
+        lines.append(f"{self.wall * 1000:10.1f} {self.cpu * 1000:10.1f} {'':>10} {'':>9}  total")
+        return "\n".join(lines)
+
+
+def countElements(doc: t.SpecT) -> int | None:
+    document = getattr(doc, "document", None)
+    if document is None:
+        return None
+    return sum(1 for _ in document.iter(etree.Element))
+
+
+active: Timings | None = None
+
+
+@contextlib.contextmanager
+def recording(timings: Timings | None = None) -> t.Generator[Timings, None, None]:
+    """
+    Records every step() run inside the block into timings
+    (or a fresh Timings, if not given).
+    """
+    global active  # noqa: PLW0603
+    if timings is None:
+        timings = Timings()
+    oldActive = active
+    active = timings
+    startedTracing = timings.trackMemory and not tracemalloc.is_tracing()
+    if startedTracing:
+        tracemalloc.start()
+    startWall = time.perf_counter()
+    startCpu = time.process_time()
+    try:
+        yield timings
+    finally:
+        timings.wall = time.perf_counter() - startWall
+        timings.cpu = time.process_time() - startCpu
+        if startedTracing:
+            tracemalloc.stop()
+        active = oldActive
+
+
+def step(section: str, name: str, doc: t.SpecT | None = None) -> t.ContextManager[t.Any]:
+    """
+    Records the time, allocations, and element count of the block,
+    if timings are being recorded; otherwise does nothing.
+    """
+    if active is None:
+        return contextlib.nullcontext()
+    return active.step(section, name, doc)
@@ -3,13 +3,10 @@ from __future__ import annotations
 import json
 import logging
 import re
-from collections import Counter, defaultdict, namedtuple
+from collections import Counter, defaultdict
 from urllib import parse
 
-import requests
-from PIL import Image
-
-from . import biblio, cddl, config, dfnpanels, h, idl, printjson, repository, t
+from . import biblio, cddl, config, dfnpanels, githubIssues, h, idl, imagesize, repository, t
 from . import messages as m
 from .translate import _t
 
@@ -648,7 +645,7 @@ def processBiblioLinks(doc: t.SpecT) -> None:
         )
         if not ref:
             if not okayToFail:
-                closeBiblios = biblio.findCloseBiblios(list(doc.refs.biblioKeys), linkText)
+                closeBiblios = doc.refs.findCloseBiblios(linkText)
                 m.die(
                     f"Couldn't find '{linkText}' in bibliography data. Did you mean:\n"
                     + "\n".join("  " + b for b in sorted(closeBiblios)),
@@ -1238,6 +1235,9 @@ def cleanupHTML(doc: t.SpecT) -> None:
 
 def finalHackyCleanup(text: str) -> str:
     # For hacky last-minute string-based cleanups of the rendered html.
+    # Note: this is run on each chunk the serializer streams out (see Spec.serializeTo()),
+    # not on the whole document at once,
+    # so any cleanup added here must not need to match across chunk boundaries.
 
     return text
 
@@ -1352,97 +1352,33 @@ def inlineRemoteIssues(doc: t.SpecT) -> None:
 
     # Collect all the inline issues in the document
     inlineIssues = []
-    GitHubIssue = namedtuple("GitHubIssue", ["user", "repo", "num", "el"])
     for el in h.findAll("[data-inline-github]", doc):
         user, repo, num = el.get("data-inline-github", "").split()
-        inlineIssues.append(GitHubIssue(user, repo, num, el=el))
+        inlineIssues.append((githubIssues.IssueKey(user, repo, num), el))
         h.removeAttr(el, "data-inline-github")
     if not inlineIssues:
         return
 
     logging.captureWarnings(True)
 
-    responses = json.loads(doc.dataFile.fetch("github-issues.json", str=True))
-    for i, issue in enumerate(inlineIssues):
-        issueUserRepo = "{}/{}".format(*issue)
-        key = f"{issueUserRepo}/{issue.num}"
-        href = "https://github.{}/{}/issues/{}".format(doc.md.repository.ns, issueUserRepo, issue.num)
-        url = "{}/repos/{}/issues/{}".format(doc.md.repository.api, issueUserRepo, issue.num)
-        m.say("Fetching issue {:-3d}/{:d}: {:s}".format(i + 1, len(inlineIssues), key))
-
-        # Fetch the issues
-        headers = {"Accept": "application/vnd.github.v3.html+json"}
-        if doc.token is not None:
-            headers["Authorization"] = "token " + doc.token
-        if key in responses:
-            # Have a cached response, see if it changed
-            headers["If-None-Match"] = responses[key]["ETag"]
-
-        res = None
-        try:
-            res = requests.get(url, headers=headers, timeout=5)
-        except requests.exceptions.ConnectionError:
-            # Offline or something, recover if possible
-            if key in responses:
-                data = responses[key]
-            else:
-                m.warn(f"Connection error fetching issue #{issue.num}")
-                continue
-        except requests.exceptions.ReadTimeout:
-            # Took too long
-            if key in responses:
-                data = responses[key]
-            else:
-                m.warn(f"Timeout while fetching issue #{issue.num}")
-                continue
-        except Exception as e:
-            # Something else
-            if key in responses:
-                data = responses[key]
-            else:
-                m.warn(f"Error while fetching issue #{issue.num}:\n{e}")
-                continue
-
-        if res is None:
-            # Already handled in the except block
-            pass
-        elif res.status_code == 304:
-            # Unchanged, I can use the cache
-            data = responses[key]
-        elif res.status_code == 200:
-            # Fresh data, prep it for storage
-            data = res.json()
-            data["ETag"] = res.headers["ETag"]
-        elif res.status_code == 401:
-            error = res.json()
-            if error["message"] == "Bad credentials":
-                m.die(f"'{doc.token}' is not a valid GitHub OAuth token. See https://github.com/settings/tokens")
-            else:
-                m.die(
-                    "401 error when fetching GitHub Issues:\n" + printjson.printjson(error),
-                )
-            continue
-        elif res.status_code == 403:
-            error = res.json()
-            if error["message"].startswith("API rate limit exceeded"):
-                m.die(
-                    "GitHub Issues API rate limit exceeded. Get an OAuth token from https://github.com/settings/tokens to increase your limit, or just wait an hour for your limit to refresh; Bikeshed has cached all the issues so far and will resume from where it left off.",
-                )
-            else:
-                m.die(
-                    "403 error when fetching GitHub Issues:\n" + printjson.printjson(error),
-                )
-            continue
-        elif res.status_code >= 400:
-            try:
-                error = printjson.printjson(res.json())
-            except ValueError:
-                error = "First 100 characters of error:\n" + res.text[0:100]
-            m.die(f"{res.status_code} error when fetching GitHub Issues:\n" + error)
+    # The snapshot of issues shipped with Bikeshed,
+    # used for any issue that isn't in the user's cache.
+    seed = json.loads(doc.dataFile.fetch("github-issues.json", str=True))
+    storePath = config.docCachePath(doc, "github-issues.jsonl")
+    store = None if storePath is None else githubIssues.IssueStore(storePath)
+    responses = githubIssues.fetchIssues(
+        [key for key, _ in inlineIssues],
+        doc.md.repository,
+        doc.token,
+        seed,
+        store,
+    )
+    for issue, el in inlineIssues:
+        key = str(issue)
+        if key not in responses:
             continue
-        responses[key] = data
+        href = f"https://github.{doc.md.repository.ns}/{issue.user}/{issue.repo}/issues/{issue.num}"
         # Put the issue data into the DOM
-        el = issue.el
         data = responses[key]
         h.clearContents(el)
         if doc.md.inlineGithubIssues == "title":
@@ -1467,12 +1403,6 @@ def inlineRemoteIssues(doc: t.SpecT) -> None:
             h.addClass(doc, el, "no-marker")
         if el.tag == "p":
             el.tag = "div"
-    # Save the cache for later
-    try:
-        with open(config.scriptPath("spec-data", "github-issues.json"), "w", encoding="utf-8") as f:
-            f.write(json.dumps(responses, ensure_ascii=False, indent=2, sort_keys=True))
-    except Exception as e:
-        m.warn(f"Couldn't save GitHub Issues cache to disk.\n{e}")
     return
 
 
@@ -1531,37 +1461,34 @@ def addImageSize(doc: t.SpecT) -> None:
     if doc.md.imgAutoSize is False:
         return
     imgElements = h.findAll("img", doc)
+    # Size all the local images up front, so they can be read in parallel.
+    sizes = imagesize.imageSizes(
+        [path for el in imgElements if (path := autosizedImagePath(doc, el)) is not None],
+        cachePath=config.docCachePath(doc, "image-sizes.json"),
+    )
     for el in imgElements:
-        if el.get("width") or el.get("height"):
-            continue
-        if el.get("no-autosize") is not None:
+        source = imageSizeSource(el)
+        if source == "no-autosize":
             h.removeAttr(el, "no-autosize")
             continue
-        src = el.get("src")
-        srcset = el.get("srcset")
-        res = 1
-        if src is None and srcset is None:
+        if source == "no-src":
             m.warn(
                 "<img> elements must have at least one of src or srcset.",
                 el=el,
             )
             continue
-        elif src is not None and srcset is not None:
+        if source == "bad-srcset":
+            m.die(
+                f"Couldn't parse 'srcset' attribute: \"{el.get('srcset')}\"\n"
+                + "Bikeshed only supports a single image followed by an integer resolution. If not targeting Bikeshed specifically, HTML requires a 'src' attribute (and probably a 'width' and 'height' attribute too). This warning can also be suppressed by adding a 'no-autosize' attribute.",
+                el=el,
+            )
             continue
-        elif src is None:
-            match = re.match(r"^[ \t\n]*([^ \t\n]+)[ \t\n]+(\d+)x[ \t\n]*$", srcset or "")
-            if match is None:
-                m.die(
-                    f"Couldn't parse 'srcset' attribute: \"{srcset}\"\n"
-                    + "Bikeshed only supports a single image followed by an integer resolution. If not targeting Bikeshed specifically, HTML requires a 'src' attribute (and probably a 'width' and 'height' attribute too). This warning can also be suppressed by adding a 'no-autosize' attribute.",
-                    el=el,
-                )
-                continue
-            else:
-                src = match.group(1)
-                el.set("src", src)
-                res = int(match.group(2) or "1")
-        assert src is not None
+        if isinstance(source, str):
+            continue
+        src, res = source
+        if el.get("src") is None:
+            el.set("src", src)
         if not doc.inputSource.cheaplyExists(""):
             # If the input source can't tell whether a file cheaply exists,
             # PIL very likely can't use it either.
@@ -1570,7 +1497,7 @@ def addImageSize(doc: t.SpecT) -> None:
                 el=el,
             )
             return
-        if re.match(r"^(https?:/)?/", src):
+        if isRemoteImage(src):
             m.warn(
                 f"Autodetection of image dimensions is only supported for local files, skipping this image: {h.outerHTML(el)}\nConsider setting 'width' and 'height' manually or opting out of autodetection by setting the 'no-autosize' attribute.",
                 el=el,
@@ -1580,21 +1507,22 @@ def addImageSize(doc: t.SpecT) -> None:
         if localImg is None:
             continue
         imgPath = localImg.sourceName
-        try:
-            im = Image.open(imgPath)
-            width, height = im.size
-        except FileNotFoundError:
+        size = sizes.get(imgPath)
+        if size is None:
+            size = imagesize.imageSizes([imgPath])[imgPath]
+        if isinstance(size, FileNotFoundError):
             m.warn(
                 f"Image doesn't exist, so I couldn't determine its width and height: '{src}'",
                 el=el,
             )
             continue
-        except Exception as e:
+        if isinstance(size, Exception):
             m.warn(
-                f"Couldn't determine width and height of this image: '{src}'\n{e}",
+                f"Couldn't determine width and height of this image: '{src}'\n{size}",
                 el=el,
             )
             continue
+        width, height = size
         if width % res == 0:
             el.set("width", str(int(width / res)))
         else:
@@ -1611,6 +1539,49 @@ def addImageSize(doc: t.SpecT) -> None:
             )
 
 
+def autosizedImagePath(doc: t.SpecT, el: t.ElementT) -> str | None:
+    # The local image that addImageSize() will want the size of for this <img>, if any.
+    # (addImageSize() reports the problems with the ones that are skipped.)
+    source = imageSizeSource(el)
+    if isinstance(source, str) or isRemoteImage(source[0]) or not doc.inputSource.cheaplyExists(""):
+        return None
+    localImg = doc.inputSource.relative(source[0])
+    if localImg is None:
+        return None
+    return localImg.sourceName
+
+
+def imageSizeSource(el: t.ElementT) -> tuple[str, int] | str:
+    """
+    Returns the (src, resolution) that an <img> should be auto-sized from,
+    or why it shouldn't be:
+    "sized" (it already has a width or height), "no-autosize" (it opted out),
+    "no-src" (it has neither a src nor a srcset),
+    "src-and-srcset" (it has both), or "bad-srcset" (its srcset isn't one that can be used).
+    """
+    if el.get("width") or el.get("height"):
+        return "sized"
+    if el.get("no-autosize") is not None:
+        return "no-autosize"
+    src = el.get("src")
+    srcset = el.get("srcset")
+    if src is None and srcset is None:
+        return "no-src"
+    if src is not None and srcset is not None:
+        return "src-and-srcset"
+    if src is None:
+        match = re.match(r"^[ \t\n]*([^ \t\n]+)[ \t\n]+(\d+)x[ \t\n]*$", srcset or "")
+        if match is None:
+            return "bad-srcset"
+        return match.group(1), int(match.group(2) or "1")
+    return src, 1
+
+
+def isRemoteImage(src: str) -> bool:
+    # Only local files can be auto-sized.
+    return re.match(r"^(https?:/)?/", src) is not None
+
+
 def processIDL(doc: t.SpecT) -> None:
     localDfns = set()
     for pre in h.findAll("pre.idl, xmp.idl", doc):
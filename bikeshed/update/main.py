@@ -14,6 +14,7 @@ from . import (
     updateBoilerplates,
     updateCanIUse,
     updateCrossRefs,
+    updateIndexes,
     updateLanguages,
     updateLinkDefaults,
     updateManifest,
@@ -44,6 +45,7 @@ def update(
     if updateMode & UpdateMode.MANIFEST:
         newManifest = updateManifest.updateByManifest(path=path, dryRun=dryRun, updateMode=updateMode)
         if newManifest:
+            updateIndexes.update(path=path, dryRun=dryRun)
             return newManifest
         if updateMode & UpdateMode.MANUAL:
             m.say("Falling back to a manual update...")
@@ -73,6 +75,7 @@ def update(
         # fmt: on
 
         cleanupFiles(path, touchedPaths=touchedPaths, dryRun=dryRun)
+        updateIndexes.update(path=path, dryRun=dryRun)
     return updateManifest.createManifest(path=path, dryRun=dryRun)
 
 
@@ -100,6 +103,7 @@ def fixupDataFiles(updateMode: UpdateMode = UpdateMode.NONE) -> None:
         try:
             for filename in os.listdir(readonlyPath()):
                 copyanything(readonlyPath(filename), livePath(filename))
+            updateIndexes.update(path=livePath())
         except Exception as err:
             m.warn(
                 f"Bikeshed's datafile format has changed, but I couldn't copy the new files over from cache. Bikeshed might be unstable; try running `bikeshed update`.\n  {err}",
@@ -136,7 +140,7 @@ def updateReadonlyDataFiles() -> None:
     """
     try:
         for filename in os.listdir(livePath()):
-            if filename.startswith("readonly"):
+            if filename.startswith("readonly") or filename in updateIndexes.INDEX_FOLDERS:
                 continue
             copyanything(livePath(filename), readonlyPath(filename))
     except Exception as err:
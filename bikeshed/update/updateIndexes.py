@@ -0,0 +1,294 @@
+from __future__ import annotations
+
+import contextlib
+import io
+import os
+import re
+import struct
+
+from .. import messages as m
+from .. import t
+from ..refs import anchorindex, biblioindex, source
+from ..wpt import wptindex
+
+# Compiles the binary indexes that are derived from the downloaded text data files.
+# See the readers (like refs/anchorindex.py) for the formats.
+# These aren't part of the manifest; they're always regenerated locally
+# from whatever data files are present.
+
+# Folders holding the compiled indexes.
+# They're regenerated on every update, so they never get copied into readonly/.
+INDEX_FOLDERS = [
+    anchorindex.INDEX_FOLDER,
+    biblioindex.INDEX_FOLDER,
+    wptindex.INDEX_FOLDER,
+]
+
+
+def update(path: str, dryRun: bool = False) -> set[str] | None:
+    if dryRun:
+        return None
+    m.say("Compiling data file indexes...")
+    writtenPaths: set[str] = set()
+    for name, compileAll in [
+        ("anchor", compileAnchorIndexes),
+        ("biblio", compileBiblioIndexes),
+        ("WPT", compileWptIndexes),
+    ]:
+        try:
+            writtenPaths |= compileAll(path)
+        except Exception as e:
+            # The text files are still usable on their own, so this isn't fatal.
+            m.warn(f"Couldn't compile the {name} indexes; Bikeshed will read the {name} data files directly.\n{e}")
+    return writtenPaths
+
+
+@contextlib.contextmanager
+def writeIndex(
+    indexPath: str,
+    dataStat: os.stat_result,
+    header: struct.Struct,
+    magic: bytes,
+    *counts: int,
+) -> t.Generator[t.BinaryIO, None, None]:
+    """
+    Opens a file to write the index at indexPath into,
+    already started with the header for an index of a source file with dataStat
+    (see dataindex.py).
+    The index only replaces any existing one once it's completely written.
+    """
+    tempPath = indexPath + ".tmp"
+    os.makedirs(os.path.dirname(indexPath), exist_ok=True)
+    with open(tempPath, "wb") as fh:
+        fh.write(header.pack(magic, dataStat.st_size, dataStat.st_mtime_ns, *counts))
+        yield fh
+    os.replace(tempPath, indexPath)
+
+
+def compileAnchorIndex(dataPath: str, indexPath: str) -> None:
+    dataStat = os.stat(dataPath)
+    with open(dataPath, encoding="utf-8") as fh:
+        anchors = source.decodeAnchors(fh)
+
+    strings: dict[str, int] = {}
+
+    def intern(s: str) -> int:
+        if s not in strings:
+            strings[s] = len(strings)
+        return strings[s]
+
+    keyEntries = []
+    records: list[tuple[int, ...]] = []
+    fors: list[int] = []
+    for key, refs in anchors.items():
+        keyEntries.append((key.encode("utf-8"), intern(key), len(records), len(refs)))
+        for ref in refs:
+            flags = (anchorindex.FLAG_EXPORT if ref.export else 0) | (
+                anchorindex.FLAG_NORMATIVE if ref.normative else 0
+            )
+            records.append(
+                (
+                    intern(ref.displayText),
+                    intern(ref.type),
+                    intern(ref.spec),
+                    intern(ref.shortname),
+                    intern(ref.level),
+                    intern(ref.status),
+                    intern(ref.url),
+                    flags,
+                    len(fors),
+                    len(ref.for_),
+                ),
+            )
+            fors.extend(intern(x) for x in ref.for_)
+    keyEntries.sort(key=lambda x: x[0])
+
+    blob = bytearray()
+    offsets = [0]
+    for s in strings:
+        blob += s.encode("utf-8")
+        offsets.append(len(blob))
+
+    with writeIndex(
+        indexPath,
+        dataStat,
+        anchorindex.HEADER,
+        anchorindex.MAGIC,
+        len(strings),
+        len(keyEntries),
+        len(records),
+        len(fors),
+    ) as fh:
+        fh.write(struct.pack(f"<{len(offsets)}I", *offsets))
+        for _, strId, recStart, recCount in keyEntries:
+            fh.write(anchorindex.KEY.pack(strId, recStart, recCount))
+        for record in records:
+            fh.write(anchorindex.RECORD.pack(*record))
+        fh.write(struct.pack(f"<{len(fors)}I", *fors))
+        fh.write(blob)
+
+
+def compileBiblioIndex(dataPath: str, indexPath: str) -> None:
+    dataStat = os.stat(dataPath)
+    with open(dataPath, "rb") as fh:
+        data = fh.read()
+    # The entries are read back in text mode, which treats a lone \r as a line break too;
+    # rather than replicate that, just don't index such a file.
+    if b"\r" in data.replace(b"\r\n", b""):
+        msg = f"'{dataPath}' contains stray carriage returns."
+        raise ValueError(msg)
+
+    # Walks the entries the same way biblio.loadBiblioDataFile() does,
+    # but just notes where each one is.
+    keyEntries: dict[str, list[tuple[int, int]]] = {}
+    lines = iter(io.BytesIO(data))
+    offset = 0
+    try:
+        while True:
+            start = offset
+            fullKey = next(lines)
+            offset += len(fullKey)
+            prefix = fullKey[:1]
+            if prefix == b"d":
+                for _ in range(9):
+                    offset += len(next(lines))
+                while True:
+                    line = next(lines)
+                    offset += len(line)
+                    if line in (b"-\n", b"-\r\n"):
+                        break
+            elif prefix in (b"s", b"a"):
+                for _ in range(3):
+                    offset += len(next(lines))
+            else:
+                msg = f"Unknown biblio prefix '{fullKey.decode('utf-8')}' in '{dataPath}'."
+                raise ValueError(msg)
+            key = fullKey.decode("utf-8")[2:].strip()
+            keyEntries.setdefault(key, []).append((start, offset - start))
+    except StopIteration:
+        # Same as the text reader, a truncated final entry is dropped.
+        pass
+
+    sortedKeys = sorted(keyEntries, key=lambda x: x.encode("utf-8"))
+    blob = bytearray()
+    keyRecords = []
+    entries: list[tuple[int, int]] = []
+    for key in sortedKeys:
+        keyStart = len(blob)
+        blob += key.encode("utf-8")
+        keyRecords.append((keyStart, len(blob), len(entries), len(keyEntries[key])))
+        entries.extend(keyEntries[key])
+
+    with writeIndex(
+        indexPath,
+        dataStat,
+        biblioindex.HEADER,
+        biblioindex.MAGIC,
+        len(keyRecords),
+        len(entries),
+    ) as fh:
+        for record in keyRecords:
+            fh.write(biblioindex.KEY.pack(*record))
+        for entry in entries:
+            fh.write(biblioindex.ENTRY.pack(*entry))
+        fh.write(blob)
+
+
+def compileWptIndex(dataPath: str, indexPath: str) -> None:
+    dataStat = os.stat(dataPath)
+    with open(dataPath, "rb") as fh:
+        data = fh.read()
+    # Same as the biblio files, the text reader would treat a lone \r as a line break.
+    if b"\r" in data.replace(b"\r\n", b""):
+        msg = f"'{dataPath}' contains stray carriage returns."
+        raise ValueError(msg)
+
+    # Walks the lines the same way wptindex.TestList.fromText() does,
+    # skipping the first (the WPT commit) line.
+    tests: dict[bytes, tuple[int, int, int, int]] = {}
+    firstBreak = data.find(b"\n")
+    offset = len(data) if firstBreak == -1 else firstBreak + 1
+    while offset < len(data):
+        end = data.find(b"\n", offset)
+        if end == -1:
+            end = len(data)
+        line = data[offset:end]
+        testType, _, testPath = line.strip().partition(b" ")
+        if testPath:
+            start = offset + len(line) - len(line.lstrip())
+            # Later lines win, same as in the dict,
+            # but the path keeps its place from its first line, also like the dict.
+            previous = tests.get(testPath)
+            position = len(tests) if previous is None else previous[3]
+            tests[testPath] = (start, len(testType), len(testPath), position)
+        offset = end + 1
+
+    with writeIndex(indexPath, dataStat, wptindex.HEADER, wptindex.MAGIC, len(tests)) as fh:
+        for testPath in sorted(tests):
+            fh.write(wptindex.TEST.pack(*tests[testPath]))
+
+
+def compileAnchorIndexes(path: str) -> set[str]:
+    """
+    Compiles every anchors-XX.data file under path/anchors/
+    into path/anchors-index/,
+    and removes any index files that no longer have a source.
+    """
+    writtenPaths = compileIndexes(path, "anchors", anchorindex.INDEX_FOLDER, compileAnchorIndex)
+    m.say(f"Compiled {len(writtenPaths)} anchor index files.")
+    return writtenPaths
+
+
+def compileBiblioIndexes(path: str) -> set[str]:
+    """
+    Compiles every biblio-XX.data file under path/biblio/
+    into path/biblio-index/,
+    and removes any index files that no longer have a source.
+    """
+    writtenPaths = compileIndexes(path, "biblio", biblioindex.INDEX_FOLDER, compileBiblioIndex)
+    m.say(f"Compiled {len(writtenPaths)} biblio index files.")
+    return writtenPaths
+
+
+def compileWptIndexes(path: str) -> set[str]:
+    """
+    Compiles path/wpt-tests.txt into path/wpt-index/wpt-tests.idx,
+    or removes the index if there's no longer a source.
+    """
+    dataPath = os.path.join(path, "wpt-tests.txt")
+    indexPath = os.path.join(path, wptindex.INDEX_FOLDER, "wpt-tests.idx")
+    if not os.path.exists(dataPath):
+        if os.path.exists(indexPath):
+            os.remove(indexPath)
+        return set()
+    compileWptIndex(dataPath, indexPath)
+    m.say("Compiled the WPT index file.")
+    return {indexPath}
+
+
+def compileIndexes(
+    path: str,
+    dataFolderName: str,
+    indexFolderName: str,
+    compileOne: t.Callable[[str, str], None],
+) -> set[str]:
+    # Compiles each DATAFOLDER/DATAFOLDER-XX.data into INDEXFOLDER/DATAFOLDER-XX.idx.
+    writtenPaths: set[str] = set()
+    dataFolder = os.path.join(path, dataFolderName)
+    indexFolder = os.path.join(path, indexFolderName)
+    try:
+        dataFiles = os.listdir(dataFolder)
+    except OSError:
+        return writtenPaths
+    for filename in sorted(dataFiles):
+        match = re.match(rf"({re.escape(dataFolderName)}-.{{2}})\.data$", filename)
+        if not match:
+            continue
+        indexPath = os.path.join(indexFolder, match[1] + ".idx")
+        compileOne(os.path.join(dataFolder, filename), indexPath)
+        writtenPaths.add(indexPath)
+    for filename in os.listdir(indexFolder) if os.path.isdir(indexFolder) else []:
+        indexPath = os.path.join(indexFolder, filename)
+        if indexPath not in writtenPaths:
+            os.remove(indexPath)
+    return writtenPaths
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+from . import messages as m
+from . import t
+
+# Tells watch mode when its input files might have changed.
+#
+# On Linux this uses inotify, so a save triggers a rebuild right away
+# and an idle watcher costs nothing.
+# Everywhere else (or if inotify isn't usable) it falls back to
+# waking up once a second, like watch mode always used to.
+#
+# Either way, the caller still compares mtimes after wait() returns;
+# the watcher only decides when that check is worth doing.
+
+POLL_INTERVAL = 1.0
+# After a change, wait until things have been quiet for this long before reporting it,
+# so editors that save in several steps (write a temp file, rename it, touch it...)
+# only cause one rebuild...
+DEBOUNCE_INTERVAL = 0.1
+# ...but don't wait longer than this in total, in case something is writing constantly.
+MAX_DEBOUNCE = 1.0
+
+
+class PollingWatcher:
+    def watch(self, paths: t.Iterable[str]) -> None:
+        pass
+
+    def wait(self) -> None:
+        time.sleep(POLL_INTERVAL)
+
+    def close(self) -> None:
+        pass
+
+
+# From <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+WATCH_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+)
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    def __init__(self, libc: ctypes.CDLL) -> None:
+        self.libc = libc
+        fd = libc.inotify_init1(IN_CLOEXEC | IN_NONBLOCK)
+        if fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.fd: int = fd
+        # The folders being watched, and the names in each that matter.
+        # Folders are watched rather than the files themselves,
+        # so files that don't exist yet (like unused boilerplate locations)
+        # and files replaced by renaming over them are still noticed.
+        self.watches: dict[int, set[str]] = {}
+
+    def watch(self, paths: t.Iterable[str]) -> None:
+        """
+        Replaces the set of watched paths.
+        Raises OSError if the paths can't all be watched
+        (usually because the system's inotify watch limit was hit).
+        """
+        for wd in self.watches:
+            self.libc.inotify_rm_watch(self.fd, wd)
+        self.watches = {}
+        for path in paths:
+            folder, name = os.path.split(os.path.abspath(path))
+            # If the folder itself is missing, watch for it being created instead.
+            while folder and not os.path.isdir(folder):
+                folder, name = os.path.split(folder)
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(folder), WATCH_MASK)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, f"Couldn't watch '{folder}': {os.strerror(errno)}")
+            self.watches.setdefault(wd, set()).add(name)
+
+    def wait(self) -> None:
+        while not self._readEvents(timeout=None):
+            pass
+        deadline = time.monotonic() + MAX_DEBOUNCE
+        while time.monotonic() < deadline:
+            if not self._readEvents(timeout=DEBOUNCE_INTERVAL):
+                break
+
+    def _readEvents(self, timeout: float | None) -> bool:
+        # Returns whether any of the events read were for a watched name.
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return False
+        relevant = False
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, nameLen = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset : offset + nameLen].rstrip(b"\0"))
+            offset += nameLen
+            if mask & IN_Q_OVERFLOW:
+                # Lost track of events, so something might have changed.
+                relevant = True
+            elif mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                # A watched folder went away; the files in it did too.
+                relevant = relevant or wd in self.watches
+            elif name in self.watches.get(wd, ()):
+                relevant = True
+        return relevant
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+Watcher = PollingWatcher | InotifyWatcher
+
+
+def makeWatcher() -> Watcher:
+    if sys.platform.startswith("linux"):
+        libcName = ctypes.util.find_library("c")
+        try:
+            return InotifyWatcher(ctypes.CDLL(libcName, use_errno=True))
+        except (OSError, AttributeError) as e:
+            m.warn(f"Couldn't use inotify to watch for changes ({e}), so checking every second instead.")
+    return PollingWatcher()
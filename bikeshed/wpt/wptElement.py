@@ -5,6 +5,7 @@ from collections import Counter
 from .. import h, t
 from .. import messages as m
 from ..translate import _t
+from . import wptindex
 
 
 def processWptElements(doc: t.SpecT) -> None:
@@ -62,7 +63,15 @@ def processWptElements(doc: t.SpecT) -> None:
             if pathPrefix is None:
                 m.die("Can't use <wpt-rest> without either a pathprefix='' attribute or a 'WPT Path Prefix' metadata.")
                 return
-            prefixedNames = [p for p in testData if prefixInPath(pathPrefix, p) and p not in seenTestNames]
+            # In the order they're listed in wpt-tests.txt.
+            prefixedNames = [
+                path
+                for path, _, _ in sorted(
+                    testData.withPrefix(normalizePathSegment(pathPrefix)),
+                    key=lambda test: test[2],
+                )
+                if path not in seenTestNames
+            ]
             if len(prefixedNames) == 0:
                 m.die(f"Couldn't find any tests with the path prefix '{pathPrefix}'.")
                 return
@@ -114,7 +123,7 @@ def createHTML(
     doc: t.SpecT,
     blockEl: t.ElementT,
     testNames: list[str],
-    testData: dict[str, str],
+    testData: wptindex.TestDataT,
     title: str | None = None,
     titleLang: str | None = None,
     titleDir: str | None = None,
@@ -141,7 +150,7 @@ def createHTML(
 def appendTestList(
     blockEl: t.ElementT,
     testNames: list[str],
-    testData: dict[str, str],
+    testData: wptindex.TestDataT,
     title: str | None = None,
     titleLang: str | None = None,
     titleDir: str | None = None,
@@ -277,12 +286,6 @@ def prefixPlusPath(prefix: str | None, path: str) -> str:
     return prefix + path
 
 
-def prefixInPath(prefix: str | None, path: str) -> bool:
-    if prefix is None:
-        return False
-    return path.startswith(normalizePathSegment(prefix))
-
-
 @t.overload
 def normalizePathSegment(pathSeg: str) -> str: ...
 
@@ -302,14 +305,13 @@ def normalizePathSegment(pathSeg: str | None) -> str | None:
     return pathSeg
 
 
-def checkForOmittedTests(pathPrefix: str, testData: dict[str, str], seenTestNames: set[str]) -> None:
+def checkForOmittedTests(pathPrefix: str, testData: wptindex.TestDataT, seenTestNames: set[str]) -> None:
     unseenTests = []
-    for testPath in testData:
+    for testPath, _, _ in testData.withPrefix(normalizePathSegment(pathPrefix)):
         if ".tentative." in testPath:
             continue
-        if prefixInPath(pathPrefix, testPath):
-            if testPath not in seenTestNames:
-                unseenTests.append(testPath)
+        if testPath not in seenTestNames:
+            unseenTests.append(testPath)
     if unseenTests:
         numTests = len(unseenTests)
         m.warn(
@@ -318,12 +320,13 @@ def checkForOmittedTests(pathPrefix: str, testData: dict[str, str], seenTestName
         )
 
 
-def loadTestData(doc: t.SpecT) -> dict[str, str]:
-    paths = {}
-    for line in doc.dataFile.fetch("wpt-tests.txt", str=True).split("\n")[1:]:
-        testType, _, testPath = line.strip().partition(" ")
-        paths[testPath] = testType
-    return paths
+def loadTestData(doc: t.SpecT) -> wptindex.TestDataT:
+    # The compiled index (see wptindex.py) only decodes the tests that get asked about;
+    # without it, the whole file has to be read.
+    index = wptindex.indexForDataFile(doc.dataFile)
+    if index is not None:
+        return index
+    return doc.dataFile.fetchParsed("wpt-tests.txt", parse=wptindex.TestList.fromText)
 
 
 def xor(a: t.Any, b: t.Any) -> bool:
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import bisect
+import mmap
+import struct
+
+from .. import dataindex, t
+
+if t.TYPE_CHECKING:
+    from .. import retrieve
+
+    type TestDataT = WptIndex | TestList
+
+# Sorted, mmap-able index of wpt-tests.txt.
+#
+# wpt-tests.txt lists every test in WPT (hundreds of thousands of them)
+# as "type path" lines, grouped by type,
+# but a spec almost always only cares about the tests in a folder or two.
+# Rather than reading the whole file into a dict on every build,
+# this index lists its lines sorted by path,
+# so finding a single test, or every test under a path prefix,
+# is a binary search, and only the matching lines ever get decoded.
+# Like the biblio index, it doesn't copy the data itself;
+# the .txt file is mmapped, and the index just records where each line is.
+#
+# Layout (all integers are little-endian u32s unless noted):
+#
+# header
+#     magic (8 bytes), source size (u64), source mtime in ns (u64),
+#     then the count of tests.
+# tests
+#     (byte offset of the line, length of its type, length of its path, position in the file),
+#     sorted by the path's UTF-8 bytes.
+#     The path starts right after the type and a space.
+#     The position is where the path first appears among the file's tests
+#     (0 for the first test, 1 for the next new path, etc),
+#     so tests can be listed in the same order as the file.
+#
+# The index records the size and mtime of the .txt file it was compiled from,
+# and is ignored if those no longer match.
+
+MAGIC = b"BSWPTIX2"
+INDEX_FOLDER = "wpt-index"
+HEADER = struct.Struct("<8sQQI")
+TEST = struct.Struct("<IIII")
+
+
+class WptIndex:
+    __slots__ = [
+        "_data",
+        "_index",
+        "numTests",
+    ]
+
+    def __init__(self, index: mmap.mmap, data: mmap.mmap) -> None:
+        self._index = index
+        self._data = data
+        _, _, _, numTests = HEADER.unpack_from(index, 0)
+        self.numTests: int = numTests
+
+    @staticmethod
+    def open(dataPath: str, indexPath: str) -> WptIndex | None:
+        """
+        Opens the index at indexPath,
+        if it exists and was compiled from the current version of dataPath.
+        Otherwise returns None, and the caller should fall back to reading the .txt file.
+        """
+        maps = dataindex.openIndexAndData(dataPath, indexPath, HEADER, MAGIC)
+        if maps is None:
+            return None
+        return WptIndex(*maps)
+
+    def _test(self, i: int) -> tuple[int, int, int, int]:
+        return TEST.unpack_from(self._index, HEADER.size + TEST.size * i)
+
+    def _path(self, i: int) -> bytes:
+        offset, typeLength, pathLength, _ = self._test(i)
+        pathStart = offset + typeLength + 1
+        return self._data[pathStart : pathStart + pathLength]
+
+    def _lowerBound(self, target: bytes) -> int:
+        # The position of the first test whose path is >= target.
+        return dataindex.lowerBound(self.numTests, target, self._path)
+
+    def get(self, path: str) -> str | None:
+        # Returns the test's type, or None if there's no such test.
+        target = path.encode("utf-8")
+        i = self._lowerBound(target)
+        if i < self.numTests and self._path(i) == target:
+            offset, typeLength, _, _ = self._test(i)
+            return self._data[offset : offset + typeLength].decode("utf-8")
+        return None
+
+    def __contains__(self, path: str) -> bool:
+        return self.get(path) is not None
+
+    def __getitem__(self, path: str) -> str:
+        testType = self.get(path)
+        if testType is None:
+            raise KeyError(path)
+        return testType
+
+    def withPrefix(self, prefix: str) -> list[tuple[str, str, int]]:
+        """
+        Returns the (path, type, position in the file) of every test whose path starts with prefix,
+        sorted by path.
+        Since the paths are sorted, they're all next to each other.
+        """
+        target = prefix.encode("utf-8")
+        tests = []
+        for i in range(self._lowerBound(target), self.numTests):
+            path = self._path(i)
+            if not path.startswith(target):
+                break
+            offset, typeLength, _, position = self._test(i)
+            tests.append((path.decode("utf-8"), self._data[offset : offset + typeLength].decode("utf-8"), position))
+        return tests
+
+
+class TestList:
+    """
+    Answers the same questions as WptIndex,
+    but from the text of wpt-tests.txt,
+    for when the index hasn't been compiled (or is out of date).
+    """
+
+    __slots__ = [
+        "paths",
+        "positions",
+        "types",
+    ]
+
+    def __init__(self, types: dict[str, str]) -> None:
+        # path => type, in the order the paths first appear in the file
+        self.types = types
+        self.positions = {path: i for i, path in enumerate(types)}
+        self.paths = sorted(types)
+
+    @staticmethod
+    def fromText(text: str) -> TestList:
+        types = {}
+        # The first line is the WPT commit the data came from.
+        for line in text.split("\n")[1:]:
+            testType, _, testPath = line.strip().partition(" ")
+            # Skips blank lines (like the trailing one), same as the compiled index.
+            if testPath:
+                types[testPath] = testType
+        return TestList(types)
+
+    def get(self, path: str) -> str | None:
+        return self.types.get(path)
+
+    def __contains__(self, path: str) -> bool:
+        return path in self.types
+
+    def __getitem__(self, path: str) -> str:
+        return self.types[path]
+
+    def withPrefix(self, prefix: str) -> list[tuple[str, str, int]]:
+        tests = []
+        for i in range(bisect.bisect_left(self.paths, prefix), len(self.paths)):
+            path = self.paths[i]
+            if not path.startswith(prefix):
+                break
+            tests.append((path, self.types[path], self.positions[path]))
+        return tests
+
+
+def indexForDataFile(dataFile: retrieve.DataFileRequester) -> WptIndex | None:
+    # The index used is always the one next to the file that would otherwise be read.
+    requester = dataFile.findWithFallback("wpt-tests.txt")
+    if requester is None:
+        return None
+    return WptIndex.open(requester.path("wpt-tests.txt"), requester.path(INDEX_FOLDER, "wpt-tests.idx"))
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from bikeshed import messages as m
+from bikeshed import retrieve, t
+from bikeshed.refs import anchorindex, source
+from bikeshed.update import updateIndexes
+
+# Checks that the compiled anchor index answers exactly like the anchors-XX.data text it was compiled from,
+# using a few of the real readonly data files.
+# (The readonly data has no compiled indexes, so `bikeshed test` only ever reads the text.)
+# Staleness is checked for every index format in test_dataindex.py.
+
+GROUPS = ["ab", "dr", "fo", "ur"]
+READONLY = retrieve.DataFileRequester(fileType="readonly")
+
+
+def refFields(ref: t.RefWrapper) -> tuple[object, ...]:
+    return (
+        ref.text,
+        ref.displayText,
+        ref.type,
+        ref.spec,
+        ref.shortname,
+        ref.level,
+        ref.status,
+        ref.url,
+        ref.export,
+        ref.normative,
+        ref.for_,
+    )
+
+
+class AnchorIndexTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.root = self.enterContext(tempfile.TemporaryDirectory())
+        os.makedirs(os.path.join(self.root, "anchors"))
+        for group in GROUPS:
+            shutil.copy2(READONLY.path("anchors", f"anchors-{group}.data"), self.dataPath(group))
+        with m.withMessageState(io.StringIO(), printMode="plain"):
+            updateIndexes.compileAnchorIndexes(self.root)
+        self.dataFile = retrieve.DataFileRequester(fileType="readonly", fallback=READONLY, root=self.root)
+
+    def dataPath(self, group: str) -> str:
+        return os.path.join(self.root, "anchors", f"anchors-{group}.data")
+
+    def textAnchors(self, group: str) -> dict[str, list[t.RefWrapper]]:
+        with open(self.dataPath(group), encoding="utf-8") as fh:
+            return source.decodeAnchors(fh)
+
+    def openIndex(self, group: str) -> anchorindex.AnchorIndex:
+        index = anchorindex.indexForGroup(self.dataFile, group)
+        if index is None:
+            self.fail(f"The compiled index for anchors-{group}.data wasn't used.")
+        return index
+
+    def testLookupsMatchText(self) -> None:
+        for group in GROUPS:
+            anchors = self.textAnchors(group)
+            index = self.openIndex(group)
+            self.assertEqual(index.numKeys, len(anchors))
+            for key, refs in anchors.items():
+                self.assertIn(key, index)
+                self.assertEqual([refFields(ref) for ref in index.get(key)], [refFields(ref) for ref in refs], key)
+            self.assertNotIn(group + "-not-a-real-key", index)
+            self.assertEqual(index.get(group + "-not-a-real-key"), [])
+
+    def testItemsInFileOrder(self) -> None:
+        for group in GROUPS:
+            anchors = self.textAnchors(group)
+            items = list(self.openIndex(group).items())
+            self.assertEqual([key for key, _ in items], list(anchors))
+
+    def testSourceReadsThruIndex(self) -> None:
+        refSource = source.RefSource("foreign", fileRequester=self.dataFile)
+        anchors = self.textAnchors("fo")
+        key = next(iter(anchors))
+        self.assertEqual([refFields(ref) for ref in refSource.fetchRefs(key)], [refFields(ref) for ref in anchors[key]])
+        self.assertIn("fo", refSource._anchorIndexes)  # pylint: disable=protected-access
+
+    def testFallbackWithoutIndex(self) -> None:
+        # A group that's only in the fallback's data, which has no index, gets read as text.
+        self.assertIsNone(anchorindex.indexForGroup(self.dataFile, "co"))
+        self.assertIs(self.dataFile.findWithFallback("anchors", "anchors-co.data"), READONLY)
+        self.assertIs(self.dataFile.findWithFallback("anchors", "anchors-fo.data"), self.dataFile)
+        self.assertIsNone(self.dataFile.findWithFallback("anchors", "anchors-not-a-group.data"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+# Smoke-tests `bikeshed batch` end to end, thru the real command line,
+# so every option the batch workers hand to the build has to actually be there.
+
+SPEC = """<pre class=metadata>
+Title: Batch Test {0}
+Shortname: batch-test-{0}
+Level: 1
+Status: LS
+URL: http://example.com/{0}/
+Editor: Example Editor
+Abstract: A spec for the batch test.
+Markup Shorthands: markdown yes
+</pre>
+
+Introduction {{#intro}}
+=====================
+
+A <dfn>thing</dfn> is used in [=thing=].
+"""
+
+
+class BatchTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tempDir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tempDir.cleanup()
+
+    def writeSpec(self, name: str) -> str:
+        path = os.path.join(self.tempDir.name, f"{name}.bs")
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.write(SPEC.format(name))
+        return path
+
+    def testBuildsEverySpec(self) -> None:
+        infiles = [self.writeSpec("a"), self.writeSpec("b")]
+        # The readonly data has no boilerplate for this spec's group,
+        # so those errors are let thru; it's the builds themselves that matter here.
+        result = subprocess.run(
+            [sys.executable, "-m", "bikeshed", "--no-update", "--die-on=nothing", "batch", "-j", "2", *infiles],
+            capture_output=True,
+            encoding="utf-8",
+            check=False,
+        )
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+        self.assertNotIn("Traceback", result.stdout + result.stderr)
+        self.assertIn("Built 2 specs.", result.stdout)
+        for name in ("a", "b"):
+            with open(os.path.join(self.tempDir.name, f"{name}.html"), encoding="utf-8") as fh:
+                self.assertIn(f"http://example.com/{name}/", fh.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
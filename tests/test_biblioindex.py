@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import collections
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from bikeshed import biblio, retrieve, t
+from bikeshed import messages as m
+from bikeshed.refs import biblioindex
+from bikeshed.update import updateIndexes
+
+# Checks that the compiled biblio index decodes exactly the entries
+# that reading the whole biblio-XX.data file would,
+# using a few of the real readonly data files.
+# Staleness is checked for every index format in test_dataindex.py.
+
+GROUPS = ["ab", "dr", "ht", "ur"]
+READONLY = retrieve.DataFileRequester(fileType="readonly")
+
+
+def newStorage() -> t.BiblioStorageT:
+    return collections.defaultdict(list)
+
+
+class BiblioIndexTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.root = self.enterContext(tempfile.TemporaryDirectory())
+        os.makedirs(os.path.join(self.root, "biblio"))
+        for group in GROUPS:
+            shutil.copy2(READONLY.path("biblio", f"biblio-{group}.data"), self.dataPath(group))
+        with m.withMessageState(io.StringIO(), printMode="plain"):
+            updateIndexes.compileBiblioIndexes(self.root)
+        self.dataFile = retrieve.DataFileRequester(fileType="readonly", fallback=READONLY, root=self.root)
+
+    def dataPath(self, group: str) -> str:
+        return os.path.join(self.root, "biblio", f"biblio-{group}.data")
+
+    def textBiblios(self, group: str) -> t.BiblioStorageT:
+        storage = newStorage()
+        with open(self.dataPath(group), encoding="utf-8") as fh:
+            biblio.loadBiblioDataFile(fh, storage)
+        return storage
+
+    def openIndex(self, group: str) -> biblioindex.BiblioIndex:
+        index = biblioindex.indexForGroup(self.dataFile, group)
+        if index is None:
+            self.fail(f"The compiled index for biblio-{group}.data wasn't used.")
+        return index
+
+    def testLookupsMatchText(self) -> None:
+        for group in GROUPS:
+            biblios = self.textBiblios(group)
+            index = self.openIndex(group)
+            self.assertEqual(index.numKeys, len(biblios))
+            storage = newStorage()
+            for key, entries in biblios.items():
+                self.assertIn(key, index)
+                index.loadKey(key, storage)
+                self.assertEqual(storage[key], entries, key)
+            # Loading a key again doesn't duplicate its entries.
+            key = next(iter(biblios))
+            index.loadKey(key, storage)
+            self.assertEqual(storage[key], biblios[key])
+            self.assertNotIn(group + "-not-a-real-key", index)
+            index.loadKey(group + "-not-a-real-key", storage)
+            self.assertEqual(dict(storage), dict(biblios))
+
+    def testPrefixMatchesText(self) -> None:
+        biblios = self.textBiblios("ht")
+        for prefix in ["ht", "html", "html5", "http", "htzzz"]:
+            storage = newStorage()
+            self.openIndex("ht").loadPrefix(prefix, storage)
+            expected = {key: entries for key, entries in biblios.items() if key.startswith(prefix)}
+            self.assertEqual(dict(storage), expected, prefix)
+
+    def testFallbackWithoutIndex(self) -> None:
+        # A group that's only in the fallback's data, which has no index, gets read as text.
+        self.assertIsNone(biblioindex.indexForGroup(self.dataFile, "et"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import dataclasses
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from bikeshed import dataindex, retrieve, t
+from bikeshed.refs import anchorindex, biblioindex
+from bikeshed.update import updateIndexes
+from bikeshed.wpt import wptindex
+
+# Checks that every kind of compiled index is only used while it matches its source file
+# (see dataindex.py). The format-specific lookups are tested in each format's own test file.
+
+READONLY = retrieve.DataFileRequester(fileType="readonly")
+
+
+@dataclasses.dataclass
+class IndexFormat:
+    name: str
+    header: struct.Struct
+    magic: bytes
+    compileOne: t.Callable[[str, str], None]
+    # A real readonly data file to compile, or the text of a made-up one.
+    readonlySource: tuple[str, ...] | None = None
+    sourceText: str = ""
+
+    def writeSource(self, path: str) -> None:
+        if self.readonlySource:
+            shutil.copy2(READONLY.path(*self.readonlySource), path)
+        else:
+            with open(path, "w", encoding="utf-8") as fh:
+                fh.write(self.sourceText)
+
+
+FORMATS = [
+    IndexFormat(
+        "anchors",
+        anchorindex.HEADER,
+        anchorindex.MAGIC,
+        updateIndexes.compileAnchorIndex,
+        readonlySource=("anchors", "anchors-ur.data"),
+    ),
+    IndexFormat(
+        "biblio",
+        biblioindex.HEADER,
+        biblioindex.MAGIC,
+        updateIndexes.compileBiblioIndex,
+        readonlySource=("biblio", "biblio-ur.data"),
+    ),
+    IndexFormat(
+        "wpt",
+        wptindex.HEADER,
+        wptindex.MAGIC,
+        updateIndexes.compileWptIndex,
+        sourceText="sha: 0123456789abcdef\ntestharness css/css-foo/foo-001.html\nreftest css/css-foo/foo-002.html\n",
+    ),
+]
+
+
+class DataIndexTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.root = self.enterContext(tempfile.TemporaryDirectory())
+
+    def compile(self, fmt: IndexFormat) -> tuple[str, str]:
+        dataPath = os.path.join(self.root, fmt.name + ".data")
+        indexPath = os.path.join(self.root, "index", fmt.name + ".idx")
+        if not os.path.exists(dataPath):
+            fmt.writeSource(dataPath)
+        fmt.compileOne(dataPath, indexPath)
+        return dataPath, indexPath
+
+    def isOpened(self, fmt: IndexFormat, dataPath: str, indexPath: str) -> bool:
+        index = dataindex.openIndex(dataPath, indexPath, fmt.header, fmt.magic)
+        if index is None:
+            return False
+        index.close()
+        return True
+
+    def testStaleIndexIsIgnored(self) -> None:
+        for fmt in FORMATS:
+            with self.subTest(fmt.name):
+                dataPath, indexPath = self.compile(fmt)
+                self.assertTrue(self.isOpened(fmt, dataPath, indexPath))
+                self.assertFalse(os.path.exists(indexPath + ".tmp"))
+
+                # A different mtime...
+                stat = os.stat(dataPath)
+                os.utime(dataPath, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+                self.assertFalse(self.isOpened(fmt, dataPath, indexPath))
+                # ...or a different size, even with the original mtime, means the index is out of date.
+                with open(dataPath, "a", encoding="utf-8") as fh:
+                    fh.write("\n")
+                os.utime(dataPath, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+                self.assertFalse(self.isOpened(fmt, dataPath, indexPath))
+
+                # Recompiling the (restored, but newer) source brings it back.
+                fmt.writeSource(dataPath)
+                os.utime(dataPath)
+                self.compile(fmt)
+                self.assertTrue(self.isOpened(fmt, dataPath, indexPath))
+
+    def testBrokenIndexIsIgnored(self) -> None:
+        for fmt in FORMATS:
+            with self.subTest(fmt.name):
+                dataPath, indexPath = self.compile(fmt)
+                with open(indexPath, "rb") as fh:
+                    contents = fh.read()
+
+                # Another format's index (or another version of this one)...
+                with open(indexPath, "wb") as fh:
+                    fh.write(b"XXXXXXXX" + contents[8:])
+                self.assertFalse(self.isOpened(fmt, dataPath, indexPath))
+                # ...a header cut short...
+                with open(indexPath, "wb") as fh:
+                    fh.write(contents[: fmt.header.size - 1])
+                self.assertFalse(self.isOpened(fmt, dataPath, indexPath))
+                # ...an empty file, or no file at all, are all ignored.
+                with open(indexPath, "wb") as fh:
+                    pass
+                self.assertFalse(self.isOpened(fmt, dataPath, indexPath))
+                os.remove(indexPath)
+                self.assertFalse(self.isOpened(fmt, dataPath, indexPath))
+
+    def testMissingSourceIsIgnored(self) -> None:
+        for fmt in FORMATS:
+            with self.subTest(fmt.name):
+                dataPath, indexPath = self.compile(fmt)
+                os.remove(dataPath)
+                self.assertFalse(self.isOpened(fmt, dataPath, indexPath))
+                self.assertIsNone(dataindex.openIndexAndData(dataPath, indexPath, fmt.header, fmt.magic))
+
+    def testLowerBound(self) -> None:
+        keys = [b"a", b"b", b"b", b"d"]
+        for target, expected in [(b"", 0), (b"a", 0), (b"b", 1), (b"c", 3), (b"d", 3), (b"e", 4)]:
+            self.assertEqual(dataindex.lowerBound(len(keys), target, keys.__getitem__), expected, target)
+        self.assertEqual(dataindex.lowerBound(0, b"a", keys.__getitem__), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
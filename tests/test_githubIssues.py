@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import http.server
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import unittest
+
+from bikeshed import githubIssues, repository
+from bikeshed import messages as m
+
+# Exercises githubIssues.fetchIssues() against a local stand-in for the GitHub API,
+# so it runs without network access (or a real token).
+
+MISSING = "404"
+FAKE_TOKEN = "not-a-real-token"
+
+
+class FakeGithub(http.server.ThreadingHTTPServer):
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), FakeGithubHandler)
+        self.lock = threading.Lock()
+        # Every request, as (kind, issue or batch)
+        self.requests: list[tuple[str, str]] = []
+
+    def record(self, kind: str, what: str) -> None:
+        with self.lock:
+            self.requests.append((kind, what))
+
+    def kinds(self) -> list[str]:
+        return sorted(kind for kind, _ in self.requests)
+
+
+class FakeGithubHandler(http.server.BaseHTTPRequestHandler):
+    server: FakeGithub
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        num = self.path.rsplit("/", 1)[1]
+        if num == MISSING:
+            self.server.record("rest-404", num)
+            self.respond(404, {"message": "Not Found"})
+            return
+        etag = f'"etag-{num}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.server.record("rest-304", num)
+            self.respond(304, None)
+            return
+        self.server.record("rest-200", num)
+        self.respond(
+            200,
+            {"number": int(num), "title": f"Issue {num}", "body_html": f"<p>Body {num}</p>", "state": "open"},
+            {"ETag": etag},
+        )
+
+    def do_POST(self) -> None:
+        query = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["query"]
+        self.server.record("graphql", query)
+        data: dict[str, dict[str, object]] = {}
+        for repoChunk in re.split(r"(?=r\d+: repository\()", query)[1:]:
+            repoAlias = repoChunk.split(":")[0]
+            data[repoAlias] = {
+                issueAlias: (
+                    None
+                    if num == MISSING
+                    else {"number": int(num), "title": f"Issue {num}", "bodyHTML": f"<p>Body {num}</p>"}
+                )
+                for issueAlias, num in re.findall(r"(i\d+): issueOrPullRequest\(number: (\d+)\)", repoChunk)
+            }
+        self.respond(200, {"data": data})
+
+    def respond(self, status: int, body: object, headers: dict[str, str] | None = None) -> None:
+        encoded = b"" if body is None else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+
+class FetchIssuesTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server = FakeGithub()
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.repo = repository.GithubRepository("com", "example", "spec")
+        self.repo.api = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.repo.graphqlApi = self.repo.api + "/graphql"
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.storePath = os.path.join(self.tempDir.name, "github-issues.jsonl")
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.tempDir.cleanup()
+
+    def fetch(self, nums: list[str], token: str | None) -> tuple[dict[str, dict[str, object]], str]:
+        self.server.requests = []
+        keys = [githubIssues.IssueKey("example", "spec", num) for num in nums]
+        store = githubIssues.IssueStore(self.storePath)
+        with m.withMessageState(io.StringIO(), dieOn="nothing", printMode="plain") as output:
+            results = githubIssues.fetchIssues(keys, self.repo, token, {}, store)
+            return results, output.getvalue()
+
+    def testAnonymousFetchesThenRevalidates(self) -> None:
+        nums = [str(num) for num in range(1, 21)]
+        results, _ = self.fetch(nums, token=None)
+        self.assertEqual(self.server.kinds(), ["rest-200"] * 20)
+        self.assertEqual(results["example/spec/7"]["title"], "Issue 7")
+        # Only the inlined fields are kept.
+        self.assertNotIn("state", results["example/spec/7"])
+
+        # The second time, everything's cached with an ETag,
+        # so it's all conditional requests that come back unchanged.
+        again, _ = self.fetch(nums, token=None)
+        self.assertEqual(self.server.kinds(), ["rest-304"] * 20)
+        self.assertEqual(again, results)
+
+    def testTokenBatchesThruGraphql(self) -> None:
+        batchSize = githubIssues.GRAPHQL_BATCH_SIZE
+        nums = [str(num) for num in range(1, batchSize + 11)] + [MISSING]
+        results, output = self.fetch(nums, token=FAKE_TOKEN)
+        # Two batches cover them all, and the one GraphQL couldn't find gets a normal request,
+        # which reports the error.
+        self.assertEqual(self.server.kinds(), ["graphql", "graphql", "rest-404"])
+        self.assertEqual(len(results), batchSize + 10)
+        self.assertEqual(results["example/spec/3"]["body_html"], "<p>Body 3</p>")
+        self.assertIn("404 error when fetching GitHub Issues", output)
+
+    def testTokenRevalidatesIssuesWithEtags(self) -> None:
+        # Issues first fetched anonymously have ETags,
+        # so even with a token they get conditional requests rather than a GraphQL lookup;
+        # only the new one is looked up.
+        self.fetch(["1", "2", "3"], token=None)
+        results, _ = self.fetch(["1", "2", "3", "4"], token=FAKE_TOKEN)
+        self.assertEqual(self.server.kinds(), ["graphql", "rest-304", "rest-304", "rest-304"])
+        self.assertEqual(sorted(results), ["example/spec/1", "example/spec/2", "example/spec/3", "example/spec/4"])
+
+
+class IssueStoreTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.storePath = os.path.join(self.tempDir.name, "github-issues.jsonl")
+
+    def tearDown(self) -> None:
+        self.tempDir.cleanup()
+
+    def testAppendsAfterHalfWrittenLine(self) -> None:
+        store = githubIssues.IssueStore(self.storePath)
+        store.add("example/spec/1", {"title": "Issue 1"})
+        store.save()
+        # A build that got killed partway thru writing a line.
+        with open(self.storePath, "a", encoding="utf-8") as fh:
+            fh.write('{"key": "example/spec/2", "iss')
+
+        store = githubIssues.IssueStore(self.storePath)
+        self.assertEqual(list(store.issues), ["example/spec/1"])
+        store.add("example/spec/3", {"title": "Issue 3"})
+        store.save()
+
+        store = githubIssues.IssueStore(self.storePath)
+        self.assertEqual(store.get("example/spec/1"), {"title": "Issue 1"})
+        self.assertIsNone(store.get("example/spec/2"))
+        self.assertEqual(store.get("example/spec/3"), {"title": "Issue 3"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import io
+import os
+import tempfile
+import unittest
+
+from PIL import Image
+
+from bikeshed import imagesize
+
+# Checks that sniffing image headers agrees with PIL,
+# and hands truncated files over to PIL rather than failing itself.
+
+SIZE = (37, 21)
+
+
+def encode(format: str, mode: str = "RGB", **options: object) -> bytes:
+    buffer = io.BytesIO()
+    Image.new(mode, SIZE).save(buffer, format, **options)
+    return buffer.getvalue()
+
+
+IMAGES = {
+    "png": encode("PNG"),
+    "gif": encode("GIF"),
+    "jpeg": encode("JPEG"),
+    "webp-lossy": encode("WEBP"),
+    "webp-lossless": encode("WEBP", lossless=True),
+    "webp-extended": encode("WEBP", mode="RGBA", exact=True),
+}
+
+
+class ImageSizeTest(unittest.TestCase):
+    def testSniffsEveryFormat(self) -> None:
+        for name, data in IMAGES.items():
+            with self.subTest(name):
+                self.assertEqual(imagesize.sniffSize(io.BytesIO(data)), SIZE)
+
+    def testTruncatedHeaderIsLeftForPil(self) -> None:
+        # Cut off anywhere in the header, it's either still enough to get the right size,
+        # or it's left for PIL; it never fails or gets a wrong size.
+        for name, data in IMAGES.items():
+            for length in range(32):
+                with self.subTest(name, length=length):
+                    self.assertIn(imagesize.sniffSize(io.BytesIO(data[:length])), (SIZE, None))
+
+    def testReadSizeReportsTruncatedFiles(self) -> None:
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "truncated.webp")
+            with open(path, "wb") as fh:
+                fh.write(IMAGES["webp-lossless"][:21])
+            self.assertIsInstance(imagesize.readSize(path), OSError)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import io
+import unittest
+from unittest import mock
+
+from bikeshed import h, retrieve, t
+from bikeshed import messages as m
+from bikeshed.refs import manager
+
+# Checks that ReferenceManager.getRef() remembers failed lookups too,
+# and reports their messages again for each link that reuses the result.
+
+
+def linkAt(lineNum: int) -> t.ElementT:
+    return h.E.a({"bs-line-number": str(lineNum)}, "zzz-not-a-real-term")
+
+
+class RefCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.refs = manager.ReferenceManager(
+            fileRequester=retrieve.DataFileRequester(fileType="readonly"),
+            testing=True,
+        )
+
+    def countLookups(self) -> t.Any:
+        # (ReferenceManager has slots, so the method gets wrapped on the class.)
+        lookup = manager.ReferenceManager._getRef  # pylint: disable=protected-access
+        return mock.patch.object(manager.ReferenceManager, "_getRef", autospec=True, side_effect=lookup)
+
+    def getRef(self, el: t.ElementT) -> object:
+        return self.refs.getRef("dfn", "zzz-not-a-real-term", el=el)
+
+    def testFailedLookupIsCached(self) -> None:
+        with (
+            m.withMessageState(io.StringIO(), dieOn="nothing", printMode="plain") as output,
+            self.countLookups() as lookup,
+        ):
+            results = [self.getRef(linkAt(5)), self.getRef(linkAt(9)), self.getRef(linkAt(9))]
+            messages = output.getvalue()
+        self.assertEqual(lookup.call_count, 1)
+        self.assertEqual(results, ["No 'dfn' refs found for 'zzz-not-a-real-term'."] * 3)
+        # Each link gets its own message, and repeats for the same link are still deduped.
+        self.assertEqual(messages.count("zzz-not-a-real-term"), 2)
+        self.assertIn("LINE 5:", messages)
+        self.assertIn("LINE 9:", messages)
+
+    def testNewLocalDfnsClearTheCache(self) -> None:
+        with (
+            m.withMessageState(io.StringIO(), dieOn="nothing", printMode="plain"),
+            self.countLookups() as lookup,
+        ):
+            self.getRef(linkAt(5))
+            self.refs.addLocalDfns(mock.Mock(), [])
+            self.getRef(linkAt(5))
+        self.assertEqual(lookup.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
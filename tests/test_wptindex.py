@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import io
+import os
+import tempfile
+import unittest
+
+from bikeshed import messages as m
+from bikeshed import retrieve
+from bikeshed.update import updateIndexes
+from bikeshed.wpt import wptindex
+
+# Checks that the compiled WPT index answers exactly like wpt-tests.txt read as text
+# (see wptindex.TestList), including for paths listed more than once.
+# Staleness is checked for every index format in test_dataindex.py.
+
+TESTS = """sha: 0123456789abcdef
+testharness css/css-foo/parsing/foo-valid.html
+testharness css/css-foo/foo-001.html
+testharness css/css-foobar/foobar-001.html
+testharness css/css-foo/ünïcödé.html
+reftest css/css-foo/foo-002.html
+reftest css/css-foo/foo-001.html
+reftest css/css-bar/bar-001.html
+manual css/css-foo/foo-manual.html
+visual css/css-foo/foo-003.xht
+"""
+
+PREFIXES = ["", "css/", "css/css-foo", "css/css-foo/", "css/css-foo/parsing/", "css/css-bar/", "css/css-baz/", "zzz"]
+
+
+class WptIndexTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.root = self.enterContext(tempfile.TemporaryDirectory())
+        self.dataPath = os.path.join(self.root, "wpt-tests.txt")
+        with open(self.dataPath, "w", encoding="utf-8") as fh:
+            fh.write(TESTS)
+        with m.withMessageState(io.StringIO(), printMode="plain"):
+            updateIndexes.compileWptIndexes(self.root)
+        self.dataFile = retrieve.DataFileRequester(fileType="readonly", root=self.root)
+        self.testList = wptindex.TestList.fromText(TESTS)
+
+    def openIndex(self) -> wptindex.WptIndex:
+        index = wptindex.indexForDataFile(self.dataFile)
+        if index is None:
+            self.fail("The compiled index for wpt-tests.txt wasn't used.")
+        return index
+
+    def testLookupsMatchText(self) -> None:
+        index = self.openIndex()
+        self.assertEqual(index.numTests, len(self.testList.types))
+        for path, testType in self.testList.types.items():
+            self.assertIn(path, index)
+            self.assertEqual(index[path], testType, path)
+        # A later line for the same path wins, like it does in a dict.
+        self.assertEqual(index["css/css-foo/foo-001.html"], "reftest")
+        self.assertNotIn("css/css-foo/foo-999.html", index)
+        self.assertIsNone(index.get("css/css-foo/foo-999.html"))
+        with self.assertRaises(KeyError):
+            index["css/css-foo/foo-999.html"]  # noqa: B018
+
+    def testPrefixesMatchText(self) -> None:
+        index = self.openIndex()
+        for prefix in PREFIXES:
+            self.assertEqual(index.withPrefix(prefix), self.testList.withPrefix(prefix), prefix)
+        # Positions are where each path first appears, so results can be put back in file order.
+        tests = index.withPrefix("css/css-foo/")
+        self.assertEqual(
+            [path for path, _, _ in sorted(tests, key=lambda test: test[2])],
+            [
+                "css/css-foo/parsing/foo-valid.html",
+                "css/css-foo/foo-001.html",
+                "css/css-foo/ünïcödé.html",
+                "css/css-foo/foo-002.html",
+                "css/css-foo/foo-manual.html",
+                "css/css-foo/foo-003.xht",
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()